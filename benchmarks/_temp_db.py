@@ -0,0 +1,46 @@
+"""Throwaway database for the benchmarks.
+
+Importing this module points the db package at a database in a
+temporary directory, which is deleted when the benchmark exits. It must
+be imported before anything that imports db, which builds and migrates
+the database it is pointed at on import.
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import sqlite3
+import tempfile
+from itertools import count
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+TEMP_DIR = tempfile.mkdtemp(prefix='onebot-bench-')
+atexit.register(shutil.rmtree, TEMP_DIR, ignore_errors=True)
+
+os.environ['ONEBOT_DB_PATH'] = os.path.join(TEMP_DIR, 'db.sqlite3')
+
+from db import db  # pylint: disable=wrong-import-position
+
+_databases = count(1)
+
+
+def use_temp_database(schema:str='') -> str:
+    """Point the db module at a new empty database in the temporary
+    directory, created with the given script
+
+    Returns:
+        str: The path of the database.
+    """
+
+    path = os.path.join(TEMP_DIR, f'bench-{next(_databases)}.sqlite3')
+
+    with db.lock:
+        db.conn.close()
+        db.conn = sqlite3.connect(path, check_same_thread=False)
+        db.cur = db.conn.cursor()
+        db.cur.executescript(schema)
+        db.conn.commit()
+
+    return path
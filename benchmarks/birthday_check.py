@@ -0,0 +1,138 @@
+"""Benchmark finding the day's birthdays among many saved ones.
+
+Compares the old daily check, which read every saved birthday and
+parsed each one to compare it with today, with the indexed lookup of
+today's celebrants on the typed columns from migrations 0004 and 0005.
+Also counts the members each wrap-up would look at: the old one looked up every user who wasn't
+celebrating in every guild, the new one only goes through the members
+holding a birthday role, about one day of celebrants. Runs against a
+throwaway database.
+
+Run from the project root:
+    python benchmarks/birthday_check.py [birthdays] [guilds]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+from datetime import date, datetime, timedelta
+
+from _temp_db import use_temp_database  # must be imported before db
+from db import db, adb  # pylint: disable=wrong-import-position
+from birthdays import celebrant_days  # pylint: disable=wrong-import-position
+
+
+MIGRATIONS = [
+    os.path.join(
+        os.path.dirname(__file__), '..', 'data', 'db', 'migrations', name
+    )
+    for name in (
+        '0004_user_birthdays_month_day.sql',
+        '0005_user_birthdays_typed.sql'
+    )
+]
+
+
+def fill_database(birthdays:int):
+    """Save random birthdays in a throwaway database, as text like
+    before the migrations"""
+
+    use_temp_database(
+        "CREATE TABLE user_birthdays ("
+        " user_id INTEGER PRIMARY KEY, birthday TEXT NOT NULL)"
+    )
+
+    first = date(1980, 1, 1)
+    db.cur.executemany(
+        "INSERT INTO user_birthdays VALUES (?, ?)",
+        (
+            (user_id, (first + timedelta(random.randrange(9000)))
+                .strftime("%d/%m/%Y"))
+            for user_id in range(birthdays)
+        )
+    )
+    db.conn.commit()
+
+
+def migrate() -> float:
+    """Apply the birthday migrations, returning the seconds taken"""
+
+    start = time.perf_counter()
+    for path in MIGRATIONS:
+        with open(path, 'r', encoding='utf-8') as script:
+            db.cur.executescript(script.read())
+    db.conn.commit()
+    return time.perf_counter() - start
+
+
+async def old_check(today:date) -> tuple[list, int]:
+    """The full scan the indexed lookup replaces"""
+
+    data = await adb.records("SELECT user_id, birthday FROM user_birthdays")
+
+    celebrants, wrap_ups = [], 0
+    for user_id, bday_str in data:
+        bday = datetime.strptime(bday_str, '%d/%m/%Y')
+        if not (bday.month == today.month and bday.day == today.day):
+            wrap_ups += 1
+            continue
+        celebrants.append(user_id)
+
+    return celebrants, wrap_ups
+
+
+async def new_check(today:date) -> list:
+    """BirthdayCog.get_celebrants"""
+
+    rows = []
+    for month, day in celebrant_days(today):
+        rows += [
+            (user_id, date(year, month, day))
+            for user_id, year in await adb.records(
+                "SELECT user_id, birth_year FROM user_birthdays "
+                "WHERE birth_month = ? AND birth_day = ?",
+                month, day
+            )
+        ]
+
+    return rows
+
+
+async def main():
+    birthdays = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    guilds = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    today = date(2023, 2, 28)
+
+    fill_database(birthdays)
+
+    start = time.perf_counter()
+    old, wrap_ups = await old_check(today)
+    old_seconds = time.perf_counter() - start
+
+    migrate_seconds = migrate()
+
+    start = time.perf_counter()
+    new = await new_check(today)
+    new_seconds = time.perf_counter() - start
+
+    # Yesterday's celebrants are the ones holding the role
+    yesterday = await new_check(today - timedelta(days=1))
+
+    print(f"{birthdays} birthdays, checking {today}")
+    print(f"  migrations  {migrate_seconds * 1000:>8.1f}ms, once")
+    print(
+        f"  full scan   {old_seconds * 1000:>8.1f}ms, "
+        f"{len(old)} celebrants, "
+        f"{wrap_ups * guilds} member lookups to wrap up"
+    )
+    print(
+        f"  indexed     {new_seconds * 1000:>8.1f}ms, "
+        f"{len(new)} celebrants (with leap day), "
+        f"{len(yesterday)} role holders to wrap up per guild at most"
+    )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
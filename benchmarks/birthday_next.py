@@ -0,0 +1,87 @@
+"""Benchmark finding the next birthdays among many saved ones.
+
+Compares the old /birthday next, which parsed and sorted every saved
+birthday and then scanned for the first one after today, with looking
+it up in a BirthdayIndex. The index is built once and kept up to date,
+so its build time is reported separately.
+
+Run from the project root:
+    python benchmarks/birthday_next.py [birthdays] [lookups]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from birthdays import BirthdayIndex, parse_birthday  # pylint: disable=wrong-import-position
+
+
+def old_next(rows:list[tuple[int, str]], now:datetime) -> tuple:
+    """The parse, sort and scan the index replaces, with the sort key
+    fixed so it finds the right birthday"""
+
+    birthdays = [
+        (user_id, datetime.strptime(text, '%d/%m/%Y'))
+        for user_id, text in rows
+    ]
+    birthdays.sort(key=lambda i: (i[1].month, i[1].day))
+
+    for user_id, birthday in birthdays:
+        if (birthday.month, birthday.day) >= (now.month, now.day):
+            return user_id, birthday
+    return birthdays[0]
+
+
+def main():
+    birthdays = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    first = date(1980, 1, 1)
+    rows = [
+        (user_id, (first + timedelta(random.randrange(9000)))
+            .strftime("%d/%m/%Y"))
+        for user_id in range(birthdays)
+    ]
+    days = [first + timedelta(random.randrange(366)) for _ in range(lookups)]
+
+    old_lookups = max(lookups // 100, 1)
+    start = time.perf_counter()
+    for day in days[:old_lookups]:
+        old_next(rows, datetime.combine(day, datetime.min.time()))
+    old_seconds = (time.perf_counter() - start) / old_lookups
+
+    start = time.perf_counter()
+    index = BirthdayIndex(
+        (user_id, parse_birthday(text)) for user_id, text in rows
+    )
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for day in days:
+        index.next(day)
+    next_seconds = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    for day in days:
+        index.upcoming(day, 10)
+    upcoming_seconds = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    for user_id in range(lookups):
+        index.add(user_id, first)
+    add_seconds = (time.perf_counter() - start) / lookups
+
+    print(f"{birthdays} birthdays")
+    print(f"  parse, sort and scan  {old_seconds * 1000:>10.2f}ms per lookup")
+    print(f"  build index           {build_seconds * 1000:>10.2f}ms once")
+    print(f"  index next            {next_seconds * 1e6:>10.2f}us per lookup")
+    print(f"  index upcoming 10     {upcoming_seconds * 1e6:>10.2f}us per lookup")
+    print(f"  index save            {add_seconds * 1e6:>10.2f}us per birthday")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark card encodings, size and time per card type.
+
+Encodes a level card and a full 30 member scoreboard with every
+encoding and a few compression levels.
+
+Run from the project root:
+    python benchmarks/card_encoding.py
+"""
+
+import os
+import sys
+import time
+from dataclasses import replace
+from io import BytesIO
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# pylint: disable=wrong-import-position
+from render import prepare_avatar, render_levelcard
+from render.encoder import encode
+from scoreboard_render import synthetic_spec
+
+
+SETTINGS = (
+    ("png", 1), ("png", 6), ("png", 9),
+    ("png-palette", 1), ("png-palette", 6),
+    ("webp", 0), ("webp", 4),
+)
+
+
+def avatar(i:int) -> Image.Image:
+    """A prepared avatar with gradients and a little noise, which
+    compresses more like a real avatar than pure noise does"""
+
+    gradient = Image.linear_gradient("L").rotate(i * 20).resize((512, 512))
+    noise = Image.effect_noise((512, 512), 8).convert("L")
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(0)))
+
+    with BytesIO() as file:
+        image.save(file, "PNG")
+        return prepare_avatar(file.getvalue())
+
+
+def scoreboard(cards:list[Image.Image]) -> Image.Image:
+    """Cards in rows of three, like ScoreBoard"""
+
+    board = Image.new("RGBA", (2760, 220 * -(-len(cards) // 3)))
+    for i, card in enumerate(cards):
+        board.alpha_composite(card, ((i % 3) * 920, (i // 3) * 220))
+    return board
+
+
+def main():
+    cards = [
+        render_levelcard(replace(synthetic_spec(i, avatar(i)), direct=True))
+        for i in range(30)
+    ]
+
+    for card_type, image in (
+        ("levelcard", cards[0]),
+        ("scoreboard", scoreboard(cards))
+    ):
+        for encoding, level in SETTINGS:
+            start = time.perf_counter()
+            size = len(encode(image, encoding, level))
+            seconds = time.perf_counter() - start
+            print(
+                f"{card_type:<11}{encoding:<12}{level:<3}"
+                f"{size / 1024:>7.0f}KB {seconds * 1000:>8.1f}ms"
+            )
+
+
+if __name__ == '__main__':
+    main()
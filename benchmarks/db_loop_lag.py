@@ -0,0 +1,124 @@
+"""Benchmark event loop lag while the database is under message load.
+
+Simulates the LevelCog.on_message query pattern (select the member's
+experience, then update it) against a throwaway database, once through
+the blocking db.db helpers and once through the awaitable db.adb api.
+A ticker task measures how late the event loop wakes it up, which is
+what delays gateway heartbeats and interaction acks.
+
+Run from the project root:
+    python benchmarks/db_loop_lag.py [messages] [concurrency]
+"""
+
+import sys
+import time
+import random
+import asyncio
+import statistics
+
+from _temp_db import use_temp_database  # must be imported before db
+from db import db, adb  # pylint: disable=wrong-import-position
+
+
+MEMBERS = 5000
+TICK = 0.005
+
+
+def fill_database():
+    """Create the members in a throwaway database"""
+
+    use_temp_database(
+        "CREATE TABLE member_levels ("
+        " member_id INTEGER, guild_id INTEGER, experience INTEGER);"
+    )
+    db.cur.executemany(
+        "INSERT INTO member_levels VALUES (?, 1, 1)",
+        ((i,) for i in range(MEMBERS))
+    )
+    db.conn.commit()
+
+
+async def ticker(lags:list, stop:asyncio.Event):
+    """Record how late each tick fires"""
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def sync_message(member_id):
+    """A message handled with the blocking helpers"""
+
+    xp = db.field(
+        "SELECT experience FROM member_levels WHERE member_id = ?",
+        member_id
+    )
+    db.execute(
+        "UPDATE member_levels SET experience = ? WHERE member_id = ?",
+        xp + 35, member_id
+    )
+    db.conn.commit()
+
+
+async def async_message(member_id):
+    """A message handled with the async facade"""
+
+    xp = await adb.field(
+        "SELECT experience FROM member_levels WHERE member_id = ?",
+        member_id
+    )
+    await adb.execute(
+        "UPDATE member_levels SET experience = ? WHERE member_id = ?",
+        xp + 35, member_id
+    )
+    await adb._run(db.conn.commit)  # pylint: disable=protected-access
+
+
+async def run(handler, messages:int, concurrency:int) -> tuple[float, list]:
+    """Push the messages through the handler and measure the loop lag"""
+
+    lags = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(member_id):
+        async with sem:
+            await handler(member_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        one(random.randrange(MEMBERS)) for _ in range(messages)
+    ))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await tick_task
+    return elapsed, lags or [0.0]
+
+
+def report(name:str, messages:int, elapsed:float, lags:list):
+    """Print a summary line"""
+
+    lags = sorted(lags)
+    p99 = lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[0]
+    print(
+        f"{name:<6} {messages / elapsed:>9.0f} msg/s  "
+        f"lag mean {statistics.mean(lags) * 1000:>7.2f}ms  "
+        f"p99 {p99 * 1000:>7.2f}ms  max {lags[-1] * 1000:>7.2f}ms"
+    )
+
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    fill_database()
+    for name, handler in (("sync", sync_message), ("async", async_message)):
+        elapsed, lags = await run(handler, messages, concurrency)
+        report(name, messages, elapsed, lags)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
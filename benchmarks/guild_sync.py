@@ -0,0 +1,90 @@
+"""Benchmark syncing the guilds table for a bot in many guilds.
+
+Compares the old sync, one insert per guild relying on IntegrityError
+for guilds that already exist, with KnownGuilds, which only inserts the
+missing guilds in one statement. Both are timed on a cold start (empty
+table), a restart (every guild known) and a guild join, which used to
+rerun the whole sync. Runs against a throwaway database.
+
+Run from the project root:
+    python benchmarks/guild_sync.py [guilds]
+"""
+
+import sys
+import time
+import sqlite3
+import asyncio
+
+from _temp_db import use_temp_database  # must be imported before db
+from db import db, adb, KnownGuilds  # pylint: disable=wrong-import-position
+
+
+def clear_guilds():
+    db.cur.execute("DELETE FROM guilds")
+    db.conn.commit()
+
+
+async def old_sync(guild_ids:list[int]):
+    """The per-guild sync that KnownGuilds replaces"""
+
+    for guild_id in guild_ids:
+        try:
+            await adb.execute(
+                "INSERT INTO guilds (guild_id) VALUES (?)",
+                guild_id
+            )
+        except sqlite3.IntegrityError:
+            continue
+    await adb.commit()
+
+
+async def timed(coro) -> float:
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def main():
+    guilds = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    guild_ids = list(range(1, guilds + 1))
+    new_guild = guilds + 1
+
+    use_temp_database(
+        "CREATE TABLE guilds ("
+        " guild_id INTEGER PRIMARY KEY,"
+        " prefix TEXT NOT NULL DEFAULT '!');"
+    )
+
+    old_cold = await timed(old_sync(guild_ids))
+    old_warm = await timed(old_sync(guild_ids))
+    old_join = await timed(old_sync(guild_ids + [new_guild]))
+
+    clear_guilds()
+    known = KnownGuilds()
+    known.load()
+    new_cold = await timed(known.sync(guild_ids))
+
+    # A restart loads the known guilds from the table first
+    known = KnownGuilds()
+    start = time.perf_counter()
+    known.load()
+    new_warm = time.perf_counter() - start
+    new_warm += await timed(known.sync(guild_ids))
+
+    new_join = await timed(known.add(new_guild))
+    await adb.commit()
+
+    assert db.field("SELECT COUNT(*) FROM guilds") == guilds + 1
+
+    print(f"{guilds} guilds")
+    print(f"  {'':<10} {'old':>10} {'known set':>10}")
+    for name, old, new in (
+        ("cold start", old_cold, new_cold),
+        ("restart", old_warm, new_warm),
+        ("join", old_join, new_join),
+    ):
+        print(f"  {name:<10} {old * 1000:>8.1f}ms {new * 1000:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
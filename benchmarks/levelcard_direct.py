@@ -0,0 +1,49 @@
+"""Benchmark level card throughput, supersampled against direct size.
+
+Supersampled cards are drawn at 1800x400 and halved, direct cards are
+drawn straight at 900x200. The layer caches are warmed up first, so
+only the per-member drawing is measured.
+
+Run from the project root:
+    python benchmarks/levelcard_direct.py [cards]
+"""
+
+import os
+import sys
+import time
+import random
+from dataclasses import replace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# pylint: disable=wrong-import-position
+from render import prepare_avatar, render_levelcard
+from scoreboard_render import synthetic_avatar, synthetic_spec
+
+
+def cards_per_second(specs) -> float:
+    start = time.perf_counter()
+    for spec in specs:
+        render_levelcard(spec)
+    return len(specs) / (time.perf_counter() - start)
+
+
+def main():
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    avatar = prepare_avatar(synthetic_avatar())
+
+    accents = [tuple(random.randrange(256) for _ in range(3)) for _ in range(4)]
+    specs = [
+        replace(synthetic_spec(i, avatar), accent_colour=random.choice(accents))
+        for i in range(cards)
+    ]
+
+    for direct in (False, True):
+        mode = [replace(spec, direct=direct) for spec in specs]
+        cards_per_second(mode)  # warm the layer caches
+        name = "direct" if direct else "supersampled"
+        print(f"{name:<13}{cards_per_second(mode):.1f} cards/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark level card rendering with and without the cached layers.
+
+Renders the same synthetic cards with the layer caches cleared before
+every card, so every layer is drawn like it used to be, and then with
+the caches warm, the way the render processes run once they have drawn
+a few cards.
+
+Run from the project root:
+    python benchmarks/levelcard_layers.py [cards]
+"""
+
+import os
+import sys
+import time
+import random
+from dataclasses import replace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# pylint: disable=wrong-import-position
+from render import levelcard, prepare_avatar, render_levelcard
+from scoreboard_render import synthetic_avatar, synthetic_spec
+
+
+def clear_layers():
+    """Forget every cached layer"""
+
+    levelcard._background_layer.cache_clear()
+    levelcard._avatar_frame.cache_clear()
+    levelcard._status_layer.cache_clear()
+
+
+def per_card(specs, cold:bool) -> float:
+    """Mean render time of a card in milliseconds"""
+
+    start = time.perf_counter()
+    for spec in specs:
+        if cold:
+            clear_layers()
+        render_levelcard(spec)
+    return (time.perf_counter() - start) / len(specs) * 1000
+
+
+def main():
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    avatar = prepare_avatar(synthetic_avatar())
+
+    # A guild has a handful of role colours, not one per member
+    accents = [tuple(random.randrange(256) for _ in range(3)) for _ in range(4)]
+    specs = [
+        replace(synthetic_spec(i, avatar), accent_colour=random.choice(accents))
+        for i in range(cards)
+    ]
+
+    print(f"cold layers {per_card(specs, cold=True):.2f}ms per card")
+
+    clear_layers()
+    render_levelcard(specs[0])
+    print(f"warm layers {per_card(specs, cold=False):.2f}ms per card")
+
+
+if __name__ == '__main__':
+    main()
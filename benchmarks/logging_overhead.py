@@ -0,0 +1,151 @@
+"""Benchmark the logging overhead of handling a chat message.
+
+Replays the logging, model and database work the levels cog does for
+each message under three setups:
+- the old one: root at DEBUG, with every record formatted on the
+  calling thread before it is queued, plus the debug calls that the
+  MemberLevelModel getters used to make
+- the new pipeline at DEBUG, with the busy loggers sampled
+- the new default: root at INFO
+
+Records are written to a file in a temporary directory. The time per
+message is measured on the calling thread, which is the event loop in
+the bot. The listener thread writing the records is timed separately
+as it drains the queue.
+
+Run from the project root:
+    python benchmarks/logging_overhead.py [messages]
+"""
+
+import os
+import sys
+import time
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# pylint: disable=wrong-import-position
+from _temp_db import TEMP_DIR, use_temp_database  # must be imported before db
+from db import db, MemberLevelModel
+from bot._logs import start_log_queue, LOG_FORMAT
+from constants import LOG_SAMPLE_RATES
+# pylint: enable=wrong-import-position
+
+
+levels_log = logging.getLogger('ext.levels')
+models_log = logging.getLogger('db.models')
+
+
+def handle_message(member_id:int, old_getters:bool):
+    """The logging and model work of LevelsCog.on_message"""
+
+    levels_log.debug("Message event triggered by %s", member_id)
+    levels_log.debug('%s from %s is gaining %s exp', member_id, 'guild', 15)
+
+    model = MemberLevelModel(member_id, 1, 1000)
+    if old_getters:
+        models_log.debug("Getting member level")
+    model.level
+    model.set_xp(1015)
+    if old_getters:
+        models_log.debug("Getting member level")
+    model.level
+
+    db.field(
+        "SELECT value FROM user_settings "
+        "WHERE user_id = ? AND setting_id = ?",
+        member_id, 1
+    )
+
+
+def old_log_queue(handler:logging.Handler) -> QueueListener:
+    """The setup start_log_queue replaces"""
+
+    log_queue = queue.Queue()
+    logging.basicConfig(
+        level=logging.DEBUG,
+        handlers=(QueueHandler(log_queue),),
+        format=LOG_FORMAT
+    )
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+
+def reset_logging():
+    logging.root.handlers.clear()
+    for name in LOG_SAMPLE_RATES:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+
+def run(path:str, messages:int, setup) -> tuple[float, float, int]:
+    """Handle the messages with the logging set up by setup(handler)
+
+    Returns:
+        tuple: Seconds on the calling thread, seconds draining the
+            queue after, and the number of lines written.
+    """
+
+    reset_logging()
+    with open(path, 'w', encoding='utf-8') as file:
+        listener = setup(logging.StreamHandler(file))
+        old_getters = setup is old_log_queue
+
+        start = time.perf_counter()
+        for member_id in range(messages):
+            handle_message(member_id, old_getters)
+        seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        listener.stop()
+        drain = time.perf_counter() - start
+
+    with open(path, 'r', encoding='utf-8') as file:
+        lines = sum(1 for _ in file)
+
+    return seconds, drain, lines
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    use_temp_database(
+        "CREATE TABLE user_settings ("
+        " user_id INTEGER, setting_id INTEGER, value INTEGER,"
+        " PRIMARY KEY (user_id, setting_id))"
+    )
+    path = os.path.join(TEMP_DIR, 'bench.log')
+
+    setups = (
+        ("old, DEBUG", old_log_queue),
+        ("DEBUG, sampled", lambda handler: start_log_queue(
+            (handler,), logging.DEBUG, {}
+        )),
+        ("INFO", lambda handler: start_log_queue(
+            (handler,), logging.INFO, {}
+        )),
+    )
+    results = [(name, run(path, messages, setup)) for name, setup in setups]
+
+    # The same messages without any logging, the floor of the above
+    reset_logging()
+    logging.disable(logging.CRITICAL)
+    start = time.perf_counter()
+    for member_id in range(messages):
+        handle_message(member_id, False)
+    baseline = time.perf_counter() - start
+    logging.disable(logging.NOTSET)
+
+    print(f"{messages} messages")
+    print(f"  {'':<15} {'per message':>12} {'logging':>10} {'drain':>10} {'lines':>8}")
+    for name, (seconds, drain, lines) in results:
+        print(
+            f"  {name:<15} {seconds / messages * 1e6:>10.2f}us "
+            f"{(seconds - baseline) / messages * 1e6:>8.2f}us "
+            f"{drain * 1000:>8.1f}ms {lines:>8}"
+        )
+    print(f"  {'no logging':<15} {baseline / messages * 1e6:>10.2f}us")
+
+
+if __name__ == '__main__':
+    main()
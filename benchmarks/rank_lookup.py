@@ -0,0 +1,85 @@
+"""Benchmark member rank lookups.
+
+Compares the sql RANK() window query used by MemberLevelModel.rank
+against the in-memory GuildRanks index, for guilds of 10k, 100k and
+1M members. Also times moving a member, which the index does on every
+xp change.
+
+Run from the project root:
+    python benchmarks/rank_lookup.py [sizes...]
+"""
+
+import sys
+import random
+import sqlite3
+from timeit import timeit
+
+import _temp_db  # noqa: F401, must be imported before db
+from db.ranks import GuildRanks  # pylint: disable=wrong-import-position
+
+
+RANK_CMD = """SELECT rank FROM (
+ SELECT member_id, RANK() OVER ( ORDER BY experience DESC )
+ AS rank
+ FROM member_levels WHERE guild_id = ?
+) WHERE member_id = ?
+"""
+
+
+def build(size:int) -> tuple[sqlite3.Connection, list[tuple[int, int]]]:
+    """Create a guild of members with random xp"""
+
+    rows = [(i, random.randrange(1, 5_000_000)) for i in range(size)]
+
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        "CREATE TABLE member_levels ("
+        " member_id INTEGER, guild_id INTEGER, experience INTEGER);"
+        "CREATE INDEX member_levels_guild_experience"
+        " ON member_levels (guild_id, experience DESC, member_id);"
+    )
+    conn.executemany(
+        "INSERT INTO member_levels VALUES (?, 1, ?)", rows
+    )
+    return conn, rows
+
+
+def per_call(func, number:int) -> float:
+    """Microseconds per call"""
+
+    return timeit(func, number=number) / number * 1_000_000
+
+
+def main():
+    sizes = [int(i) for i in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+
+    print(f"{'members':>9} {'sql rank':>12} {'index rank':>12} "
+          f"{'index move':>12} {'index load':>12}")
+
+    for size in sizes:
+        conn, rows = build(size)
+
+        def sql_rank():
+            conn.execute(RANK_CMD, (1, random.randrange(size))).fetchone()
+
+        load_us = per_call(lambda: GuildRanks(rows), 1)
+        ranks = GuildRanks(rows)
+
+        def index_rank():
+            ranks.rank(random.randrange(size))
+
+        def index_move():
+            ranks.set(random.randrange(size), random.randrange(1, 5_000_000))
+
+        print(
+            f"{size:>9} "
+            f"{per_call(sql_rank, max(1, 200_000 // size)):>10.1f}us "
+            f"{per_call(index_rank, 100_000):>10.2f}us "
+            f"{per_call(index_move, 10_000):>10.2f}us "
+            f"{load_us / 1000:>10.1f}ms"
+        )
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
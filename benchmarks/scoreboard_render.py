@@ -0,0 +1,95 @@
+"""Benchmark scoreboard rendering with synthetic members, offline.
+
+Draws a scoreboard's worth of level cards one after another in this
+process, the way ScoreBoard.draw used to, and then through the render
+process pool the way it does now.
+
+Run from the project root:
+    python benchmarks/scoreboard_render.py [members]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+from io import BytesIO
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# pylint: disable=wrong-import-position
+from render import worker, LevelCardSpec, prepare_avatar, render_levelcard
+
+
+STATUSES = ("online", "idle", "dnd", "offline")
+
+
+def synthetic_avatar() -> bytes:
+    """A random 512x512 png, about the size discord serves avatars"""
+
+    image = Image.effect_noise((512, 512), random.randint(10, 100))
+    image = image.convert("RGB")
+    with BytesIO() as file:
+        image.save(file, "PNG")
+        return file.getvalue()
+
+
+def synthetic_spec(i:int, avatar:Image.Image) -> LevelCardSpec:
+    """A card for a made up member"""
+
+    xp = random.randrange(1, 2_000_000)
+    return LevelCardSpec(
+        name=f"Member {i}",
+        discriminator=f"{random.randrange(10000):04}",
+        status=random.choice(STATUSES),
+        is_darkmode=True,
+        accent_colour=tuple(random.randrange(256) for _ in range(3)),
+        status_colour=(46, 204, 113),
+        xp=str(xp),
+        next_xp=str(xp * 2),
+        xp_raw=xp,
+        next_xp_raw=xp * 2,
+        level=random.randrange(100),
+        rank=i + 1,
+        avatar=avatar
+    )
+
+
+def sequential(avatars:list[bytes]) -> float:
+    """Draw every card in this process, one after another"""
+
+    start = time.perf_counter()
+    for i, data in enumerate(avatars):
+        render_levelcard(synthetic_spec(i, prepare_avatar(data)))
+    return time.perf_counter() - start
+
+
+async def pooled(avatars:list[bytes]) -> float:
+    """Draw every card concurrently in the render pool"""
+
+    async def one(i, data):
+        avatar = await worker.run(prepare_avatar, data)
+        return await worker.run(render_levelcard, synthetic_spec(i, avatar))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, data) for i, data in enumerate(avatars)))
+    return time.perf_counter() - start
+
+
+async def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    avatars = [synthetic_avatar() for _ in range(members)]
+
+    print(f"sequential  {sequential(avatars):.3f}s for {members} cards")
+
+    # Warm the pool up so process start up isn't measured
+    await pooled(avatars[:os.cpu_count() or 1])
+    print(f"pooled      {await pooled(avatars):.3f}s for {members} cards")
+
+    worker.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
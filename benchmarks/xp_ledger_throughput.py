@@ -0,0 +1,93 @@
+"""Benchmark sustained message throughput of the xp write path.
+
+Compares the old per-message path (select the experience, update it)
+with the XPLedger, which applies the xp in memory and writes coalesced
+deltas in batches. Runs against a throwaway database.
+
+Run from the project root:
+    python benchmarks/xp_ledger_throughput.py [seconds] [members]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+
+from _temp_db import TEMP_DIR, use_temp_database  # must be imported before db
+from db import db, adb, XPLedger  # pylint: disable=wrong-import-position
+
+
+GUILD_ID = 1
+
+
+def fill_database(members:int):
+    """Create the members in a throwaway database"""
+
+    use_temp_database(
+        "CREATE TABLE member_levels ("
+        " member_id INTEGER, guild_id INTEGER, experience INTEGER);"
+        "CREATE UNIQUE INDEX member_levels_member"
+        " ON member_levels (guild_id, member_id);"
+    )
+    db.cur.executemany(
+        "INSERT INTO member_levels VALUES (?, ?, 1)",
+        ((i, GUILD_ID) for i in range(members))
+    )
+    db.conn.commit()
+
+
+async def direct_message(member_id:int):
+    """The per-message database round trip the ledger replaces"""
+
+    xp = await adb.field(
+        "SELECT experience FROM member_levels "
+        "WHERE member_id = ? AND guild_id = ?",
+        member_id, GUILD_ID
+    )
+    await adb.execute(
+        "UPDATE member_levels SET experience = ? "
+        "WHERE member_id = ? AND guild_id = ?",
+        xp + 35, member_id, GUILD_ID
+    )
+
+
+async def sustain(handler, seconds:float, members:int) -> int:
+    """Feed messages to the handler for the given time"""
+
+    count = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        for _ in range(100):
+            await handler(random.randrange(members))
+        count += 100
+    return count
+
+
+async def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    fill_database(members)
+
+    count = await sustain(direct_message, seconds, members)
+    await adb.commit()
+    print(f"direct  {count / seconds:>10.0f} msg/s")
+
+    ledger = XPLedger(os.path.join(TEMP_DIR, 'bench.xpjournal'))
+    ledger.replay()
+
+    async def ledger_message(member_id):
+        await ledger.add(GUILD_ID, member_id, 35)
+
+    count = await sustain(ledger_message, seconds, members)
+    start = time.perf_counter()
+    await ledger.close()
+    print(
+        f"ledger  {count / seconds:>10.0f} msg/s  "
+        f"(final flush {(time.perf_counter() - start) * 1000:.1f}ms)"
+    )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
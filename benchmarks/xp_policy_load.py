@@ -0,0 +1,97 @@
+"""Load test the xp policy with a synthetic hour of gateway events.
+
+Replays messages from normal chatters and a few spammers, plus the
+constant presence updates a large guild produces with all intents on,
+through XPPolicy with the default rules. The events carry their own
+timestamps, so an hour is replayed as fast as the policy can check it.
+
+Reports how many events would have written xp before (every event) and
+with the policy, and how fast the checks are.
+
+Run from the project root:
+    python benchmarks/xp_policy_load.py [members]
+"""
+
+import sys
+import time
+import heapq
+import random
+
+import _temp_db  # noqa: F401, must be imported before db
+from db import XPPolicy  # pylint: disable=wrong-import-position
+
+
+GUILD_ID = 1
+HOUR = 3600
+
+
+def member_events(member_id:int, source:str, rate:float):
+    """(time, member_id, source) for something a member does `rate`
+    times per second, over an hour"""
+
+    now = random.expovariate(rate)
+    while now < HOUR:
+        yield now, member_id, source
+        now += random.expovariate(rate)
+
+
+def event_stream(members:int):
+    """(time, member_id, source) for an hour, in time order"""
+
+    streams = []
+
+    for member_id in range(members):
+
+        # Presence updates for everyone, every couple of minutes
+        streams.append(member_events(member_id, "member_update", 1 / 120))
+
+        # A tenth of the members chat, a few of them spam
+        if member_id % 10 == 0:
+            rate = 1 / 2 if member_id % 500 == 0 else 1 / 90
+            streams.append(member_events(member_id, "message", rate))
+
+    return heapq.merge(*streams)
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+    events = list(event_stream(members))
+    counts = {"message": 0, "member_update": 0}
+    writes = {"message": 0, "member_update": 0}
+
+    policy = XPPolicy()
+    peak_buckets = 0
+    next_prune = 30
+
+    start = time.perf_counter()
+
+    for now, member_id, source in events:
+        counts[source] += 1
+        if policy.award(GUILD_ID, member_id, source, now):
+            writes[source] += 1
+
+        # The bot prunes with every xp flush
+        if now >= next_prune:
+            peak_buckets = max(peak_buckets, len(policy._buckets))
+            policy.prune(now)
+            next_prune += 30
+
+    seconds = time.perf_counter() - start
+
+    print(f"{len(events)} events for {members} members in one hour")
+    for source, count in counts.items():
+        print(
+            f"  {source:<14} {count:>8} events -> {writes[source]:>7} "
+            f"xp writes ({writes[source] / count:.1%})"
+        )
+    print(
+        f"checked and pruned in {seconds:.2f}s, "
+        f"{len(events) / seconds / 1e6:.2f}M events/s, "
+        f"{seconds / len(events) * 1e9:.0f}ns each"
+    )
+    print(f"peak buckets in memory: {peak_buckets}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+-- Members should only have one row per guild, remove any duplicates
+-- keeping the row with the most experience before enforcing it.
+DELETE FROM member_levels WHERE EXISTS (
+    SELECT 1 FROM member_levels AS other
+    WHERE other.guild_id = member_levels.guild_id
+    AND other.member_id = member_levels.member_id
+    AND (
+        other.experience > member_levels.experience
+        OR (
+            other.experience = member_levels.experience
+            AND other.id < member_levels.id
+        )
+    )
+);
+
+-- Used to find, update and delete a single member's levels
+CREATE UNIQUE INDEX IF NOT EXISTS member_levels_guild_member
+    ON member_levels (guild_id, member_id);
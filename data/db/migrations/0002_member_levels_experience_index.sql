@@ -0,0 +1,4 @@
+-- Covers ranking and the scoreboard, which order a guild's members by
+-- experience, without touching the table itself.
+CREATE INDEX IF NOT EXISTS member_levels_guild_experience
+    ON member_levels (guild_id, experience DESC, member_id);
@@ -0,0 +1,13 @@
+-- How much xp each source gives in a guild and how often. Members can
+-- earn `burst` awards back to back, then one more every
+-- `refill_seconds`. Guilds without a row use the defaults in
+-- constants.py.
+CREATE TABLE IF NOT EXISTS guild_xp_policies (
+    guild_id INTEGER NOT NULL,
+    source TEXT NOT NULL CHECK (source IN ('message', 'member_update')),
+    amount INTEGER NOT NULL CHECK (amount >= 0),
+    burst INTEGER NOT NULL CHECK (burst >= 1),
+    refill_seconds REAL NOT NULL CHECK (refill_seconds >= 0),
+    PRIMARY KEY (guild_id, source),
+    FOREIGN KEY (guild_id) REFERENCES guilds (guild_id) ON DELETE CASCADE
+);
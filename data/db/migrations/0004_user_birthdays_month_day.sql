@@ -0,0 +1,13 @@
+-- Birthdays are saved as DD/MM/YYYY text, the month and day are pulled
+-- out so the daily check can look up today's birthdays with an index
+-- instead of reading and parsing every row
+ALTER TABLE user_birthdays ADD COLUMN birth_month INTEGER
+    GENERATED ALWAYS AS (
+        CAST(substr(birthday, instr(birthday, '/') + 1) AS INTEGER)
+    ) VIRTUAL;
+
+ALTER TABLE user_birthdays ADD COLUMN birth_day INTEGER
+    GENERATED ALWAYS AS (CAST(birthday AS INTEGER)) VIRTUAL;
+
+CREATE INDEX IF NOT EXISTS user_birthdays_month_day
+    ON user_birthdays (birth_month, birth_day);
@@ -0,0 +1,26 @@
+-- Store birthdays as numbers instead of DD/MM/YYYY text, so nothing
+-- has to parse them. The table is rebuilt because sqlite can't change
+-- the type of a column, the month and day index is kept.
+CREATE TABLE user_birthdays_typed (
+    user_id INTEGER PRIMARY KEY,
+    birth_year INTEGER NOT NULL,
+    birth_month INTEGER NOT NULL CHECK (birth_month BETWEEN 1 AND 12),
+    birth_day INTEGER NOT NULL CHECK (birth_day BETWEEN 1 AND 31)
+);
+
+INSERT INTO user_birthdays_typed
+    SELECT
+        user_id,
+        CAST(substr(
+            substr(birthday, instr(birthday, '/') + 1),
+            instr(substr(birthday, instr(birthday, '/') + 1), '/') + 1
+        ) AS INTEGER),
+        birth_month,
+        birth_day
+    FROM user_birthdays;
+
+DROP TABLE user_birthdays;
+ALTER TABLE user_birthdays_typed RENAME TO user_birthdays;
+
+CREATE INDEX IF NOT EXISTS user_birthdays_month_day
+    ON user_birthdays (birth_month, birth_day);
@@ -0,0 +1,127 @@
+"""Date helpers for the birthday system
+
+Birthdays on the 29th of February are celebrated on the 28th in years
+that don't have one.
+"""
+
+from bisect import bisect_left, insort
+from datetime import date
+from typing import Iterable
+
+
+def is_leap_year(year:int) -> bool:
+    """Check if a year has a 29th of February"""
+
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+def parse_birthday(text:str) -> date:
+    """Parse a birthday saved as DD/MM/YYYY
+
+    Raises:
+        ValueError: The text isn't a valid date.
+    """
+
+    day, month, year = text.split("/")
+    return date(int(year), int(month), int(day))
+
+def celebrated_on(month:int, day:int, year:int) -> date:
+    """Get the date a birthday is celebrated in a year"""
+
+    if (month, day) == (2, 29) and not is_leap_year(year):
+        return date(year, 2, 28)
+
+    return date(year, month, day)
+
+def celebrant_days(today:date) -> list[tuple[int, int]]:
+    """Get the (month, day) of the birthdays celebrated on a date"""
+
+    days = [(today.month, today.day)]
+
+    if (today.month, today.day) == (2, 28) and not is_leap_year(today.year):
+        days.append((2, 29))
+
+    return days
+
+
+class BirthdayIndex:
+    """Birthdays ordered by the day of the year they fall on, so the
+    next ones after a date are found with a binary search"""
+
+    __slots__ = ("_birthdays", "_order")
+
+    def __init__(self, birthdays:Iterable[tuple[int, date]]=()):
+        """Create the index from (user_id, birthday) pairs"""
+
+        self._birthdays: dict[int, date] = dict(birthdays)
+
+        # (month, day, user_id), the 29th of February sorts after the
+        # 28th like it does in a leap year
+        self._order = sorted(
+            (birthday.month, birthday.day, user_id)
+            for user_id, birthday in self._birthdays.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, user_id:int) -> bool:
+        return user_id in self._birthdays
+
+    def _entry(self, user_id:int) -> tuple[int, int, int]:
+        birthday = self._birthdays[user_id]
+        return birthday.month, birthday.day, user_id
+
+    def add(self, user_id:int, birthday:date) -> None:
+        """Add or move a birthday"""
+
+        self.remove(user_id)
+        self._birthdays[user_id] = birthday
+        insort(self._order, self._entry(user_id))
+
+    def remove(self, user_id:int) -> None:
+        """Remove a birthday, if it is indexed"""
+
+        if user_id not in self._birthdays:
+            return
+
+        del self._order[bisect_left(self._order, self._entry(user_id))]
+        del self._birthdays[user_id]
+
+    def get(self, user_id:int) -> date | None:
+        """Get the birthday of a user, None if it isn't indexed"""
+
+        return self._birthdays.get(user_id)
+
+    def upcoming(self, today:date, count:int) -> list[tuple[int, date]]:
+        """Get the next birthdays to be celebrated, starting with today's
+
+        Args:
+            today (date): The date to count from.
+            count (int): The number of birthdays to get, each is only
+                included once even if count is larger than the index.
+
+        Returns:
+            list: (user_id, date it is celebrated on) for each birthday,
+                soonest first.
+        """
+
+        total = len(self._order)
+        start = bisect_left(self._order, (today.month, today.day))
+
+        upcoming = []
+        for i in range(start, start + min(count, total)):
+
+            # Past the end of the year, carry on from the start
+            year = today.year + i // total
+            month, day, user_id = self._order[i % total]
+
+            upcoming.append((user_id, celebrated_on(month, day, year)))
+
+        return upcoming
+
+    def next(self, today:date) -> tuple[int, date] | None:
+        """Get the next birthday to be celebrated, None if there are
+        no birthdays"""
+
+        upcoming = self.upcoming(today, 1)
+        return upcoming[0] if upcoming else None
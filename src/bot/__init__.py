@@ -4,16 +4,27 @@ import os
 import time
 import logging
 import asyncio
-from sqlite3 import IntegrityError
+from io import BytesIO
 from datetime import timedelta
 
 import discord
 from discord.ext import commands, tasks
 
-from db import db
+from db import db, adb, ranks, guild_config, KnownGuilds, XPLedger, XPPolicy
 from db.enums import ChannelPurposes
+from render import worker
+from constants import (
+    DB_COMMIT_INTERVAL_SECONDS,
+    DB_MAX_PENDING_WRITES,
+    DB_CHECKPOINT_INTERVAL_MINUTES,
+    XP_FLUSH_INTERVAL_SECONDS,
+    XP_FLUSH_MAX_PENDING,
+    LOG_BROADCAST_CONCURRENCY,
+    LOG_BROADCAST_TIMEOUT_SECONDS,
+    LOG_UPLOAD_COMPRESS_BYTES
+)
 from ._get import Get
-from ._logs import setup_logs
+from ._logs import setup_logs, read_log_file, latest_log_segment
 from ._ext import CogManager
 
 
@@ -28,6 +39,9 @@ class Bot(commands.Bot):
         "_start_time",
         "log_filepath",
         "get",
+        "xp_ledger",
+        "xp_policy",
+        "known_guilds",
         "cog_events",
         "all_cogs_loaded",
         "commands_synced",
@@ -52,16 +66,68 @@ class Bot(commands.Bot):
         self.log_filepath = setup_logs()
         self.commands_synced = False
 
+        # Writes are grouped into a transaction that is committed by
+        # _autosave_db, or sooner if too many rows are waiting
+        db.configure(max_pending=DB_MAX_PENDING_WRITES)
+
+        # Member experience is written to the database in batches,
+        # recover anything that wasn't saved before the last shutdown
+        self.xp_ledger = XPLedger(
+            db.XP_JOURNAL_PATH,
+            max_pending=XP_FLUSH_MAX_PENDING
+        )
+        self.xp_ledger.replay()
+
+        # Limits how often members earn experience
+        self.xp_policy = XPPolicy()
+        self.xp_policy.load()
+
+        # Guilds in the database, so syncing only writes new ones
+        self.known_guilds = KnownGuilds()
+        self.known_guilds.load()
+
+        # Channel and role purposes, looked up without querying
+        guild_config.load()
+
         # Event that can be used to await for all cogs to be loaded
         self.all_cogs_loaded = asyncio.Event()
         self.cog_events = {}
  
-    @tasks.loop(minutes=10)
+    @tasks.loop(seconds=DB_COMMIT_INTERVAL_SECONDS)
     async def _autosave_db(self):
         """Autosave the database"""
 
-        log.info("Autosaving database")
-        db.commit()
+        log.debug("Autosaving database")
+        await adb.commit()
+
+    @tasks.loop(minutes=DB_CHECKPOINT_INTERVAL_MINUTES)
+    async def _checkpoint_db(self):
+        """Keep the database write-ahead log from growing too large"""
+
+        log.info("Checkpointing database")
+
+        # An exception would stop the loop for the rest of the session
+        try:
+            await adb.checkpoint()
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Database checkpoint failed")
+
+    @tasks.loop(seconds=XP_FLUSH_INTERVAL_SECONDS)
+    async def _flush_xp(self):
+        """Write the pending member experience to the database"""
+
+        # An exception would stop the loop for the rest of the session,
+        # the changes are kept and flushed next time
+        try:
+            flushed = await self.xp_ledger.flush()
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Flushing xp failed")
+        else:
+            log.debug("Flushed xp for %s members", flushed)
+
+        # Members that have been quiet long enough start from a new bucket
+        pruned = self.xp_policy.prune()
+        log.debug("Pruned %s xp policy buckets", pruned)
 
     async def _determine_loaded_cogs(self):
         """Determine which cogs are loaded"""
@@ -108,23 +174,20 @@ class Bot(commands.Bot):
 
         await self.wait_until_ready()
 
-        for guild in self.guilds:
-            try:
-                log.debug("Syncing guild %s", guild.name)
-                db.execute(
-                    "INSERT INTO guilds (guild_id) VALUES (?)",
-                    guild.id
-                )
-            except IntegrityError as err:
-                log.debug(
-                    "Guild %s already exists in the database",
-                    guild.name
-                )
-                continue
+        start = time.perf_counter()
+        added = await self.known_guilds.sync(guild.id for guild in self.guilds)
+        log.info(
+            "Synced %s guilds in %.1fms, %s added",
+            len(self.guilds), (time.perf_counter() - start) * 1000, added
+        )
 
     async def send_logs(self, msg:str, include_file:bool=False) -> None:
         """Send a message to all purposed log channels
 
+        The channels are sent to concurrently, a few at a time, and any
+        that haven't been sent to within LOG_BROADCAST_TIMEOUT_SECONDS
+        are given up on.
+
         Args:
             msg (str): The message to send.
             include_file (bool, optional): Whether to include the log file. Defaults to False.
@@ -132,8 +195,7 @@ class Bot(commands.Bot):
 
         log.info("Sending logs to all logging channels")
 
-        log_channel_ids = db.column(
-            "SELECT channel_id FROM guild_channels WHERE purpose_id = ?",
+        log_channel_ids = guild_config.channels.all_with_purpose(
             ChannelPurposes.bot_logs.value
         )
 
@@ -142,28 +204,71 @@ class Bot(commands.Bot):
             len(log_channel_ids)
         )
 
-        for channel_id in log_channel_ids:
-
-            # Get the channel and send the message
-            channel = await self.get.channel(channel_id)
-            await channel.send(msg)
+        if not log_channel_ids:
+            return
+
+        # Read the log file once for every channel, only the latest
+        # segment of it is sent
+        upload = None
+        if include_file:
+            path = await asyncio.to_thread(latest_log_segment)
+            upload = await asyncio.to_thread(
+                read_log_file,
+                path or self.log_filepath,
+                LOG_UPLOAD_COMPRESS_BYTES
+            )
+
+        slots = asyncio.Semaphore(LOG_BROADCAST_CONCURRENCY)
+
+        async def send(channel_id:int):
+            async with slots:
+
+                # Get the channel and send the message
+                channel = await self.get.channel(channel_id)
+                if channel is None:
+                    log.warning("Logging channel %s not found", channel_id)
+                    return
+
+                # Each upload needs its own file object
+                file = None
+                if upload is not None:
+                    filename, data = upload
+                    file = discord.File(BytesIO(data), filename=filename)
+
+                await channel.send(msg, file=file)
+
+        sends = [asyncio.create_task(send(_id)) for _id in log_channel_ids]
+        done, pending = await asyncio.wait(
+            sends, timeout=LOG_BROADCAST_TIMEOUT_SECONDS
+        )
 
-            # Follow up with a new log file if requested
-            if include_file:
-                filename = os.path.basename(self.log_filepath)
-                file = discord.File(self.log_filepath, filename=filename)
-                await channel.send(file=file)
+        for task in pending:
+            task.cancel()
+        if pending:
+            log.warning(
+                "Gave up sending logs to %s channels after %ss",
+                len(pending), LOG_BROADCAST_TIMEOUT_SECONDS
+            )
+
+        for task in done:
+            if task.exception() is not None:
+                log.error(
+                    "Failed to send logs to a channel",
+                    exc_info=task.exception()
+                )
 
     async def on_guild_join(self, guild:discord.Guild):
-        """Sync the guilds when the bot joins a new guild"""
+        """Add the guild to the database when the bot joins it"""
 
         log.info('Joined guild %s', guild.name)
-        await self.sync_guilds()
+        if await self.known_guilds.add(guild.id):
+            log.debug("Added guild %s to the database", guild.name)
 
     async def on_guild_remove(self, guild:discord.Guild):
         """Called when the bot leaves a guild"""
 
         log.info('Left guild %s', guild.name)
+        ranks.forget(guild.id)
 
         # db.execute(
         #     "DELETE FROM guilds WHERE guild_id = ?",
@@ -189,6 +294,8 @@ class Bot(commands.Bot):
 
         # Schedule bot tasks
         self._autosave_db.start()
+        self._checkpoint_db.start()
+        self._flush_xp.start()
         self.loop.create_task(self._determine_loaded_cogs())
 
         # Sync the guilds with the db and the app commands with discord
@@ -205,10 +312,26 @@ class Bot(commands.Bot):
 
         log.info("I am now shutting down")
 
+        # Save the experience that hasn't been written yet. Stopping
+        # the loop with stop() would run one more flush after its sleep,
+        # so it is cancelled. That doesn't interrupt a flush that is
+        # already writing, the ledger finishes it and close() waits.
+        if (flush_loop := self._flush_xp.get_task()) is not None:
+            self._flush_xp.cancel()
+            await asyncio.wait((flush_loop,))
+        await self.xp_ledger.close()
+        log.debug("Final xp flush complete")
+
         # IMPORTANT: without this commit all changes will be lost
-        db.commit()
+        self._autosave_db.cancel()
+        self._checkpoint_db.cancel()
+        await adb.commit()
+        await adb.checkpoint("TRUNCATE")
         log.debug("Final database commit complete")
 
+        # Waiting for the renders and processes to finish blocks
+        await asyncio.to_thread(worker.shutdown)
+
         filename = os.path.basename(self.log_filepath)
 
         # Send a ready message to all logging channels
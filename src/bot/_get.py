@@ -1,12 +1,157 @@
-"""Module for retrieving objects using the cache or the discord API."""
+"""Module for retrieving objects using the cache or the discord API.
 
+Falling back to the API is slow and rate limited, so the fallbacks are
+shared: concurrent lookups of the same object wait for one request,
+fetched objects and objects that don't exist are remembered for a
+while, and each endpoint spends its requests from its own budget.
+"""
+
+import time
+import asyncio
 import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
 import discord
 from discord.ext.commands import Bot
 
+from constants import (
+    GET_CACHE_TTL_SECONDS,
+    GET_CACHE_SIZE,
+    GET_NOT_FOUND_TTL_SECONDS,
+    GET_NOT_FOUND_CACHE_SIZE,
+    GET_FETCHES_PER_SECOND,
+    GET_FETCH_BURST
+)
+
 
 log = logging.getLogger(__name__)
 
+ENDPOINTS = ("guild", "channel", "user", "member")
+
+_MISSING = object()
+
+
+class _FetchAbandoned(Exception):
+    """The task making a shared request was cancelled before it got a
+    response, the lookups waiting on it make the request again"""
+
+
+@dataclass
+class EndpointStats:
+    """Counters for the lookups of one endpoint"""
+
+    hits: int = 0
+    cache_hits: int = 0
+    negative_hits: int = 0
+    fetches: int = 0
+    not_found: int = 0
+    coalesced: int = 0
+    throttled: int = 0
+    _recent: deque = field(default_factory=deque, repr=False)
+
+    def record_fetch(self) -> None:
+        self.fetches += 1
+        self._recent.append(time.monotonic())
+
+    @property
+    def per_minute(self) -> int:
+        """Fetches in the last minute"""
+
+        cutoff = time.monotonic() - 60
+        while self._recent and self._recent[0] < cutoff:
+            self._recent.popleft()
+        return len(self._recent)
+
+
+class TTLCache:
+    """LRU cache whose entries expire after a while"""
+
+    def __init__(self, max_size:int, ttl:float):
+        """Create a new cache
+
+        Args:
+            max_size (int): Number of entries to keep.
+            ttl (float): Seconds an entry is kept for.
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key:tuple):
+        """Get a value, _MISSING if it isn't cached or has expired"""
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+
+        expiry, value = entry
+        if expiry <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key:tuple, value) -> None:
+        """Cache a value, evicting the least recently used"""
+
+        if self.max_size <= 0:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class RateBudget:
+    """Token bucket that spaces out the api requests of one endpoint"""
+
+    def __init__(self, rate:float, burst:int):
+        """Create a new budget
+
+        Args:
+            rate (float): Requests allowed per second.
+            burst (int): Requests allowed at once after being idle.
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def wait(self) -> bool:
+        """Wait until a request can be made
+
+        Returns:
+            bool: Whether the request had to wait.
+        """
+
+        waited = False
+
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return waited
+
+            waited = True
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
 
 class Get:
     """Class for retrieving objects using the cache or the discord API."""
@@ -14,6 +159,108 @@ class Get:
     def __init__(self, bot:Bot):
         self.bot = bot
 
+        self.endpoint_stats = {name: EndpointStats() for name in ENDPOINTS}
+        self._budgets = {
+            name: RateBudget(GET_FETCHES_PER_SECOND, GET_FETCH_BURST)
+            for name in ENDPOINTS
+        }
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+
+        # Objects fetched from the api, and keys of those it said
+        # don't exist, which usually means someone left or was deleted
+        self._fetched = TTLCache(GET_CACHE_SIZE, GET_CACHE_TTL_SECONDS)
+        self._not_found = TTLCache(
+            GET_NOT_FOUND_CACHE_SIZE, GET_NOT_FOUND_TTL_SECONDS
+        )
+
+    async def _fetch(
+        self,
+        endpoint:str,
+        fetch:Callable[[], Awaitable],
+        *ids:int
+    ):
+        """Fetch an object from the api, sharing the request with any
+        concurrent lookups of the same object.
+
+        Args:
+            endpoint (str): Name of the endpoint, one of ENDPOINTS.
+            fetch (Callable): Coroutine function making the request.
+            *ids (int): The ids that identify the object.
+
+        Returns:
+            The object, or None if it doesn't exist.
+        """
+
+        key = (endpoint, *ids)
+        stats = self.endpoint_stats[endpoint]
+
+        if (result := self._fetched.get(key)) is not _MISSING:
+            stats.cache_hits += 1
+            return result
+
+        if self._not_found.get(key) is not _MISSING:
+            stats.negative_hits += 1
+            return None
+
+        # Wait for the request that is already being made
+        while key in self._in_flight:
+            stats.coalesced += 1
+            try:
+                return await asyncio.shield(self._in_flight[key])
+            except _FetchAbandoned:
+                continue
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            if await self._budgets[endpoint].wait():
+                stats.throttled += 1
+
+            stats.record_fetch()
+            log.debug("Fetching %s %s from the api", endpoint, ids)
+
+            try:
+                result = await fetch()
+                self._fetched.put(key, result)
+            except discord.NotFound:
+                stats.not_found += 1
+                self._not_found.put(key, None)
+                result = None
+
+            future.set_result(result)
+            return result
+
+        except Exception as err:
+            future.set_exception(err)
+            # Don't complain about the exception if nobody was waiting
+            future.exception()
+            raise
+
+        finally:
+            # Cancelling the future would cancel every lookup waiting on
+            # it, they retry instead
+            if not future.done():
+                future.set_exception(_FetchAbandoned())
+                future.exception()
+            del self._in_flight[key]
+
+    @property
+    def stats(self) -> dict[str, str]:
+        """Lookups by endpoint: hits in discord's cache, hits in the
+        fetched and not found caches, and api fetches"""
+
+        data = {
+            endpoint: (
+                f"{stats.hits} hits, "
+                f"{stats.cache_hits + stats.negative_hits} cached, "
+                f"{stats.fetches} fetches ({stats.per_minute}/min), "
+                f"{stats.not_found} not found, {stats.coalesced} shared"
+            )
+            for endpoint, stats in self.endpoint_stats.items()
+        }
+        data["Cached"] = f"{len(self._fetched)} found, " \
+            f"{len(self._not_found)} not found"
+        return data
+
     async def guild(self, _id:int, /) -> discord.Guild | None:
         """Get a discord guild object from an ID.
 
@@ -26,8 +273,13 @@ class Get:
 
         log.debug('Getting guild object')
         guild_obj = self.bot.get_guild(_id)
-        return guild_obj or await self.bot.fetch_guild(_id)
+        if guild_obj is not None:
+            self.endpoint_stats["guild"].hits += 1
+            return guild_obj
 
+        return await self._fetch(
+            "guild", lambda: self.bot.fetch_guild(_id), _id
+        )
 
     async def channel(self, _id:int, /) -> discord.TextChannel | None:
         """Get a discord channel object from an ID.
@@ -41,7 +293,13 @@ class Get:
 
         log.debug('Getting channel object')
         channel_obj = self.bot.get_channel(_id)
-        return channel_obj or await self.bot.fetch_channel(_id)
+        if channel_obj is not None:
+            self.endpoint_stats["channel"].hits += 1
+            return channel_obj
+
+        return await self._fetch(
+            "channel", lambda: self.bot.fetch_channel(_id), _id
+        )
 
     async def user(self, _id, /) -> discord.User | None:
         """Get a discord member object from an ID.
@@ -55,12 +313,29 @@ class Get:
 
         log.debug('Getting user object')
         member_obj = self.bot.get_user(_id)
-        return member_obj or await self.bot.fetch_user(_id)
+        if member_obj is not None:
+            self.endpoint_stats["user"].hits += 1
+            return member_obj
+
+        return await self._fetch(
+            "user", lambda: self.bot.fetch_user(_id), _id
+        )
 
-    async def member(self, member_id, guild_id, /) -> discord.Member:
-        """Get a discord Member from a Guild"""
+    async def member(self, member_id, guild_id, /) -> discord.Member | None:
+        """Get a discord Member from a Guild, None if either of them
+        is not found"""
 
         log.debug('Getting member object')
         guild_obj = await self.guild(guild_id)
+        if guild_obj is None:
+            return None
+
         member_obj = guild_obj.get_member(member_id)
-        return member_obj or await guild_obj.fetch_member(member_id)
+        if member_obj is not None:
+            self.endpoint_stats["member"].hits += 1
+            return member_obj
+
+        return await self._fetch(
+            "member", lambda: guild_obj.fetch_member(member_id),
+            guild_id, member_id
+        )
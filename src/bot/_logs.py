@@ -3,9 +3,15 @@ Handle async logging for the project
 """
 
 import sys
+import copy
+import gzip
+import json
+import time
 import queue
+import shutil
 import logging
 from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from itertools import count
 from typing import TextIO
@@ -14,12 +20,240 @@ from pathlib import Path
 from constants import (
     LOGS,
     LOG_FILENAME_FORMAT_PREFIX,
-    MAX_LOGFILE_AGE_DAYS
+    MAX_LOGFILE_AGE_DAYS,
+    LOG_SEGMENT_MAX_BYTES,
+    LOG_SEGMENT_MAX_SECONDS,
+    LOG_DISK_BUDGET_BYTES,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_SAMPLE_RATES,
+    LOG_JSON
 )
 
 
 log = logging.getLogger(__name__)
 
+# The handler writing the session log, set by setup_logs
+_segment_handler: 'SegmentedLogHandler | None' = None
+
+LOG_FORMAT = '[%(asctime)s] %(levelname)s %(name)s: %(message)s'
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    Puts records on the queue without formatting them. The listener's
+    handlers format them instead, so timestamps and tracebacks are
+    formatted off the thread that logged them.
+    """
+
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        # The arguments are merged now, they might have changed by the
+        # time the listener gets to the record
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every `rate` DEBUG records from the given loggers and
+    their children, records of any higher level are always kept. Each call site is counted separately,
+    so a busy debug call doesn't crowd out the rare ones next to it.
+    Kept records are given a `sample_rate` attribute.
+    """
+
+    def __init__(self, rates:dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self._logger_rates: dict[str, int] = {}
+        self._counts: dict[tuple[str, int], int] = {}
+
+    def _rate(self, name:str) -> int:
+        """Get the sample rate of a logger, from its closest parent
+        with one if it doesn't have its own"""
+
+        rate = self._logger_rates.get(name)
+        if rate is None:
+            parent = name
+            while parent not in self.rates and '.' in parent:
+                parent = parent.rsplit('.', 1)[0]
+            rate = self._logger_rates[name] = self.rates.get(parent, 1)
+        return rate
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+
+        # Not locked, a miscount between threads only shifts the sample
+        site = (record.pathname, record.lineno)
+        seen = self._counts.get(site, 0)
+        self._counts[site] = seen + 1
+        if seen % rate:
+            return False
+
+        record.sample_rate = rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a JSON object on one line"""
+
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created)
+                .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'line': f'{record.module}:{record.lineno}',
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if hasattr(record, 'sample_rate'):
+            entry['sample_rate'] = record.sample_rate
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+
+        return json.dumps(entry, default=str)
+
+
+class SegmentedLogHandler(logging.StreamHandler):
+    """
+    Writes the session log in segments. The current segment is always
+    the session's log file, once it is too large or too old it is
+    renamed to "<session>.<n>.txt" and gzipped in a background thread,
+    and a new one is started. After each segment is compressed the
+    oldest log files are deleted until the logs fit the disk budget.
+    """
+
+    def __init__(
+        self,
+        file:TextIO,
+        max_bytes:int=LOG_SEGMENT_MAX_BYTES,
+        max_seconds:float=LOG_SEGMENT_MAX_SECONDS,
+        disk_budget:int=LOG_DISK_BUDGET_BYTES
+    ):
+        super().__init__(file)
+
+        self.path = Path(file.name)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.disk_budget = disk_budget
+
+        self._segments = 0
+        self._written = 0
+        self._started = time.monotonic()
+        self._compressed: Future | None = None
+        self._compressor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='log-compressor'
+        )
+
+    def emit(self, record:logging.LogRecord):
+        super().emit(record)
+
+        # Roughly the bytes written, counting characters is close enough
+        self._written += len(record.getMessage()) + 64
+        if self._written >= self.max_bytes \
+            or time.monotonic() - self._started >= self.max_seconds:
+            self.rollover()
+
+    def rollover(self) -> Future | None:
+        """
+        Finish the current segment and start a new one. Returns the
+        future of the finished segment's compression, None if the
+        segment was empty.
+        """
+
+        with self.lock:
+            self._started = time.monotonic()
+            if self._written == 0:
+                return None
+
+            self.stream.close()
+            self._segments += 1
+            segment = self.path.with_name(
+                f'{self.path.stem}.{self._segments}{self.path.suffix}'
+            )
+            self.path.rename(segment)
+
+            self.stream = self.path.open('x', encoding='utf-8')
+            self._written = 0
+
+            self._compressed = self._compressor.submit(
+                self._compress, segment
+            )
+            return self._compressed
+
+    def _compress(self, segment:Path) -> Path:
+        """Gzip a finished segment, then trim the logs to the budget"""
+
+        compressed = segment.with_name(f'{segment.name}.gz')
+        with segment.open('rb') as src, gzip.open(compressed, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        segment.unlink()
+
+        self._trim()
+        return compressed
+
+    def _trim(self):
+        """Delete the oldest log files until the logs fit the budget"""
+
+        # Oldest first, with their sizes
+        files = []
+        for path in Path(LOGS).iterdir():
+            if path == self.path:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files) + self._written
+
+        for _, size, path in files:
+            if total <= self.disk_budget:
+                break
+            total -= size
+            path.unlink(missing_ok=True)
+            log.info(
+                'Removed log file %s to stay within the disk budget',
+                path.name
+            )
+
+    def latest_segment(self) -> Path | None:
+        """
+        Finish the current segment and return it once it is compressed.
+        If nothing has been written since the last segment, that one is
+        returned instead. None if there are no segments at all.
+        """
+
+        compressed = self.rollover() or self._compressed
+        if compressed is None:
+            return None
+        return compressed.result()
+
+    def close(self):
+        self._compressor.shutdown(wait=True)
+        super().close()
+
+def latest_log_segment() -> Path | None:
+    """
+    Get the most recent compressed segment of the session log, see
+    SegmentedLogHandler.latest_segment.
+    """
+
+    if _segment_handler is None:
+        return None
+    return _segment_handler.latest_segment()
+
 def _open_file() -> TextIO:
     """
     Returns a file object for the current log file.
@@ -48,60 +282,91 @@ def _delete_old_logs():
     The max age in days for log files is defined in src/constants.py
     """
 
-    for path in Path(LOGS).glob('*.txt'):
-        prefix = path.stem.split('_')[0]
+    for path in Path(LOGS).iterdir():
+        if not path.name.endswith(('.txt', '.txt.gz')):
+            continue
+
+        # Segments are named "<session>.<n>.txt.gz"
+        prefix = path.name.split('.')[0].split('_')[0]
         try:
             log_date = datetime.strptime(prefix, LOG_FILENAME_FORMAT_PREFIX)
         except ValueError:
-            log.warning(f'{path.parent} contains a problematic filename: {path.name}')
+            log.warning(
+                '%s contains a problematic filename: %s',
+                path.parent, path.name
+            )
             continue
         
         age = datetime.now() - log_date
         if age >= timedelta(days=MAX_LOGFILE_AGE_DAYS):
-            log.info(f'Removing expired log file: {path.name}')
+            log.info('Removing expired log file: %s', path.name)
             path.unlink()
 
-def update_log_levels(logger_names:tuple[str], level:int):
+def read_log_file(path:str, compress_over:int) -> tuple[str, bytes]:
+    """
+    Read a log file for uploading, gzipped if it is larger than
+    `compress_over` bytes and isn't already. Returns the filename to
+    upload it as and the file contents.
+    """
+
+    path = Path(path)
+    data = path.read_bytes()
+
+    if len(data) <= compress_over or path.suffix == '.gz':
+        return path.name, data
+
+    return f'{path.name}.gz', gzip.compress(data)
+
+def start_log_queue(
+    handlers:tuple[logging.Handler],
+    log_level:int|str=LOG_LEVEL,
+    levels:dict[str, int|str]=LOG_LEVELS,
+    sample_rates:dict[str, int]=LOG_SAMPLE_RATES,
+    json_format:bool=LOG_JSON
+) -> QueueListener:
     """
-    Quick way to update the log level of multiple loggers at once.
+    Route the root logger through a queue to the given handlers, which
+    are run by the returned listener in a thread of its own. Loggers
+    with an entry in `levels` are set to that level, the rest follow
+    the root logger's `log_level`.
     """
-    for name in logger_names:
-        logger=logging.getLogger(name)
-        logger.setLevel(level)
 
-def setup_logs(log_level:int=logging.DEBUG) -> str:
+    log_queue = queue.Queue()
+    queue_handler = RecordQueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    # Configure the root logger to use the queue
+    logging.basicConfig(level=log_level, handlers=(queue_handler,))
+
+    formatter = JsonFormatter() if json_format \
+        else logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    queue_listener = QueueListener(log_queue, *handlers)
+    queue_listener.start()
+    return queue_listener
+
+def setup_logs(log_level:int|str=LOG_LEVEL) -> str:
     """
     Setup a logging queue handler and queue listener.
     Also creates a new log file for the current session and deletes old
     log files.
     """
 
-    # Create a queue to pass log records to the listener
-    log_queue = queue.Queue()
-    queue_handler = QueueHandler(log_queue)
+    global _segment_handler  # pylint: disable=global-statement
 
-    # Configure the root logger to use the queue
-    logging.basicConfig(
-        level=log_level,
-        handlers=(queue_handler,),
-        format='[%(asctime)s] %(levelname)s %(name)s: %(message)s'
-    )
-    
     file = _open_file()
 
     # Create handlers for the log output
-    file_handler = logging.StreamHandler(file)
+    file_handler = _segment_handler = SegmentedLogHandler(file)
     sys_handler = logging.StreamHandler(sys.stdout)
 
-    # Create a listener to handle the queue
-    queue_listener = QueueListener(log_queue, file_handler, sys_handler)
-    queue_listener.start()
-    
-    # Mute loud loggers
-    update_log_levels(
-        ('discord', 'PIL', 'urllib3', 'aiosqlite'),
-        logging.WARNING
-    )
+    start_log_queue((file_handler, sys_handler), log_level)
 
     # Clear up old log files
     _delete_old_logs()
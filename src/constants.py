@@ -4,8 +4,6 @@ from enum import Enum
 
 from easy_pil import Font
 
-from db import db
-
 # Bot constants
 ACTIVITY_MSG = 'I am up and running!'
 DATE_FORMAT = '%d/%m/%Y'
@@ -19,6 +17,11 @@ PRONOUNDB_SET_URL = "https://pronoundb.org/me"
 # Command constants
 BDAY_HELP_MSG = 'Use `/birthday help` for more info'
 
+# Birthday constants, celebrations are sent to several guilds at once
+BIRTHDAY_CELEBRATION_CONCURRENCY = 10
+BIRTHDAY_GUILD_CONCURRENCY = 2  # celebrations at once in one guild
+BIRTHDAY_REACTIONS = ('🎂', '🎉')
+
 # MSGS
 BAD_TOKEN = 'You have passed an improper or invalid token! Shutting down...'
 NO_TOKEN = 'TOKEN file not found in project root! Shutting down...'
@@ -28,6 +31,79 @@ NO_CONFIG = 'CRITICAL ERROR: config file is missing! Shutting down...'
 LOGS = 'logs/'
 LOG_FILENAME_FORMAT_PREFIX = '%Y-%m-%d %H-%M-%S'
 MAX_LOGFILE_AGE_DAYS = 7
+# Log channels are sent to a few at a time, within a time budget so
+# shutting down can't hang on a slow channel
+LOG_BROADCAST_CONCURRENCY = 5
+LOG_BROADCAST_TIMEOUT_SECONDS = 15
+LOG_UPLOAD_COMPRESS_BYTES = 1024 * 1024  # gzip log uploads larger than this
+# The session log is written in segments, a new one is started when the
+# current one reaches either limit and the old one is gzipped. The
+# oldest log files are deleted to keep the logs directory under budget.
+LOG_SEGMENT_MAX_BYTES = 5 * 1024 * 1024
+LOG_SEGMENT_MAX_SECONDS = 6 * 60 * 60
+LOG_DISK_BUDGET_BYTES = 200 * 1024 * 1024
+# The root log level and the loggers that need a different one, debug
+# logging for a subsystem is turned on by adding it here, for example
+# "db": "DEBUG" or "ext.levels": "DEBUG"
+LOG_LEVEL = "INFO"
+LOG_LEVELS = {
+    "discord": "WARNING",
+    "PIL": "WARNING",
+    "urllib3": "WARNING",
+}
+# Loggers that log on every message or query only keep one in this many
+# of their DEBUG records, counted per call site
+LOG_SAMPLE_RATES = {
+    "db.db": 100,
+    "db.models": 100,
+    "ext.levels": 10,
+}
+LOG_JSON = False  # write one JSON object per record instead of text
+
+# Database constants
+DB_COMMIT_INTERVAL_SECONDS = 5
+DB_MAX_PENDING_WRITES = 1000
+DB_CHECKPOINT_INTERVAL_MINUTES = 10
+
+# Api fallback constants, see bot/_get.py
+GET_CACHE_TTL_SECONDS = 60
+GET_CACHE_SIZE = 2000
+GET_NOT_FOUND_TTL_SECONDS = 300
+GET_NOT_FOUND_CACHE_SIZE = 10_000
+GET_FETCHES_PER_SECOND = 5  # per endpoint
+GET_FETCH_BURST = 10
+
+# Level constants
+XP_FLUSH_INTERVAL_SECONDS = 30
+XP_FLUSH_MAX_PENDING = 500
+MEMBER_REGISTER_CHUNK_SIZE = 2000  # rows per insert when validating members
+# Default xp policy, members earn `burst` awards in a row and then one
+# every `refill` seconds, guilds can change these with /rank-admin
+XP_MESSAGE_AMOUNT = 35
+XP_MESSAGE_BURST = 3
+XP_MESSAGE_REFILL_SECONDS = 20
+XP_MEMBER_UPDATE_AMOUNT = 150
+XP_MEMBER_UPDATE_BURST = 1
+XP_MEMBER_UPDATE_REFILL_SECONDS = 600
+
+# Render constants
+RENDER_WORKERS = None  # None uses one process per cpu
+RENDER_JOBS_PER_WORKER = 2  # jobs sent to the pool at once, the rest wait
+RENDER_TIMEOUT_SECONDS = 20
+AVATAR_CACHE_SIZE = 128
+AVATAR_CACHE_DIR = None  # eg. 'data/avatars/' to keep avatars on disk
+RENDER_LAYER_CACHE_SIZE = 16  # static card layers per render process, ~3MB each
+# Draw cards straight at their final size instead of halving a double
+# sized card, faster with slightly softer text
+LEVELCARD_DIRECT_RENDER = False
+SCOREBOARD_DIRECT_RENDER = True
+# Card file encoding: "png", "png-palette" (256 colours, about a quarter
+# of the size and faster, but avatars band) or "webp" (lossless, about
+# half the size but several times slower to encode)
+LEVELCARD_ENCODING = "png"
+SCOREBOARD_ENCODING = "png"
+CARD_COMPRESS_LEVEL = 6  # 0-9, higher is smaller and slower
+LEVELCARD_CACHE_BYTES = 32 * 1024 * 1024  # encoded level cards kept in memory
 
 # Levelboard constants
 # colours
@@ -2,6 +2,11 @@ from . import db
 
 db.build()
 
+from . import adb
 from . import models
 from . import enums
-from .models import MemberLevelModel, UserSettings
\ No newline at end of file
+from .models import MemberLevelModel, UserSettings
+from .config import GuildConfig, guild_config
+from .guilds import KnownGuilds
+from .ledger import XPLedger
+from .xp_policy import XPPolicy, XPRule
@@ -0,0 +1,61 @@
+"""Async database interaction functions
+
+These mirror the functions in db.db but run the query on the database
+thread, so awaiting them never blocks the event loop. The sync
+functions in db.db are still safe to use, they share the same lock.
+"""
+
+import asyncio
+import logging
+from functools import partial
+
+from . import db
+
+
+log = logging.getLogger(__name__)
+
+async def _run(func, *args):
+    """Run a db function on the database thread and await the result"""
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db.executor, partial(func, *args))
+
+async def commit():
+    """Commit changes to the database"""
+
+    await _run(db.commit)
+
+async def checkpoint(mode:str="PASSIVE"):
+    """Copy the write-ahead log back into the database file"""
+
+    return await _run(db.checkpoint, mode)
+
+async def field(cmd, *vals):
+    """Return a single field"""
+
+    return await _run(db.field, cmd, *vals)
+
+async def record(cmd, *vals):
+    """Return a single record"""
+
+    return await _run(db.record, cmd, *vals)
+
+async def records(cmd, *vals):
+    """Return all records"""
+
+    return await _run(db.records, cmd, *vals)
+
+async def column(cmd, *vals):
+    """Return a single column"""
+
+    return await _run(db.column, cmd, *vals)
+
+async def execute(cmd, *vals):
+    """Execute a command, returning the number of rows it changed"""
+
+    return await _run(db.execute, cmd, *vals)
+
+async def multiexec(cmd, valset):
+    """Execute multiple commands"""
+
+    await _run(db.multiexec, cmd, valset)
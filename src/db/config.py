@@ -0,0 +1,177 @@
+"""In-memory guild configuration
+
+The channels and roles guilds have given a purpose are loaded once on
+startup and looked up by (guild_id, purpose_id) without touching the
+database. Changes go through the store, which writes them to the
+database and updates the lookups together.
+"""
+
+import sqlite3
+import logging
+
+from . import db, adb
+
+
+log = logging.getLogger(__name__)
+
+
+class PurposeMap:
+    """The ids of one kind of object, channels or roles, by guild and
+    purpose. A guild can give a purpose to several objects, get()
+    returns the first of them."""
+
+    def __init__(self, table:str, column:str):
+        """Create a new map
+
+        Args:
+            table (str): The table the objects are stored in.
+            column (str): The id column of the table.
+        """
+
+        self.table = table
+        self.column = column
+
+        self._ids: dict[tuple[int, int], list[int]] = {}
+
+        # (guild_id, purpose_id) by object id, to remove objects
+        self._keys: dict[int, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, _id:int) -> bool:
+        return _id in self._keys
+
+    def load(self) -> int:
+        """Load the objects from the database
+
+        Returns:
+            int: The number of objects loaded.
+        """
+
+        self._ids.clear()
+        self._keys.clear()
+
+        rows = db.records(
+            f"SELECT {self.column}, guild_id, purpose_id FROM {self.table} "
+            "ORDER BY rowid"
+        )
+        for _id, guild_id, purpose_id in rows:
+            self._add(_id, guild_id, purpose_id)
+
+        return len(rows)
+
+    def _add(self, _id:int, guild_id:int, purpose_id:int) -> None:
+        self._ids.setdefault((guild_id, purpose_id), []).append(_id)
+        self._keys[_id] = (guild_id, purpose_id)
+
+    def _discard(self, _id:int) -> bool:
+        key = self._keys.pop(_id, None)
+        if key is None:
+            return False
+
+        ids = self._ids[key]
+        ids.remove(_id)
+        if not ids:
+            del self._ids[key]
+        return True
+
+    def get(self, guild_id:int, purpose_id:int) -> int | None:
+        """Get the first object a guild gave a purpose, None if there
+        isn't one"""
+
+        ids = self._ids.get((guild_id, purpose_id))
+        return ids[0] if ids else None
+
+    def get_all(self, guild_id:int, purpose_id:int) -> tuple[int, ...]:
+        """Get every object a guild gave a purpose"""
+
+        return tuple(self._ids.get((guild_id, purpose_id), ()))
+
+    def key(self, _id:int) -> tuple[int, int] | None:
+        """Get the (guild_id, purpose_id) of an object, None if it
+        doesn't have a purpose"""
+
+        return self._keys.get(_id)
+
+    def by_purpose(self, purpose_id:int) -> dict[int, int]:
+        """Get the first object of every guild with the purpose, by
+        guild id"""
+
+        return {
+            guild_id: ids[0]
+            for (guild_id, _purpose_id), ids in self._ids.items()
+            if _purpose_id == purpose_id
+        }
+
+    def all_with_purpose(self, purpose_id:int) -> list[int]:
+        """Get every object of every guild with the purpose"""
+
+        return [
+            _id
+            for (_, _purpose_id), ids in self._ids.items()
+            if _purpose_id == purpose_id
+            for _id in ids
+        ]
+
+    async def set(self, _id:int, guild_id:int, purpose_id:int) -> bool:
+        """Give an object a purpose
+
+        Returns:
+            bool: False if the object already has a purpose.
+        """
+
+        if _id in self._keys:
+            return False
+
+        try:
+            await adb.execute(
+                f"INSERT INTO {self.table} ({self.column}, guild_id, "
+                "purpose_id) VALUES (?, ?, ?)",
+                _id, guild_id, purpose_id
+            )
+        except sqlite3.IntegrityError:
+            return False
+
+        self._add(_id, guild_id, purpose_id)
+        return True
+
+    async def remove(self, _id:int) -> bool:
+        """Clear the purpose of an object
+
+        Returns:
+            bool: Whether the object had a purpose.
+        """
+
+        await adb.execute(
+            f"DELETE FROM {self.table} WHERE {self.column} = ?",
+            _id
+        )
+        return self._discard(_id)
+
+
+class GuildConfig:
+    """The purposes guilds have given their channels and roles"""
+
+    def __init__(self):
+        self.channels = PurposeMap("guild_channels", "channel_id")
+        self.roles = PurposeMap("guild_roles", "role_id")
+
+    def load(self) -> None:
+        """Load the configuration of every guild, on startup"""
+
+        channels = self.channels.load()
+        roles = self.roles.load()
+        log.info("Loaded %s channel and %s role purposes", channels, roles)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Sizes of the store"""
+
+        return {
+            "Channels": len(self.channels),
+            "Roles": len(self.roles),
+        }
+
+
+guild_config = GuildConfig()
@@ -1,11 +1,24 @@
 """Database interaction functions"""
 
+import time
 import logging
-from os.path import isfile
+from os import environ
+from glob import glob
+from os.path import isfile, join, dirname, basename
 from sqlite3 import connect
+from dataclasses import dataclass
+from threading import RLock
+from concurrent.futures import ThreadPoolExecutor
 
-DB_PATH = 'C:\\Users\\ksang\\OneDrive\\Desktop\\ESS\\issue\\OneBot\\data\\db\\db.sqlite3'
+# ONEBOT_DB_PATH points the bot, or the tests and benchmarks, at
+# another database
+DB_PATH = environ.get(
+    'ONEBOT_DB_PATH',
+    'C:\\Users\\ksang\\OneDrive\\Desktop\\ESS\\issue\\OneBot\\data\\db\\db.sqlite3'
+)
 BUILD_PATH = "C:\\Users\\ksang\\OneDrive\\Desktop\\ESS\\issue\\OneBot\\data\\db\\build.sql"
+MIGRATIONS_PATH = join(dirname(BUILD_PATH), "migrations")
+XP_JOURNAL_PATH = f"{DB_PATH}-xpjournal"
 
 log = logging.getLogger(__name__)
 
@@ -14,8 +27,78 @@ conn = connect(DB_PATH, check_same_thread=False)
 cur = conn.cursor()
 cur.execute("PRAGMA foreign_keys = ON;")  # enable foreign keys
 
+# Write-ahead logging lets readers carry on during a commit, and with
+# synchronous=NORMAL a commit no longer waits on an fsync. Only a power
+# loss can undo the most recent commits, the database can't corrupt.
+cur.execute("PRAGMA journal_mode = WAL;")
+cur.execute("PRAGMA synchronous = NORMAL;")
+
+# The connection is shared between the event loop and the db thread,
+# every use of the cursor must hold this lock.
+lock = RLock()
+
+# Single worker thread that runs queries for the async api in db.adb
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
 log.info("Database connection established")
 
+
+@dataclass
+class CommitStats:
+    """Running totals for database commits"""
+
+    commits: int = 0
+    rows: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    last_latency: float = 0.0
+    last_rows: int = 0
+
+    @property
+    def mean_latency(self) -> float:
+        """Mean seconds taken per commit"""
+
+        return self.total_latency / self.commits if self.commits else 0.0
+
+    @property
+    def rows_per_commit(self) -> float:
+        """Mean rows written per commit"""
+
+        return self.rows / self.commits if self.commits else 0.0
+
+
+commit_stats = CommitStats()
+
+# Writes are grouped into one transaction until commit is called, or
+# until this many rows are waiting, whichever comes first.
+max_pending_writes = 1000
+_pending_writes = 0
+
+def configure(max_pending:int) -> None:
+    """Configure the group commit
+
+    Args:
+        max_pending (int): Rows that can be written before a commit is
+            forced, regardless of when the next commit is due.
+    """
+
+    global max_pending_writes  # pylint: disable=global-statement
+    max_pending_writes = max_pending
+
+def _track_writes(rows:int) -> None:
+    """Count rows written in the open transaction, committing if there
+    are too many. Must be called holding the lock."""
+
+    global _pending_writes  # pylint: disable=global-statement
+
+    if rows <= 0:
+        return
+
+    _pending_writes += rows
+    if _pending_writes >= max_pending_writes:
+        log.debug("%s pending writes, forcing a commit", _pending_writes)
+        commit()
+
 def with_commit(func):
     """Wrapper to commit changes to the database"""
 
@@ -33,70 +116,176 @@ def build():
 
     if isfile(BUILD_PATH):
         scriptexec(BUILD_PATH)
+        migrate()
         return
 
     raise ValueError('Build script not found')
 
+def migration_version(path:str) -> int:
+    """Get the version of a migration from its filename"""
+
+    return int(basename(path).split("_")[0])
+
+def apply_migrations(connection, directory:str) -> list[int]:
+    """Apply the migrations in a directory that are newer than the
+    database.
+
+    Migrations are the numbered scripts in the directory, eg.
+    "0001_add_index.sql", applied in order of their number. Each one is
+    applied in its own transaction along with bumping the database's
+    user_version to its number, a migration that fails is rolled back.
+
+    Returns:
+        list[int]: The versions applied.
+    """
+
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    log.debug("Database is at version %s", version)
+
+    applied = []
+    paths = sorted(glob(join(directory, "*.sql")), key=migration_version)
+    for path in paths:
+        number = migration_version(path)
+        if number <= version:
+            continue
+
+        log.info("Applying database migration %s", basename(path))
+        with open(path, 'r', encoding='utf-8') as script:
+            try:
+                connection.executescript(
+                    f"BEGIN;\n{script.read()}\n"
+                    f"PRAGMA user_version = {number};\nCOMMIT;"
+                )
+            except Exception:
+                connection.rollback()
+                raise
+
+        applied.append(number)
+
+    return applied
+
+def migrate():
+    """Apply the migrations that are newer than the database"""
+
+    with lock:
+        apply_migrations(conn, MIGRATIONS_PATH)
+
 def commit():
     """Commit changes to the database"""
 
+    global _pending_writes  # pylint: disable=global-statement
+
     log.debug("Committing changes")
-    conn = connect(DB_PATH, check_same_thread=False)
-    conn.commit()
+
+    with lock:
+        start = time.perf_counter()
+        conn.commit()
+        latency = time.perf_counter() - start
+
+        rows, _pending_writes = _pending_writes, 0
+
+        commit_stats.commits += 1
+        commit_stats.rows += rows
+        commit_stats.total_latency += latency
+        commit_stats.max_latency = max(commit_stats.max_latency, latency)
+        commit_stats.last_latency = latency
+        commit_stats.last_rows = rows
+
+    log.debug("Committed %s rows in %.2fms", rows, latency * 1000)
+
+def checkpoint(mode:str="PASSIVE") -> tuple[int, int, int]:
+    """Copy the write-ahead log back into the database file
+
+    Args:
+        mode (str, optional): PASSIVE, FULL, RESTART or TRUNCATE.
+            Defaults to PASSIVE, which never waits on readers.
+
+    Returns:
+        tuple[int, int, int]: busy flag, frames in the log and frames
+            checkpointed, as returned by sqlite.
+    """
+
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Invalid checkpoint mode: {mode}")
+
+    with lock:
+        # sqlite refuses to checkpoint inside a transaction, and with
+        # group commit there usually is one waiting for the next commit
+        if conn.in_transaction:
+            commit()
+        result = cur.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+
+    log.debug("Checkpoint (%s) busy, log, checkpointed: %s", mode, result)
+    return result
 
 
 def close():
     """Close the database connection"""
 
     log.debug("Closing database connection")
-    conn.close()
+    executor.shutdown(wait=True)
+    with lock:
+        conn.close()
 
 def field(cmd, *vals):
     """Return a single field"""
 
     log.debug("Executing command for field: %s, vals:%s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
+    with lock:
+        cur.execute(cmd, tuple(vals))
+        fetch = cur.fetchone()
 
     # If row exists, return the first row
-    if (fetch := cur.fetchone()) is not None:
+    if fetch is not None:
         return fetch[0]
 
 def record(cmd, *vals):
     """Return a single record"""
 
     log.debug("Executing command for record: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
-    return cur.fetchone()
+    with lock:
+        cur.execute(cmd, tuple(vals))
+        return cur.fetchone()
 
 def records(cmd, *vals):
     """Return all records"""
 
     log.debug("Executing command for records: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
-    return cur.fetchall()
+    with lock:
+        cur.execute(cmd, tuple(vals))
+        return cur.fetchall()
 
 def column(cmd, *vals):
     """Return a single column"""
 
     log.debug("Executing command for column: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
-    return [item[0] for item in cur.fetchall()]
+    with lock:
+        cur.execute(cmd, tuple(vals))
+        return [item[0] for item in cur.fetchall()]
 
 def execute(cmd, *vals):
-    """Execute a command"""
+    """Execute a command, returning the number of rows it changed"""
 
     log.debug("Executing command: %s, vals: %s", cmd, vals)
-    cur.execute(cmd, tuple(vals))
+    with lock:
+        cur.execute(cmd, tuple(vals))
+        rows = cur.rowcount
+        _track_writes(rows)
+    return rows
 
 def multiexec(cmd, valset):
     """Execute multiple commands"""
 
-    log.debug("Executing multiple commands: %s, valset: %s", cmd, valset)
-    cur.executemany(cmd, valset)
+    # The valset can be thousands of rows, or a generator, so only the
+    # command is logged
+    log.debug("Executing multiple commands: %s", cmd)
+    with lock:
+        cur.executemany(cmd, valset)
+        _track_writes(cur.rowcount)
 
 def scriptexec(path):
     """Execute a script"""
     
     log.debug("Executing script: %s", path)
-    with open(path, 'r', encoding='utf-8') as script:
+    with open(path, 'r', encoding='utf-8') as script, lock:
         cur.executescript(script.read())
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""Keeps the guilds table in sync with the guilds the bot is in
+
+The ids already in the table are held in memory, so a sync only writes
+the guilds that are missing, all in one statement, and joining a guild
+is a set lookup and at most one insert.
+"""
+
+import logging
+from typing import Iterable
+
+from . import db, adb
+
+
+log = logging.getLogger(__name__)
+
+
+class KnownGuilds:
+    """The guild ids that are in the guilds table"""
+
+    def __init__(self):
+        self._ids: set[int] = set()
+
+    def __contains__(self, guild_id:int) -> bool:
+        return guild_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def load(self) -> int:
+        """Load the guild ids from the database, on startup
+
+        Returns:
+            int: The number of guilds loaded.
+        """
+
+        self._ids = set(db.column("SELECT guild_id FROM guilds"))
+
+        log.info("Loaded %s known guilds", len(self._ids))
+        return len(self._ids)
+
+    async def sync(self, guild_ids:Iterable[int]) -> int:
+        """Add the guilds that aren't in the database yet, in a single
+        transaction however many there are.
+
+        Args:
+            guild_ids (Iterable[int]): The guilds the bot is in.
+
+        Returns:
+            int: The number of guilds added.
+        """
+
+        missing = set(guild_ids) - self._ids
+        if not missing:
+            return 0
+
+        await adb.multiexec(
+            "INSERT OR IGNORE INTO guilds (guild_id) VALUES (?)",
+            [(guild_id,) for guild_id in missing]
+        )
+        await adb.commit()
+
+        self._ids |= missing
+        return len(missing)
+
+    async def add(self, guild_id:int) -> bool:
+        """Add a single guild, when the bot joins it
+
+        Returns:
+            bool: Whether the guild was added.
+        """
+
+        if guild_id in self._ids:
+            return False
+
+        await adb.execute(
+            "INSERT OR IGNORE INTO guilds (guild_id) VALUES (?)",
+            guild_id
+        )
+        self._ids.add(guild_id)
+        return True
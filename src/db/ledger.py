@@ -0,0 +1,243 @@
+"""Write-behind ledger for member experience
+
+Experience changes are applied to the in-memory totals straight away,
+so level ups are detected instantly, and the coalesced deltas are
+written to member_levels in a single batch by flush().
+
+Crash safety: every change is appended to a journal file before it is
+applied in memory. Flushing moves the journal aside, writes and commits
+the deltas and only then deletes the moved journal. Anything left in
+the journals on startup was never flushed and is replayed by replay().
+A crash between the commit and the delete replays that batch a second
+time, so experience is never lost but can very rarely be doubled.
+"""
+
+import os
+import asyncio
+import logging
+
+from . import db, adb, ranks
+from exceptions import EmptyQueryResult
+
+
+log = logging.getLogger(__name__)
+
+UPDATE_CMD = (
+    "UPDATE member_levels SET experience = experience + ? "
+    "WHERE member_id = ? AND guild_id = ?"
+)
+
+
+class XPLedger:
+    """In-memory experience totals with batched database writes"""
+
+    def __init__(self, journal_path:str, max_pending:int=500):
+        """Create a new ledger
+
+        Args:
+            journal_path (str): Path of the append-only journal file.
+            max_pending (int, optional): Number of members with unsaved
+                changes that triggers a flush. Defaults to 500.
+        """
+
+        self.journal_path = journal_path
+        self.max_pending = max_pending
+
+        # Keyed by (guild_id, member_id)
+        self._totals: dict[tuple[int, int], int] = {}
+        self._pending: dict[tuple[int, int], int] = {}
+
+        self._flush_lock = asyncio.Lock()
+        self._journal = None
+
+    @property
+    def _flushing_path(self) -> str:
+        return f"{self.journal_path}.flushing"
+
+    def _open_journal(self):
+        """Open the journal for appending, one write per line"""
+
+        self._journal = open(
+            self.journal_path, 'a', encoding='utf-8', buffering=1
+        )
+
+    def _rotate_journal(self):
+        """Move the journal aside so it can be deleted after a flush.
+        If an earlier flush failed its journal is still there, so the
+        current one is appended to it instead of replacing it.
+        """
+
+        self._journal.close()
+
+        if os.path.exists(self._flushing_path):
+            with open(self._flushing_path, 'a', encoding='utf-8') as dst, \
+                open(self.journal_path, 'r', encoding='utf-8') as src:
+                dst.write(src.read())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self._flushing_path)
+
+        self._open_journal()
+
+    def replay(self) -> int:
+        """Apply any journalled changes that were never flushed. This
+        must be called once on startup, before the ledger is used.
+
+        Returns:
+            int: The number of members that had changes replayed.
+        """
+
+        deltas = {}
+
+        for path in (self._flushing_path, self.journal_path):
+            if not os.path.exists(path):
+                continue
+
+            with open(path, 'r', encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        guild_id, member_id, amount = map(int, line.split())
+                    except ValueError:
+                        # A crash can leave a partially written line
+                        log.warning("Skipping bad xp journal line: %r", line)
+                        continue
+
+                    key = (guild_id, member_id)
+                    deltas[key] = deltas.get(key, 0) + amount
+
+        if deltas:
+            log.info("Replaying xp journal for %s members", len(deltas))
+            db.multiexec(UPDATE_CMD, (
+                (amount, member_id, guild_id)
+                for (guild_id, member_id), amount in deltas.items()
+            ))
+            db.commit()
+
+        for path in (self._flushing_path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+        self._open_journal()
+        return len(deltas)
+
+    async def total(self, guild_id:int, member_id:int) -> int:
+        """Get the current experience of a member
+
+        Raises:
+            EmptyQueryResult: The member is not in the database.
+        """
+
+        key = (guild_id, member_id)
+        if key in self._totals:
+            return self._totals[key]
+
+        xp = await adb.field(
+            "SELECT experience FROM member_levels "
+            "WHERE member_id = ? AND guild_id = ?",
+            member_id, guild_id
+        )
+        if not xp:
+            raise EmptyQueryResult(
+                "There is no data for member with id "
+                f"{member_id} in guild with id {guild_id}"
+            )
+
+        # Another call may have loaded and changed it while we waited
+        return self._totals.setdefault(key, xp)
+
+    async def add(
+        self,
+        guild_id:int,
+        member_id:int,
+        amount:int
+    ) -> tuple[int, int]:
+        """Give a member experience
+
+        Returns:
+            tuple[int, int]: The experience before and after the change.
+        """
+
+        before = await self.total(guild_id, member_id)
+
+        # Journal first, so the change survives a crash
+        self._journal.write(f"{guild_id} {member_id} {amount}\n")
+
+        key = (guild_id, member_id)
+        after = before + amount
+        self._totals[key] = after
+        self._pending[key] = self._pending.get(key, 0) + amount
+        ranks.update(guild_id, member_id, after)
+
+        if len(self._pending) >= self.max_pending:
+            log.debug("Xp ledger reached %s pending members", self.max_pending)
+            await self.flush()
+
+        return before, after
+
+    async def set(self, guild_id:int, member_id:int, xp:int) -> None:
+        """Overwrite the experience of a member"""
+
+        # Pending deltas must land first or they would be added on top
+        await self.flush()
+
+        await adb.execute(
+            "UPDATE member_levels SET experience = ? "
+            "WHERE member_id = ? AND guild_id = ?",
+            xp, member_id, guild_id
+        )
+        self._totals[(guild_id, member_id)] = xp
+        ranks.update(guild_id, member_id, xp)
+
+    def forget(self, guild_id:int, member_id:int) -> None:
+        """Drop a member from the ledger, eg. when they leave the guild"""
+
+        key = (guild_id, member_id)
+        self._totals.pop(key, None)
+        self._pending.pop(key, None)
+        ranks.remove(guild_id, member_id)
+
+    async def flush(self) -> int:
+        """Write all pending changes to the database in one batch
+
+        The batch is written in a task of its own, so cancelling the
+        caller can't leave it half done: it is either committed and its
+        journal deleted, or put back to be flushed again.
+
+        Returns:
+            int: The number of members that were updated.
+        """
+
+        return await asyncio.shield(asyncio.ensure_future(self._flush()))
+
+    async def _flush(self) -> int:
+        async with self._flush_lock:
+
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, {}
+            self._rotate_journal()
+
+            log.debug("Flushing xp for %s members", len(pending))
+
+            try:
+                await adb.multiexec(UPDATE_CMD, [
+                    (amount, member_id, guild_id)
+                    for (guild_id, member_id), amount in pending.items()
+                ])
+                await adb.commit()
+
+            except BaseException:
+                # Put the changes back, the moved journal is kept
+                for key, amount in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + amount
+                raise
+
+            os.remove(self._flushing_path)
+            return len(pending)
+
+    async def close(self) -> None:
+        """Flush the remaining changes and close the journal"""
+
+        await self.flush()
+        self._journal.close()
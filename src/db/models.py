@@ -1,13 +1,17 @@
 """Database object models"""
 
 import sqlite3
+import asyncio
 import logging
 from dataclasses import dataclass
 from math import sqrt, ceil
 from enum import Enum
+from typing import Iterable
 
-from . import db
+from . import db, adb, ranks
+from .config import guild_config
 from utils import abbreviate_num
+from constants import MEMBER_REGISTER_CHUNK_SIZE
 from exceptions import EmptyQueryResult
 
 
@@ -25,14 +29,10 @@ class GuildChannels:
     @classmethod
     def from_purpose(cls, guild_id:int, purpose_id:int):
 
-        data = db.record(
-            "SELECT * FROM guild_channels WHERE guild_id = ? AND purpose_id = ?",
-            guild_id, purpose_id
-        )
-        if not data:
+        channel_id = guild_config.channels.get(guild_id, purpose_id)
+        if channel_id is None:
             raise EmptyQueryResult("No channel found for purpose")
 
-        channel_id, _, _ = data
         return cls(
             channel_id=channel_id,
             guild_id=guild_id,
@@ -42,14 +42,11 @@ class GuildChannels:
     @classmethod
     def from_database(cls, channel_id:int):
 
-        data = db.record(
-            "SELECT * FROM guild_channels WHERE channel_id = ?",
-            channel_id
-        )
-        if not data:
+        key = guild_config.channels.key(channel_id)
+        if key is None:
             raise EmptyQueryResult("No channel found with that id")
 
-        _, guild_id, purpose_id = data
+        guild_id, purpose_id = key
         return cls(
             channel_id=channel_id,
             guild_id=guild_id,
@@ -67,7 +64,10 @@ class MemberLevelModel:
 
     def __post_init__(self):
         self._update()
-        log.debug("Created MemberLevelModel Instance")
+        log.debug(
+            "Created MemberLevelModel for %s in %s",
+            self.member_id, self.guild_id
+        )
 
     def _update(self):
         self.level_raw = 0.07 * sqrt(self.xp_raw)
@@ -77,28 +77,28 @@ class MemberLevelModel:
     def xp(self) -> str:
         """Get the member experience points"""
 
-        log.debug("Getting member xp")
         return abbreviate_num(self.xp_raw - 1)
 
     @property
     def next_xp(self) -> int:
         """Get the member experience points needed for the next level"""
 
-        log.debug("Getting member next xp")
         return abbreviate_num(self.next_xp_raw - 1)
 
     @property
     def level(self) -> int:
         """Get the member level"""
 
-        log.debug("Getting member level")
         return ceil(self.level_raw)
 
     @property
     def rank(self) -> int:
         """Get the member rank"""
 
-        log.debug("Getting member rank")
+        # Use the in-memory rankings when the guild is loaded
+        if (guild_ranks := ranks.get(self.guild_id)) is not None:
+            return guild_ranks.rank(self.member_id) or "?"
+
         rank = db.field(
             """SELECT rank FROM (
              SELECT member_id, RANK() OVER ( ORDER BY experience DESC )
@@ -133,9 +133,70 @@ class MemberLevelModel:
             "VALUES (?, ?)",
             self.member_id, self.guild_id
         )
+        ranks.update(self.guild_id, self.member_id, 1)
         if commit:
             db.commit()
 
+    @classmethod
+    async def register(cls, guild_id:int, member_id:int) -> bool:
+        """Add a member to the database with the starting experience,
+        if it isn't in it already
+
+        Returns:
+            bool: Whether the member was added.
+        """
+
+        added = await adb.execute(
+            "INSERT OR IGNORE INTO member_levels (member_id, guild_id) "
+            "VALUES (?, ?)",
+            member_id, guild_id
+        )
+        if added:
+            ranks.update(guild_id, member_id, 1)
+
+        return bool(added)
+
+    @classmethod
+    async def register_many(
+        cls,
+        guild_id:int,
+        member_ids:Iterable[int],
+        chunk_size:int=MEMBER_REGISTER_CHUNK_SIZE
+    ) -> int:
+        """Add any members that aren't in the database yet, with the
+        starting experience. Existing members are loaded with a single
+        query and the missing ones inserted in chunks, yielding to the
+        event loop in between so large guilds don't hold it up.
+
+        Args:
+            guild_id (int): The guild of the members.
+            member_ids (Iterable[int]): The members that should exist.
+            chunk_size (int, optional): Rows per insert.
+
+        Returns:
+            int: The number of members added.
+        """
+
+        existing = set(await adb.column(
+            "SELECT member_id FROM member_levels WHERE guild_id = ?",
+            guild_id
+        ))
+        missing = [_id for _id in set(member_ids) if _id not in existing]
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            await adb.multiexec(
+                "INSERT OR IGNORE INTO member_levels (member_id, guild_id) "
+                "VALUES (?, ?)",
+                [(member_id, guild_id) for member_id in chunk]
+            )
+            for member_id in chunk:
+                ranks.update(guild_id, member_id, 1)
+
+            await asyncio.sleep(0)
+
+        return len(missing)
+
     def update(self, commit:bool=False) -> None:
         """Save this model to the database"""
 
@@ -145,6 +206,7 @@ class MemberLevelModel:
             "WHERE member_id=? AND guild_id=?",
             self.xp_raw, self.member_id, self.guild_id
         )
+        ranks.update(self.guild_id, self.member_id, self.xp_raw)
         if commit:
             db.commit()
 
@@ -156,6 +218,7 @@ class MemberLevelModel:
             "DELETE FROM member_levels WHERE member_id=? AND guild_id=?",
             self.member_id, self.guild_id
         )
+        ranks.remove(self.guild_id, self.member_id)
         if commit:
             db.commit()
 
@@ -0,0 +1,311 @@
+"""In-memory member rankings
+
+Each loaded guild keeps its members ordered by experience, so a rank or
+the members around someone are found in O(log n) instead of ranking the
+whole guild in sql. Guilds that aren't loaded yet fall back to the sql
+query in MemberLevelModel.rank.
+
+Anything that changes member experience must call update() or remove()
+to keep the rankings in sync with the database.
+"""
+
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right, insort
+from typing import Awaitable, Callable, Iterable
+
+from . import adb
+
+
+log = logging.getLogger(__name__)
+
+# Entries per bucket of the rankings, a bucket is split in two once it
+# has twice as many
+BUCKET_SIZE = 512
+
+
+class GuildRanks:
+    """Members of a guild ordered by experience
+
+    The (-experience, member_id) entries are kept sorted in buckets of
+    at most twice BUCKET_SIZE, with a Fenwick tree over the bucket
+    lengths. An entry's bucket is found with a binary search over the
+    first entry of each bucket and its position with a prefix sum of
+    the tree, and moving a member only shifts the entries of its old
+    and new buckets. Every operation is O(log n), splitting or dropping
+    a bucket rebuilds the tree in O(n / BUCKET_SIZE), which happens at
+    most once every BUCKET_SIZE changes.
+    """
+
+    __slots__ = ("_xp", "_buckets", "_firsts", "_tree")
+
+    def __init__(self, rows:Iterable[tuple[int, int]]=()):
+        """Create the rankings from (member_id, experience) rows"""
+
+        self._xp: dict[int, int] = dict(rows)
+
+        # Sorted highest experience first, ties broken by member id
+        order = sorted(
+            (-xp, member_id) for member_id, xp in self._xp.items()
+        )
+        self._buckets = [
+            order[i:i + BUCKET_SIZE]
+            for i in range(0, len(order), BUCKET_SIZE)
+        ]
+        self._firsts = [bucket[0] for bucket in self._buckets]
+        self._tree: list[int] = []
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._xp)
+
+    def __contains__(self, member_id:int) -> bool:
+        return member_id in self._xp
+
+    def _rebuild(self) -> None:
+        """Build the Fenwick tree from the bucket lengths"""
+
+        size = len(self._buckets)
+        tree = [0] * (size + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            if (parent := i + (i & -i)) <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, bucket:int, delta:int) -> None:
+        """Change the length of a bucket in the tree"""
+
+        i = bucket + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _before(self, bucket:int) -> int:
+        """Count the entries in the buckets before a bucket"""
+
+        total, i = 0, bucket
+        while i:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position:int) -> tuple[int, int]:
+        """Get the bucket and offset of the entry at a position"""
+
+        bucket, step = 0, 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            i = bucket + step
+            if i < len(self._tree) and self._tree[i] <= position:
+                bucket = i
+                position -= self._tree[i]
+            step >>= 1
+        return bucket, position
+
+    def _count_below(self, entry:tuple) -> int:
+        """Count the entries sorted before an entry"""
+
+        # Every bucket from here on starts at or after the entry
+        bucket = bisect_left(self._firsts, entry)
+        if bucket == 0:
+            return 0
+        return self._before(bucket - 1) \
+            + bisect_left(self._buckets[bucket - 1], entry)
+
+    def _insert(self, entry:tuple[int, int]) -> None:
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._firsts.append(entry)
+            self._rebuild()
+            return
+
+        i = max(bisect_right(self._firsts, entry) - 1, 0)
+        bucket = self._buckets[i]
+        insort(bucket, entry)
+        self._firsts[i] = bucket[0]
+
+        if len(bucket) > 2 * BUCKET_SIZE:
+            half = bucket[BUCKET_SIZE:]
+            del bucket[BUCKET_SIZE:]
+            self._buckets.insert(i + 1, half)
+            self._firsts.insert(i + 1, half[0])
+            self._rebuild()
+        else:
+            self._grow(i, 1)
+
+    def _delete(self, entry:tuple[int, int]) -> None:
+        i = bisect_right(self._firsts, entry) - 1
+        bucket = self._buckets[i]
+        del bucket[bisect_left(bucket, entry)]
+
+        if bucket:
+            self._firsts[i] = bucket[0]
+            self._grow(i, -1)
+        else:
+            del self._buckets[i]
+            del self._firsts[i]
+            self._rebuild()
+
+    def _slice(self, start:int, stop:int) -> list[tuple[int, int]]:
+        """Get the entries from position start up to stop"""
+
+        entries = []
+        if start >= stop or start >= len(self._xp):
+            return entries
+
+        bucket, offset = self._locate(start)
+        while len(entries) < stop - start and bucket < len(self._buckets):
+            needed = stop - start - len(entries)
+            entries += self._buckets[bucket][offset:offset + needed]
+            bucket, offset = bucket + 1, 0
+        return entries
+
+    def set(self, member_id:int, xp:int) -> None:
+        """Add or move a member"""
+
+        if member_id in self._xp:
+            self._delete((-self._xp[member_id], member_id))
+
+        self._xp[member_id] = xp
+        self._insert((-xp, member_id))
+
+    def remove(self, member_id:int) -> None:
+        """Remove a member, if they are ranked"""
+
+        if member_id not in self._xp:
+            return
+
+        self._delete((-self._xp.pop(member_id), member_id))
+
+    def rank(self, member_id:int) -> int | None:
+        """Get the rank of a member, members with equal experience
+        share a rank like sql's RANK() function.
+
+        Returns:
+            int: The rank, starting at 1.
+            None: If the member isn't ranked.
+        """
+
+        xp = self._xp.get(member_id)
+        if xp is None:
+            return None
+
+        # Everyone sorted before the first entry with this xp has more
+        return self._count_below((-xp,)) + 1
+
+    def top(self, count:int) -> list[tuple[int, int]]:
+        """Get the highest ranked members as (member_id, experience)"""
+
+        return [(member_id, -xp) for xp, member_id in self._slice(0, count)]
+
+    def around(
+        self,
+        member_id:int,
+        count:int
+    ) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        """Get the members ranked directly above and below a member
+
+        Args:
+            member_id (int): The member in the middle.
+            count (int): How many members to get on each side.
+
+        Returns:
+            tuple: Lists of (member_id, experience) for the members
+                above, highest first, and below.
+        """
+
+        if member_id not in self._xp:
+            return [], []
+
+        index = self._count_below((-self._xp[member_id], member_id))
+        above = self._slice(max(index - count, 0), index)
+        below = self._slice(index + 1, index + 1 + count)
+        return (
+            [(_id, -xp) for xp, _id in above],
+            [(_id, -xp) for xp, _id in below]
+        )
+
+
+# Loaded rankings by guild id
+_guilds: dict[int, GuildRanks] = {}
+
+# Changes that arrive while a guild is loading, applied once it loads
+_loading: dict[int, dict[int, int | None]] = {}
+_loaded_events: dict[int, asyncio.Event] = {}
+
+def get(guild_id:int) -> GuildRanks | None:
+    """Get the rankings for a guild, None if they aren't loaded"""
+
+    return _guilds.get(guild_id)
+
+def update(guild_id:int, member_id:int, xp:int) -> None:
+    """Set the experience of a member in the rankings"""
+
+    if (guild := _guilds.get(guild_id)) is not None:
+        guild.set(member_id, xp)
+    elif guild_id in _loading:
+        _loading[guild_id][member_id] = xp
+
+def remove(guild_id:int, member_id:int) -> None:
+    """Remove a member from the rankings"""
+
+    if (guild := _guilds.get(guild_id)) is not None:
+        guild.remove(member_id)
+    elif guild_id in _loading:
+        _loading[guild_id][member_id] = None
+
+def forget(guild_id:int) -> None:
+    """Unload the rankings of a guild"""
+
+    _guilds.pop(guild_id, None)
+
+async def load(
+    guild_id:int,
+    flush:Callable[[], Awaitable]=None
+) -> GuildRanks:
+    """Load the rankings for a guild from the database
+
+    Args:
+        guild_id (int): The guild to load.
+        flush (Callable, optional): Coroutine function that writes any
+            unsaved experience to the database, awaited before reading.
+
+    Returns:
+        GuildRanks: The loaded rankings.
+    """
+
+    if guild_id in _guilds:
+        return _guilds[guild_id]
+
+    # Another task is already loading this guild
+    if guild_id in _loaded_events:
+        await _loaded_events[guild_id].wait()
+        return await load(guild_id, flush)
+
+    _loaded_events[guild_id] = asyncio.Event()
+    _loading[guild_id] = {}
+
+    try:
+        if flush is not None:
+            await flush()
+
+        rows = await adb.records(
+            "SELECT member_id, experience FROM member_levels "
+            "WHERE guild_id = ?",
+            guild_id
+        )
+        guild = GuildRanks(rows)
+
+        for member_id, xp in _loading[guild_id].items():
+            if xp is None:
+                guild.remove(member_id)
+            else:
+                guild.set(member_id, xp)
+
+        _guilds[guild_id] = guild
+        log.debug("Loaded rankings for %s members in %s", len(guild), guild_id)
+        return guild
+
+    finally:
+        del _loading[guild_id]
+        _loaded_events.pop(guild_id).set()
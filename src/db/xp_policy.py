@@ -0,0 +1,191 @@
+"""Rate limits on how members earn experience
+
+Every member has a token bucket per source of experience. Each award
+spends a token and tokens come back over time, so a member can earn a
+few awards in a row but chatting faster, or presence updates firing
+constantly, doesn't earn more. Checking a bucket is a dict lookup and
+some arithmetic, no database access.
+
+The rules are kept per guild in guild_xp_policies and fall back to the
+defaults in constants.py.
+"""
+
+import time
+import logging
+from dataclasses import dataclass
+
+from . import db, adb
+from constants import (
+    XP_MESSAGE_AMOUNT,
+    XP_MESSAGE_BURST,
+    XP_MESSAGE_REFILL_SECONDS,
+    XP_MEMBER_UPDATE_AMOUNT,
+    XP_MEMBER_UPDATE_BURST,
+    XP_MEMBER_UPDATE_REFILL_SECONDS
+)
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class XPRule:
+    """How much experience a source gives and how often"""
+
+    amount: int
+    burst: int
+    refill_seconds: float
+
+
+SOURCES = ("message", "member_update")
+
+DEFAULT_RULES = {
+    "message": XPRule(
+        XP_MESSAGE_AMOUNT, XP_MESSAGE_BURST, XP_MESSAGE_REFILL_SECONDS
+    ),
+    "member_update": XPRule(
+        XP_MEMBER_UPDATE_AMOUNT,
+        XP_MEMBER_UPDATE_BURST,
+        XP_MEMBER_UPDATE_REFILL_SECONDS
+    ),
+}
+
+
+class XPPolicy:
+    """Token buckets for every member and source of experience"""
+
+    def __init__(self, defaults:dict[str, XPRule]=None):
+        self.defaults = defaults or DEFAULT_RULES
+
+        # Rules that guilds have changed, by guild id and source
+        self._rules: dict[int, dict[str, XPRule]] = {}
+
+        # (tokens, last update) by (guild_id, member_id, source)
+        self._buckets: dict[tuple[int, int, str], tuple[float, float]] = {}
+
+        self.awarded = 0
+        self.limited = 0
+
+    def load(self) -> int:
+        """Load the guild rules from the database, on startup
+
+        Returns:
+            int: The number of rules loaded.
+        """
+
+        rows = db.records(
+            "SELECT guild_id, source, amount, burst, refill_seconds "
+            "FROM guild_xp_policies"
+        )
+        for guild_id, source, amount, burst, refill_seconds in rows:
+            self._rules.setdefault(guild_id, {})[source] = XPRule(
+                amount, burst, refill_seconds
+            )
+
+        log.info("Loaded %s xp policy rules", len(rows))
+        return len(rows)
+
+    def rule(self, guild_id:int, source:str) -> XPRule:
+        """Get the rule a guild uses for a source"""
+
+        guild_rules = self._rules.get(guild_id)
+        if guild_rules is not None and source in guild_rules:
+            return guild_rules[source]
+        return self.defaults[source]
+
+    def award(
+        self,
+        guild_id:int,
+        member_id:int,
+        source:str,
+        now:float=None
+    ) -> int:
+        """Take an award from a member's bucket
+
+        Args:
+            guild_id (int): The guild of the member.
+            member_id (int): The member earning experience.
+            source (str): What the experience is for, one of SOURCES.
+            now (float, optional): The time.monotonic() of the event.
+
+        Returns:
+            int: The experience to give, 0 if the member is limited.
+        """
+
+        rule = self.rule(guild_id, source)
+        if now is None:
+            now = time.monotonic()
+
+        key = (guild_id, member_id, source)
+        tokens, updated = self._buckets.get(key, (rule.burst, now))
+
+        if rule.refill_seconds > 0:
+            tokens = min(
+                rule.burst,
+                tokens + (now - updated) / rule.refill_seconds
+            )
+        else:
+            tokens = rule.burst
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.limited += 1
+            return 0
+
+        self._buckets[key] = (tokens - 1, now)
+        self.awarded += 1
+        return rule.amount
+
+    def prune(self, now:float=None) -> int:
+        """Drop buckets that have refilled, they are the same as new
+        ones, so memory only holds recently active members.
+
+        Returns:
+            int: The number of buckets dropped.
+        """
+
+        if now is None:
+            now = time.monotonic()
+
+        full = [
+            key for key, (tokens, updated) in self._buckets.items()
+            if (rule := self.rule(key[0], key[2])).refill_seconds == 0
+            or tokens + (now - updated) / rule.refill_seconds >= rule.burst
+        ]
+        for key in full:
+            del self._buckets[key]
+
+        return len(full)
+
+    async def set_rule(self, guild_id:int, source:str, rule:XPRule) -> None:
+        """Change the rule a guild uses for a source"""
+
+        if source not in SOURCES:
+            raise ValueError(f"Unknown xp source {source!r}")
+
+        await adb.execute(
+            "INSERT OR REPLACE INTO guild_xp_policies "
+            "(guild_id, source, amount, burst, refill_seconds) "
+            "VALUES (?, ?, ?, ?, ?)",
+            guild_id, source, rule.amount, rule.burst, rule.refill_seconds
+        )
+        self._rules.setdefault(guild_id, {})[source] = rule
+
+    async def reset_rule(self, guild_id:int, source:str) -> None:
+        """Go back to the default rule for a source"""
+
+        await adb.execute(
+            "DELETE FROM guild_xp_policies WHERE guild_id = ? AND source = ?",
+            guild_id, source
+        )
+        self._rules.get(guild_id, {}).pop(source, None)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for the policy"""
+
+        return {
+            "Awarded": self.awarded,
+            "Limited": self.limited,
+            "Active Buckets": len(self._buckets),
+        }
@@ -4,3 +4,8 @@
 class EmptyQueryResult(Exception):
     """The query returned no results"""
     pass
+
+
+class RenderTimeout(Exception):
+    """A render job took too long"""
+    pass
@@ -1,20 +1,29 @@
 """Cog for the automated birthday celebration system."""
 
+import asyncio
 import logging
-from datetime import datetime, time
-from discord.ext import tasks
+from collections import defaultdict
+from datetime import date, time
+from discord.ext import commands, tasks
 from discord import app_commands, Interaction as Inter
 import discord
 
-from constants import DATE_FORMAT
+from constants import (
+    DATE_FORMAT,
+    BIRTHDAY_CELEBRATION_CONCURRENCY,
+    BIRTHDAY_GUILD_CONCURRENCY,
+    BIRTHDAY_REACTIONS
+)
 from ui import (
     BirthdayModal,
     NextBirthdayEmbed,
+    UpcomingBirthdaysEmbed,
     BirthdayHelpEmbed,
     CelebrateBirthdayEmbed
 )
-from db import db
+from db import adb, guild_config
 from db.enums import ChannelPurposes, RolePurposes
+from birthdays import BirthdayIndex, celebrant_days
 from . import BaseCog
 
 
@@ -27,6 +36,11 @@ class BirthdayCog(BaseCog, name='Birthdays'):
     def __init__(self, bot):
         super().__init__(bot=bot)
 
+        # Saved birthdays by user id, loaded in cog_load, and the
+        # birthdays of each guild's members, built on first use
+        self._birthdays: dict[int, date] = {}
+        self._guild_indexes: dict[int, BirthdayIndex] = {}
+
         # Start the task to check for birthdays
         self.check_birthdays.start() 
 
@@ -37,39 +51,201 @@ class BirthdayCog(BaseCog, name='Birthdays'):
         )
         self.bot.tree.add_command(see_menu)
 
+    async def cog_load(self):
+        """Load the saved birthdays"""
+
+        rows = await adb.records(
+            "SELECT user_id, birth_year, birth_month, birth_day "
+            "FROM user_birthdays"
+        )
+        self._birthdays = {
+            user_id: date(year, month, day)
+            for user_id, year, month, day in rows
+        }
+        log.info("Loaded %s birthdays", len(self._birthdays))
+
+    def guild_index(self, guild:discord.Guild) -> BirthdayIndex:
+        """Get the birthdays of a guild's members, ordered by date"""
+
+        index = self._guild_indexes.get(guild.id)
+        if index is None:
+            index = self._guild_indexes[guild.id] = BirthdayIndex(
+                (member.id, self._birthdays[member.id])
+                for member in guild.members
+                if member.id in self._birthdays
+            )
+
+        return index
+
+    def upcoming_members(
+        self,
+        guild:discord.Guild,
+        count:int
+    ) -> list[tuple[discord.Member, date]]:
+        """Get the next few members of a guild to have a birthday.
+
+        Indexed users that are no longer in the member cache are dropped
+        from the guild's index.
+        """
+
+        index = self.guild_index(guild)
+        while True:
+            upcoming = index.upcoming(date.today(), count)
+            members = [
+                (guild.get_member(user_id), birthday)
+                for user_id, birthday in upcoming
+            ]
+            missing = [
+                user_id for (user_id, _), (member, _) in zip(upcoming, members)
+                if member is None
+            ]
+            if not missing:
+                return members
+
+            for user_id in missing:
+                index.remove(user_id)
+
+    async def save_birthday(self, user_id:int, birthday:date):
+        """Save a birthday to the database and the indexes"""
+
+        await adb.execute(
+            "INSERT INTO user_birthdays "
+            "(user_id, birth_year, birth_month, birth_day) "
+            "VALUES (?, ?, ?, ?)",
+            user_id, birthday.year, birthday.month, birthday.day
+        )
+        self.remember_birthday(user_id, birthday)
+
+    def remember_birthday(self, user_id:int, birthday:date):
+        """Add a saved birthday to the indexes of the user's guilds"""
+
+        self._birthdays[user_id] = birthday
+        for guild_id, index in self._guild_indexes.items():
+            guild = self.bot.get_guild(guild_id)
+            if guild is not None and guild.get_member(user_id) is not None:
+                index.add(user_id, birthday)
+
+    def forget_birthday(self, user_id:int):
+        """Remove a deleted birthday from the indexes"""
+
+        self._birthdays.pop(user_id, None)
+        for index in self._guild_indexes.values():
+            index.remove(user_id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member:discord.Member):
+        """Index the birthday of a new member"""
+
+        index = self._guild_indexes.get(member.guild.id)
+        if index is not None and member.id in self._birthdays:
+            index.add(member.id, self._birthdays[member.id])
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member:discord.Member):
+        """Stop indexing the birthday of a member that left"""
+
+        index = self._guild_indexes.get(member.guild.id)
+        if index is not None:
+            index.remove(member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild:discord.Guild):
+        """Drop the index of a guild the bot left"""
+
+        self._guild_indexes.pop(guild.id, None)
+
     @tasks.loop(time=time(hour=7))
     async def check_birthdays(self):
         """Check if it's anyone's birthday, if so send a message.
-        Also, check if anyone's birthday is over and remove the role."""
+        Also, remove the birthday role from anyone whose birthday is over."""
 
         log.debug('Doing daily birthday check')
 
-        # Get all of the birthdays including the user id
-        data = db.records("SELECT * FROM user_birthdays")
+        today = date.today()
+        celebrants = await self.get_celebrants(today)
+        log.debug('Found %s birthdays today', len(celebrants))
 
-        # If there are no birthdays, we can stop here
-        if not data:
-            log.debug('I don\'t know anyone\'s birthday')
+        # Only members holding the role can have a birthday that is over
+        await self.wrap_up_birthdays(
+            celebrating={user_id for user_id, _ in celebrants}
+        )
 
-        # Get the current date to check against
-        now = datetime.now()
+        await self.celebrate_birthdays([
+            (user_id, today.year - birthday.year)
+            for user_id, birthday in celebrants
+        ])
 
-        # Loop through all users and check to celebrate birthday
-        for user_id, bday_str in data:
+    async def get_celebrants(self, today:date) -> list[tuple[int, date]]:
+        """Get the users whose birthday is celebrated on a date
 
-            # Convert the string to a datetime object
-            bday = datetime.strptime(bday_str, '%d/%m/%Y')
+        Args:
+            today (date): The date to check.
 
-            # If today is not the user's birthday, skip them
-            if not (bday.month == now.month and bday.day == now.day):
-                await self.wrap_up_birthday(user_id)
-                continue
+        Returns:
+            list: (user_id, birthday) for each user.
+        """
+
+        rows = []
+        for month, day in celebrant_days(today):
+            rows += await adb.records(
+                "SELECT user_id, birth_year FROM user_birthdays "
+                "WHERE birth_month = ? AND birth_day = ?",
+                month, day
+            )
+
+        return [
+            (user_id, date(year, month, day)) for user_id, year in rows
+        ]
 
-            # Calculate the user's age
-            age = now.year - bday.year
+    async def celebrate_birthdays(self, celebrants:list[tuple[int, int]]):
+        """Celebrate birthdays in every guild the users are in. The
+        guilds are handled concurrently, a few at a time.
 
-            # It's there birthday, celebrate!
-            await self.celebrate_birthday(user_id, age)
+        Args:
+            celebrants (list[tuple[int, int]]): (user_id, age) of each user.
+        """
+
+        log.debug('Attempting to celebrate %s birthdays', len(celebrants))
+
+        channels = guild_config.channels.by_purpose(
+            ChannelPurposes.announcements.value
+        )
+        roles = guild_config.roles.by_purpose(RolePurposes.birthday.value)
+
+        limit = asyncio.Semaphore(BIRTHDAY_CELEBRATION_CONCURRENCY)
+        guild_limits = defaultdict(
+            lambda: asyncio.Semaphore(BIRTHDAY_GUILD_CONCURRENCY)
+        )
+
+        # Only guilds with an announcements channel celebrate
+        jobs = [
+            (guild, user_id, age)
+            for user_id, age in celebrants
+            for guild in self.bot.guilds
+            if guild.id in channels
+        ]
+
+        async def celebrate(guild, user_id, age):
+            # The guild's slot is taken first, so tasks waiting on a busy
+            # guild don't hold global slots other guilds could use
+            async with guild_limits[guild.id], limit:
+                await self.celebrate_in_guild(
+                    guild, user_id, age,
+                    channels[guild.id], roles.get(guild.id)
+                )
+
+        results = await asyncio.gather(
+            *(celebrate(*job) for job in jobs),
+            return_exceptions=True
+        )
+        for (guild, user_id, _), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                log.error(
+                    "Failed to celebrate birthday of %s in %s",
+                    user_id, guild.name, exc_info=result
+                )
+
+        log.debug("Finished celebrating birthdays")
 
     async def celebrate_birthday(self, user_id, age):
         """Celebrate a user's birthday.
@@ -79,110 +255,117 @@ class BirthdayCog(BaseCog, name='Birthdays'):
             age (int): The user's age.
         """
 
-        log.debug('Attempting to celebrate birthday')
+        await self.celebrate_birthdays([(user_id, age)])
 
-        channel_data = db.records(
-            "SELECT * FROM guild_channels WHERE purpose_id = ?",
-            ChannelPurposes.announcements.value
-        )
-        role_data = db.records(
-            "SELECT * FROM guild_roles WHERE purpose_id = ?",
-            RolePurposes.birthday.value
-        )
-        reactions = ('🎂', '🎉')
+    async def celebrate_in_guild(
+        self,
+        guild:discord.Guild,
+        user_id:int,
+        age:int,
+        channel_id:int,
+        role_id:int | None
+    ):
+        """Celebrate a user's birthday in one guild
 
-        for guild in self.bot.guilds:
+        Args:
+            guild (discord.Guild): The guild to celebrate in.
+            user_id (int): The user's ID.
+            age (int): The user's age.
+            channel_id (int): The guild's announcements channel.
+            role_id (int | None): The guild's birthday role, if any.
+        """
 
-            log.debug("Attempting to celebrate birthday in %s", guild.name)
+        log.debug("Attempting to celebrate birthday in %s", guild.name)
 
-            # get the member for this guild
+        # The member cache is complete once a guild is chunked, only
+        # ask the api when it might not be
+        member = guild.get_member(user_id)
+        if member is None and not guild.chunked:
             member = await self.bot.get.member(user_id, guild.id)
-            if not member:
-                log.debug("Member not found in guild, skipping")
-                continue
+        if not member:
+            log.debug("Member not found in guild, skipping")
+            return
 
-            log.debug("Found member %s", member.name)
+        channel = await self.bot.get.channel(channel_id)
+        log.debug("Found channel %s", channel)
+
+        if channel:
+            msg = await channel.send(embed=CelebrateBirthdayEmbed(
+                member=member,
+                age=age,
+                member_count=guild.member_count,
+                reactions=BIRTHDAY_REACTIONS
+            ))
+            await asyncio.gather(*(
+                msg.add_reaction(reaction) for reaction in BIRTHDAY_REACTIONS
+            ))
+            log.debug("Sent message")
+
+        # give the member the birthday role
+        role = guild.get_role(role_id) if role_id is not None else None
+        if role is None:
+            log.debug("Role not found, skipping")
+            return
 
-            # get the channel and send a message
-            channel_id = 0
-            for channel_id, guild_id, channel_purpose in channel_data:
-                if guild_id == guild.id and \
-                    channel_purpose == ChannelPurposes.announcements.value:
-                    break
-            else:
-                log.debug("Channel not found, skipping")
-                continue
+        await member.add_roles(role)
+        log.debug("Added role")
+
+    def _birthday_roles(self):
+        """Yield the guilds with a birthday role and the role"""
+
+        roles = guild_config.roles.by_purpose(RolePurposes.birthday.value)
+        for guild_id, role_id in roles.items():
 
-            channel = await self.bot.get.channel(channel_id)
-            log.debug("Found channel %s", channel)
-
-            if channel:
-                msg = await channel.send(embed=CelebrateBirthdayEmbed(
-                    member=member,
-                    age=age,
-                    member_count=guild.member_count,
-                    reactions=reactions
-                ))
-                for reaction in reactions:
-                    await msg.add_reaction(reaction)
-                log.debug("Sent message")
-
-            # get the birthday role and remove it from the member
-            role_id = 0
-            for role_id, guild_id, role_purpose in role_data:
-                if guild_id == guild.id and \
-                    role_purpose == RolePurposes.birthday.value:
-                    break
-            else:
-                log.debug("Role not found, skipping")
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
                 continue
 
             role = guild.get_role(role_id)
-            log.debug("Found role %s", role)
+            if role is None:
+                log.debug("Birthday role not found in %s, skipping", guild.name)
+                continue
 
-            await member.add_roles(role)
-            log.debug("Added role")
+            yield guild, role
 
-        log.debug("Finished celebrating birthday")
-
-    async def wrap_up_birthday(self, user_id:int):
-        """Stop celebrating a user birthday
+    async def wrap_up_birthdays(self, celebrating:set[int]=frozenset()):
+        """Remove the birthday role from every member holding it
 
         Args:
-            user_id (int): The user's ID.
+            celebrating (set[int]): Users whose birthday is today, they
+                keep the role.
         """
 
         log.debug('Attempting to wrap up birthdays')
 
+        for guild, role in self._birthday_roles():
+            for member in role.members:
+                if member.id in celebrating:
+                    continue
 
-        for guild in self.bot.guilds:
-            log.debug("Attempting to wrap up birthday in %s", guild.name)
+                await member.remove_roles(role)
+                log.debug("Removed role from %s in %s", member, guild.name)
 
-            member: discord.Member = await self.bot.get.member(user_id, guild.id)
-            if not member:
-                log.debug("Member not found in guild, skipping")
-                continue
+        log.debug("Finished wrapping up birthdays")
 
-            log.debug("Found member %s", member.name)
+    async def wrap_up_birthday(self, user_id:int):
+        """Stop celebrating a user birthday
 
-            role_id = db.field(
-                "SELECT role_id FROM guild_roles " \
-                "WHERE guild_id = ? AND purpose_id = ?",
-                guild.id, RolePurposes.birthday.value
-            )
-            role = guild.get_role(role_id)
-            if not role:
-                log.debug("Role not found, skipping")
-                continue
+        Args:
+            user_id (int): The user's ID.
+        """
 
-            if role not in member.roles:
-                log.debug("member does not have role, skipping")
+        log.debug('Attempting to wrap up birthday')
+
+        for guild, role in self._birthday_roles():
+
+            member = guild.get_member(user_id)
+            if member is None or role not in member.roles:
                 continue
 
             await member.remove_roles(role)
-            log.debug("Removed role")
+            log.debug("Removed role in %s", guild.name)
 
-        log.debug("Finished wrapping up birthdays")
+        log.debug("Finished wrapping up birthday")
 
     # All birthday commands are in this group
     group = app_commands.Group(
@@ -204,30 +387,41 @@ class BirthdayCog(BaseCog, name='Birthdays'):
     async def see_next_birthday(self, inter:Inter):
         """See who's birthday is next."""
 
-        # Get all birthdays from the database
-        birthdays = db.records("SELECT * FROM user_birthdays")
+        upcoming = self.upcoming_members(inter.guild, 1)
 
         # If there are no birthdays, we can't do anything
-        if not birthdays:
+        if not upcoming:
             await inter.response.send_message(
                 "There are no birthdays in my database.",
                 ephemeral=True
             )
             return  # important! we can't continue with no birthdays
 
-        # Convert the birthdays to datetime objects
-        birthdays = [
-            (member_id, datetime.strptime(bday, DATE_FORMAT))
-            for member_id, bday in birthdays
-        ]
+        member, birthday = upcoming[0]
+        embed = NextBirthdayEmbed(member, birthday)
+
+        # Send the embed to the user, ending the interaction
+        await inter.response.send_message(embed=embed, ephemeral=True)
 
-        # Sort the birthdays by the day and month
-        birthdays.sort(key=lambda i:i[1].day and i[1].month)
+    @group.command(name='upcoming')
+    @app_commands.describe(count="How many birthdays to show")
+    async def see_upcoming_birthdays(
+        self,
+        inter:Inter,
+        count:app_commands.Range[int, 1, 25]=5
+    ):
+        """See the next few birthdays in this server."""
 
-        # Get the embed for displaying the next birthday
-        embed = NextBirthdayEmbed(inter, birthdays)
+        upcoming = self.upcoming_members(inter.guild, count)
 
-        # Send the embed to the user, ending the interaction
+        if not upcoming:
+            await inter.response.send_message(
+                "There are no birthdays in my database.",
+                ephemeral=True
+            )
+            return
+
+        embed = UpcomingBirthdaysEmbed(upcoming)
         await inter.response.send_message(embed=embed, ephemeral=True)
 
     @group.command(name='save')
@@ -235,7 +429,7 @@ class BirthdayCog(BaseCog, name='Birthdays'):
         """Save your birthday to the database."""
 
         # Check if the member already has a birthday saved in the database
-        birthday_exists = db.record(
+        birthday_exists = await adb.record(
             """SELECT user_id FROM user_birthdays WHERE user_id = ?""",
             inter.user.id
         )
@@ -248,11 +442,8 @@ class BirthdayCog(BaseCog, name='Birthdays'):
             )
             return
 
-        def save_bday(birthday):
-            db.execute(
-                "INSERT INTO user_birthdays VALUES (?, ?)",
-                inter.user.id, birthday
-            )
+        async def save_bday(birthday:date):
+            await self.save_birthday(inter.user.id, birthday)
 
         modal = BirthdayModal(save_func=save_bday)
         await inter.response.send_modal(modal)
@@ -262,10 +453,11 @@ class BirthdayCog(BaseCog, name='Birthdays'):
         """Remove your birthday from the database."""
 
         # Delete the birthday from the database
-        db.execute(
+        await adb.execute(
             "DELETE FROM user_birthdays WHERE user_id = ?",
             inter.user.id
         )
+        self.forget_birthday(inter.user.id)
 
         log.info('Birthday removed for %s', inter.user.display_name)
 
@@ -277,14 +469,11 @@ class BirthdayCog(BaseCog, name='Birthdays'):
 
     async def get_birthday(self, inter:Inter, member:discord.Member):
 
-        # Get the birthday from the database that matches the member id
-        data = db.record(
-            "SELECT birthday FROM user_birthdays WHERE user_id = ?",
-            member.id
-        )
+        # Saved birthdays are all loaded
+        birthday = self._birthdays.get(member.id)
 
         # If the user doesn't have a birthday saved
-        if not data:
+        if birthday is None:
             await inter.response.send_message(
                 'I don\'t know this birthday, sorry!'
                 '\nYou can save yours with `/birthday save`',
@@ -294,7 +483,7 @@ class BirthdayCog(BaseCog, name='Birthdays'):
 
         # Inform the user of their saved birthday
         await inter.response.send_message(
-            f'That birthday is on {data[0]}!',
+            f'That birthday is on {birthday.strftime(DATE_FORMAT)}!',
             ephemeral=True
         )
 
@@ -322,7 +511,7 @@ class BirthdayCog(BaseCog, name='Birthdays'):
         """Add a birthday for another member"""
 
         # Check if the member already has a birthday saved in the database
-        birthday_exists = db.record(
+        birthday_exists = await adb.record(
             """SELECT user_id FROM user_birthdays WHERE user_id = ?""",
             member.id
         )
@@ -335,11 +524,8 @@ class BirthdayCog(BaseCog, name='Birthdays'):
             )
             return
 
-        def save_bday(birthday):
-            db.execute(
-                "INSERT INTO user_birthdays VALUES (?, ?)",
-                member.id, birthday
-            )
+        async def save_bday(birthday:date):
+            await self.save_birthday(member.id, birthday)
 
         modal = BirthdayModal(save_func=save_bday)
         await inter.response.send_modal(modal)
@@ -349,11 +535,14 @@ class BirthdayCog(BaseCog, name='Birthdays'):
         """Returns list of members and their birthdays."""
 
         # Get all birthdays from the database with the user's id
-        data = db.records("SELECT * FROM user_birthdays")
+        data = await adb.records(
+            "SELECT user_id, birth_year, birth_month, birth_day "
+            "FROM user_birthdays"
+        )
 
         # Return if no birthdays are set
         if not data:
-            inter.response.send_message(
+            await inter.response.send_message(
                 'There are no birthdays in the database.',
                 ephemeral=True
             )
@@ -361,8 +550,10 @@ class BirthdayCog(BaseCog, name='Birthdays'):
 
         # Get generator of members and their birthdays
         bday_gen = (
-            f'{inter.guild.get_member(uid).mention}: {bday}'
-            for uid, bday in data
+            f'{member.mention}: '
+            f'{date(year, month, day).strftime(DATE_FORMAT)}'
+            for uid, year, month, day in data
+            if (member := inter.guild.get_member(uid)) is not None
         )
 
         # Put the list into a string and send it
@@ -1,17 +1,18 @@
 """Manage guild integration with the bot"""
 
 import logging
-import sqlite3
 
 import discord
+from discord.ext import commands
 from discord import (
+    abc,
     app_commands,
     TextChannel,
     Interaction as Inter,
     Role
 )
 
-from db import db
+from db import adb, guild_config
 from db.enums import ChannelPurposes, RolePurposes
 from ui import ListConfiguredChannelsEmbed
 from . import BaseCog
@@ -26,13 +27,13 @@ def get_purposes(purpose_object, /) -> list[app_commands.Choice]:
         for p in purpose_object
     ]
 
-def get_table(_object) -> str:
-    """Get the applicable db table for the given object"""
+def get_purpose_map(_object):
+    """Get the applicable guild config for the given object"""
 
     if isinstance(_object, TextChannel):
-        return "guild_channels"
+        return guild_config.channels
     elif isinstance(_object, Role):
-        return "guild_roles"
+        return guild_config.roles
     else:
         raise TypeError("Object must be a TextChannel or Role")
 
@@ -58,37 +59,39 @@ class GuildsCog(BaseCog, name="Guild Integrations"):
         description="Manage guild roles integration"
     )
 
-    def set_purpose(self, _object, purpose, /) -> bool:
+    async def set_purpose(self, _object, purpose, /) -> bool:
         """Set the purpose of an object, returns bool if successful or not"""
 
-        table = get_table(_object)
-
-        try:
-            db.execute(
-                f"INSERT INTO {table} VALUES (?, ?, ?)",
-                _object.id, _object.guild.id, purpose.value
-            )
-            return True
-        except sqlite3.IntegrityError:
-            return False
+        return await get_purpose_map(_object).set(
+            _object.id, _object.guild.id, purpose.value
+        )
 
-    def remove_purpose(self, _object, /) -> bool:
+    async def remove_purpose(self, _object, /) -> bool:
         """Clear the purpose of a given object"""
 
-        table = get_table(_object)
-        column_prefix = table.split("_")[1][:-1]
-        assert column_prefix in ("channel", "role")
+        return await get_purpose_map(_object).remove(_object.id)
 
-        db.execute(
-            f"DELETE FROM {table} WHERE {column_prefix}_id = ?",
-            _object.id
-        )
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel:abc.GuildChannel):
+        """Forget the purpose of a deleted channel"""
+
+        if channel.id in guild_config.channels:
+            await guild_config.channels.remove(channel.id)
+            log.info("Purposed channel %s was deleted", channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role:Role):
+        """Forget the purpose of a deleted role"""
+
+        if role.id in guild_config.roles:
+            await guild_config.roles.remove(role.id)
+            log.info("Purposed role %s was deleted", role.id)
 
     @channel_group.command(name="list")
     async def list_channels(self, inter:Inter):
         """List all configured guild channels"""
 
-        data = db.records(
+        data = await adb.records(
             "SELECT * FROM guild_channels WHERE guild_id = ?",
             inter.guild.id
         )
@@ -112,7 +115,7 @@ class GuildsCog(BaseCog, name="Guild Integrations"):
     ):
         """Set the purpose of a channel"""
 
-        if self.set_purpose(channel, purpose):
+        if await self.set_purpose(channel, purpose):
             await inter.response.send_message(
                 f"{channel.mention} has been purposed for {purpose.name}"
             )
@@ -125,7 +128,7 @@ class GuildsCog(BaseCog, name="Guild Integrations"):
     async def remove_channel(self, inter:Inter, channel:TextChannel):
         """Remove the purpose of a channel"""
 
-        self.remove_purpose(channel)
+        await self.remove_purpose(channel)
 
         await inter.response.send_message(
             f"Channel {channel.mention} no longer has a purpose with me"
@@ -136,7 +139,7 @@ class GuildsCog(BaseCog, name="Guild Integrations"):
     async def add_role(self, inter:Inter, role:Role, purpose:app_commands.Choice[int]):
         """Set the purpose of a role"""
 
-        if self.set_purpose(role, purpose):
+        if await self.set_purpose(role, purpose):
             await inter.response.send_message(
                 f"{role.mention} has been purposed for {purpose.name}"
             )
@@ -149,7 +152,7 @@ class GuildsCog(BaseCog, name="Guild Integrations"):
     async def remove_role(self, inter:Inter, role:Role):
         """Remove the purpose of a role"""
 
-        self.remove_purpose(role)
+        await self.remove_purpose(role)
 
         await inter.response.send_message(
             f"Channel {role.mention} is no longer configured"
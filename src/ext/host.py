@@ -6,6 +6,9 @@ import platform
 import discord
 from discord import app_commands, Interaction as Inter
 
+from db import db, guild_config
+from ui import avatars, card_cache
+from render import worker, encoder
 from . import BaseCog
 
 
@@ -48,6 +51,30 @@ class HostCog(BaseCog, name='Host Interactions'):
             },
             'Network': {
                 'Latency': f'{round(self.bot.latency*1000, 2)}ms',
+            },
+            'Database': {
+                'Commits': db.commit_stats.commits,
+                'Rows Per Commit': round(db.commit_stats.rows_per_commit, 2),
+                'Commit Latency': f'{round(db.commit_stats.mean_latency*1000, 2)}ms',
+                'Max Commit Latency': f'{round(db.commit_stats.max_latency*1000, 2)}ms',
+            },
+            'Lookups': self.bot.get.stats,
+            'XP Policy': self.bot.xp_policy.stats,
+            'Guild Config': guild_config.stats,
+            'Avatar Cache': avatars.stats,
+            'Card Cache': card_cache.stats,
+            'Render Workers': {
+                'Queued': worker.stats.queued,
+                'Running': worker.stats.running,
+                'Max Queued': worker.stats.max_queued,
+                'Completed': worker.stats.completed,
+                'Timeouts': worker.stats.timeouts,
+                'Failures': worker.stats.failures,
+            },
+            'Card Encoding': {
+                card_type: f'{round(stats.mean_bytes/1024)}KB in '
+                    f'{round(stats.mean_seconds*1000, 2)}ms'
+                for card_type, stats in encoder.stats.items()
             }
         }
 
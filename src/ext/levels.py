@@ -1,18 +1,19 @@
 """Level progression cog"""
 
+import time
 import logging
-from datetime import datetime, timedelta
+from typing import Literal
 
 import discord
 from discord import app_commands
 from discord import Interaction as Inter
 from discord.ext import commands
 
-from db import db, MemberLevelModel, UserSettings
+from db import ranks, MemberLevelModel, UserSettings, XPRule
 from db.enums import UserSettingsNames
-from ui import LevelCard, ScoreBoard, LevelUpCard
+from ui import LevelCard, ScoreBoard, LevelUpCard, avatars, card_cache
 from utils import is_bot_owner
-from exceptions import EmptyQueryResult
+from exceptions import EmptyQueryResult, RenderTimeout
 from . import BaseCog
 
 
@@ -39,22 +40,27 @@ class LevelCog(BaseCog, name='Level Progression'):
         await self.bot.wait_until_ready()
         await self.validate_members()
 
+        for guild in self.bot.guilds:
+            await ranks.load(guild.id, self.bot.xp_ledger.flush)
+
     @commands.Cog.listener(name="on_member_join")
     async def register_new_member(self, member:discord.Member):
         """Event to add new members to the rank database"""
 
-        self.register_member(member)
+        await self.register_member(member)
 
     @commands.Cog.listener(name="on_member_remove")
     async def remove_member(self, member:discord.Member):
         """Event to remove members from the rank database"""
 
         log.debug("Removing member %s", member)
+        self.bot.xp_ledger.forget(member.guild.id, member.id)
+        card_cache.evict(member.guild.id, member.id)
         MemberLevelModel.from_database(
             member.id, member.guild.id
         ).delete()
 
-    def gain_exp(self, member:discord.Member, amount:int) -> None | bool:
+    async def gain_exp(self, member:discord.Member, amount:int) -> None | bool:
         """Gives the given member the given amount of exp
 
         Args:
@@ -75,15 +81,18 @@ class LevelCog(BaseCog, name='Level Progression'):
             log.debug("Member is a bot, cannot add xp")
             return
 
-        lvl_obj = MemberLevelModel.from_database(
-            member.id, member.guild.id
+        # The ledger applies the xp in memory and saves it later
+        xp_before, xp_after = await self.bot.xp_ledger.add(
+            member.guild.id, member.id, amount
         )
 
-        # Update the xp and check for a level up
-        level_before = lvl_obj.level
-        lvl_obj.set_xp(lvl_obj.xp_raw + amount)
+        # Cards showing the old xp will never be served again
+        card_cache.evict(member.guild.id, member.id)
 
-        lvl_obj.update()
+        # Check for a level up
+        lvl_obj = MemberLevelModel(member.id, member.guild.id, xp_before)
+        level_before = lvl_obj.level
+        lvl_obj.set_xp(xp_after)
 
         return level_before, lvl_obj.level
 
@@ -95,12 +104,20 @@ class LevelCog(BaseCog, name='Level Progression'):
             message (discord.Message): The discord msg object
         """
 
-        if message.author.bot:
+        # In guild channels the author is already a Member, so the xp
+        # path doesn't need to look anything up
+        member = message.author
+        if message.guild is None or member.bot \
+            or not isinstance(member, discord.Member):
             return
 
-        log.debug("Message event triggered by %s", message.author)
-        member = await self.bot.get.member(message.author.id, message.guild.id)
-        levels = self.gain_exp(member, 35)
+        log.debug("Message event triggered by %s", member)
+
+        amount = self.bot.xp_policy.award(member.guild.id, member.id, "message")
+        if not amount:
+            return
+
+        levels = await self.gain_exp(member, amount)
 
         if not levels:
             return
@@ -112,18 +129,37 @@ class LevelCog(BaseCog, name='Level Progression'):
             await message.reply("GG! You've advanced to level %s" % after)
 
     @commands.Cog.listener()
-    async def on_member_update(self, _, member:discord.Member):
+    async def on_member_update(self, before:discord.Member, member:discord.Member):
         """On member update event
 
         Args:
-            _ (discord.Member): The member before the update
+            before (discord.Member): The member before the update
             member (discord.Member): The member after the update
         """
 
         log.debug("Member update event triggered by %s", member)
-        self.gain_exp(member, 150)
 
-    def register_member(self, member:discord.Member):
+        # Guild avatars are cached for the level cards
+        if before.display_avatar != member.display_avatar:
+            avatars.invalidate(before.display_avatar)
+
+        if member.bot:
+            return
+
+        amount = self.bot.xp_policy.award(
+            member.guild.id, member.id, "member_update"
+        )
+        if amount:
+            await self.gain_exp(member, amount)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before:discord.User, after:discord.User):
+        """Forget the cached avatar when a user changes it"""
+
+        if before.display_avatar != after.display_avatar:
+            avatars.invalidate(before.display_avatar)
+
+    async def register_member(self, member:discord.Member):
         """Register a new member in the database
 
         Args:
@@ -136,19 +172,15 @@ class LevelCog(BaseCog, name='Level Progression'):
             log.debug("Member is a bot, skipping")
             return
 
-        try:
-            MemberLevelModel.from_database(
-                member.id, member.guild.id
-            )
-            log.debug("Member is already in the database, skipping")
-        except EmptyQueryResult:
-            MemberLevelModel(member.id, member.guild.id, 1).savenew()
+        if await MemberLevelModel.register(member.guild.id, member.id):
             log.debug("Member added to the database")
-
+        else:
+            log.debug("Member is already in the database, skipping")
 
     async def validate_members(self, guild:discord.Guild=None):
-        """Iterate through all members in the guild and add them to
-        the rank database if they aren't in it.
+        """Add every member of the guilds to the rank database if they
+        aren't in it. Each guild is reconciled in bulk, one query for
+        the members already registered and chunked inserts for the rest.
 
         Will only validate members in the given guild if one is given.
         """
@@ -160,12 +192,17 @@ class LevelCog(BaseCog, name='Level Progression'):
         else:
             guilds = (guild,)
 
-        i = 0
         for guild in guilds:
-            for i, member in enumerate(guild.members):
-                self.register_member(member)
-
-            log.debug("Validated %s members for %s", i, guild.name)
+            start = time.perf_counter()
+            added = await MemberLevelModel.register_many(
+                guild.id,
+                (member.id for member in guild.members if not member.bot)
+            )
+            log.info(
+                "Validated %s members for %s in %.1fms, %s added",
+                guild.member_count, guild.name,
+                (time.perf_counter() - start) * 1000, added
+            )
 
     @app_commands.command(name="scoreboard")
     async def scoreboard_cmd(
@@ -193,45 +230,67 @@ class LevelCog(BaseCog, name='Level Progression'):
 
         log.debug("Gathering member level data")
 
+        guild_ranks = await ranks.load(
+            inter.guild.id, self.bot.xp_ledger.flush
+        )
+
         # Create a list of tuples containing a member object
         # and their level object
         members = [
-            (
-                await self.bot.get.member(member_id, inter.guild.id),
-                MemberLevelModel(member_id, inter.guild.id, xp)
-            )
-            for member_id, xp in db.records(
-                "SELECT member_id, experience FROM member_levels "
-                "WHERE guild_id=? ORDER BY experience DESC LIMIT ?",
-                inter.guild.id, length
-            )
+            (member, MemberLevelModel(member_id, inter.guild.id, xp))
+            for member_id, xp in guild_ranks.top(length)
+            if (member := await self.bot.get.member(
+                member_id, inter.guild.id
+            )) is not None
         ]
 
-        log.debug("Estimating the time to complete")
-
-        # Display the estimated time to finish drawing the scoreboard
-        est_finish_dt = datetime.now() + timedelta(seconds=len(members)*3)
-        est = int(est_finish_dt.timestamp())
         await inter.response.send_message(
-            content="Drawing scoreboard..."
-            f"\nEstimated time: <t:{est}:R>"
+            content=f"Drawing scoreboard... (0/{len(members)})"
         )
 
         log.debug("Creating & Drawing scoreboard")
 
+        last_update = time.monotonic()
+
+        async def report_progress(done:int, total:int):
+            """Show the progress, at most once a second"""
+
+            nonlocal last_update
+
+            if done < total and time.monotonic() - last_update < 1:
+                return
+
+            last_update = time.monotonic()
+            await inter.edit_original_response(
+                content=f"Drawing scoreboard... ({done}/{total})"
+            )
+
         scoreboard = ScoreBoard(members)
-        await scoreboard.draw()  # This will take a while
+        try:
+            await scoreboard.draw(progress=report_progress)
+
+        except RenderTimeout as err:
+            # The renderer is overloaded, a text scoreboard will do
+            log.warning("Falling back to a text scoreboard: %s", err)
+            await inter.edit_original_response(
+                content=f"**{inter.guild} | Showing {len(members)} "
+                    f"of {inter.guild.member_count} members**\n" + "\n".join(
+                        f"#{i} {member.display_name} - level "
+                        f"{lvl_obj.level} ({lvl_obj.xp} XP)"
+                        for i, (member, lvl_obj) in enumerate(members, 1)
+                    )
+            )
+            return
 
         # Let the user know that progress is being made
         await inter.edit_original_response(
-            content="Scoreboard created!\nMaking a "
-            "file of it now, this may take a moment..."
+            content="Scoreboard created! Uploading it now..."
         )
 
         log.debug("Making scoreboard file")
 
-        # Create a discord file object from the scoreboard
-        file = scoreboard.get_file()  # This can take a while
+        # Encoded in a thread, so other commands keep being handled
+        file = await scoreboard.get_file()
 
         # Now that we are done drawing, send the file
         await inter.edit_original_response(
@@ -252,9 +311,17 @@ class LevelCog(BaseCog, name='Level Progression'):
         # which is needed for the level card, so we need
         # to get the member from the guild again.
         member = member or inter.user
-        member = await self.bot.get.member(
-            member.id, inter.guild.id
-        )
+        found = await self.bot.get.member(member.id, inter.guild.id)
+
+        # Members who have left the guild can still be picked
+        if found is None:
+            log.debug("Member %s not found, not sending levelboard", member)
+            await inter.response.send_message(
+                f"Sorry, I couldn't find {member.mention} in this server.",
+                ephemeral=True
+            )
+            return
+        member = found
 
         log.debug('%s is checking the rank of %s', inter.user, member)
 
@@ -269,15 +336,18 @@ class LevelCog(BaseCog, name='Level Progression'):
             )
             return
 
+        await ranks.load(inter.guild.id, self.bot.xp_ledger.flush)
+
         try:
-            # Create the level object from the database
-            level_object = MemberLevelModel.from_database(
-                member.id, inter.guild.id
+            # Create the level object from the member's current xp
+            level_object = MemberLevelModel(
+                member.id, inter.guild.id,
+                await self.bot.xp_ledger.total(inter.guild.id, member.id)
             )
 
         except EmptyQueryResult as err:
             log.error(err)
-            self.register_member(member)
+            await self.register_member(member)
             await inter.followup.send(
                 f"I couldn't find {member.mention} in the database."
                 "\nI've corrected this now, please try again.",
@@ -287,11 +357,23 @@ class LevelCog(BaseCog, name='Level Progression'):
 
         # Create the level card
         levelcard = LevelCard(member, level_object)
-        await levelcard.draw()
+        try:
+            await levelcard.draw()
+
+        except RenderTimeout as err:
+            # The renderer is overloaded, the numbers will do
+            log.warning("Falling back to a text rank: %s", err)
+            await inter.followup.send(
+                f"**{member.display_name}** | Rank #{level_object.rank} | "
+                f"Level {level_object.level} | "
+                f"{level_object.xp} / {level_object.next_xp} XP",
+                ephemeral=ephemeral
+            )
+            return
 
         # All done! Send the card as a file.
         await inter.followup.send(
-            file=levelcard.get_file(),
+            file=await levelcard.get_file(),
             ephemeral=ephemeral
         )
 
@@ -326,10 +408,52 @@ class LevelCog(BaseCog, name='Level Progression'):
     async def force_validate_members(self, inter:Inter):
         """Force validate all members in the guild"""
 
-        await self.validate_members()
+        await inter.response.defer(ephemeral=True, thinking=True)
+        await self.validate_members(inter.guild)
+
+        await inter.followup.send("Validation Complete!", ephemeral=True)
+
+    @admin_group.command(name="xp-policy")
+    @app_commands.describe(
+        source="What the xp is earned for",
+        amount="The xp given each time",
+        burst="How many times in a row xp can be earned",
+        refill_seconds="Seconds until xp can be earned once more"
+    )
+    async def set_xp_policy_cmd(
+        self,
+        inter:Inter,
+        source:Literal["message", "member_update"],
+        amount:app_commands.Range[int, 0, 10_000],
+        burst:app_commands.Range[int, 1, 100],
+        refill_seconds:app_commands.Range[float, 0, 86_400]
+    ):
+        """Change how much xp members earn in this guild and how often"""
+
+        rule = XPRule(amount, burst, refill_seconds)
+        await self.bot.xp_policy.set_rule(inter.guild.id, source, rule)
 
         await inter.response.send_message(
-            "Validation Complete!",
+            f"Members now earn {amount} xp per {source}, up to {burst} "
+            f"times in a row and once more every {refill_seconds} seconds",
+            ephemeral=True
+        )
+
+    @admin_group.command(name="xp-policy-reset")
+    async def reset_xp_policy_cmd(
+        self,
+        inter:Inter,
+        source:Literal["message", "member_update"]
+    ):
+        """Go back to the default xp policy for a source"""
+
+        await self.bot.xp_policy.reset_rule(inter.guild.id, source)
+        rule = self.bot.xp_policy.rule(inter.guild.id, source)
+
+        await inter.response.send_message(
+            f"Members now earn the default {rule.amount} xp per {source}, "
+            f"up to {rule.burst} times in a row and once more every "
+            f"{rule.refill_seconds} seconds",
             ephemeral=True
         )
 
@@ -338,7 +462,7 @@ class LevelCog(BaseCog, name='Level Progression'):
     async def add_xp_cmd(self, inter:Inter, target:discord.Member, xp:int):
         """Add xp to a member, only the bot owner can use this"""
 
-        self.gain_exp(target, xp)
+        await self.gain_exp(target, xp)
 
         await inter.response.send_message(
             f"Added {xp} xp to {target.mention}",
@@ -349,11 +473,8 @@ class LevelCog(BaseCog, name='Level Progression'):
     async def set_xp_cmd(self, inter:Inter, target:discord.Member, xp:int):
         """Set the xp of a member, only the bot owner can use this"""
 
-        lvl_obj = MemberLevelModel.from_database(
-            target.id, inter.guild.id
-        )
-        lvl_obj.set_xp(xp)
-        lvl_obj.update()
+        await self.bot.xp_ledger.set(inter.guild.id, target.id, xp)
+        card_cache.evict(inter.guild.id, target.id)
 
         await inter.response.send_message(
             f"Set {target.mention}'s xp to {xp}",
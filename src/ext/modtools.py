@@ -35,7 +35,7 @@ class ModToolsCog(BaseCog, name="Moderation Tools"):
         if type(member_or_id) is str:
             try:
                 user = await self.bot.get.user(int(member_or_id))
-            except (discord.NotFound, ValueError):
+            except ValueError:
                 user = None
         else:
             user = await self.bot.get.user(member_or_id.id)
@@ -5,7 +5,7 @@ import discord
 from discord.ext import commands
 
 from exceptions import EmptyQueryResult
-from db import db
+from db import guild_config
 from db.enums import ChannelPurposes
 from ui import WelcomeEmbed, RemoveEmbed
 from . import BaseCog
@@ -24,18 +24,17 @@ class Welcome(BaseCog):
         self,
         guild_id:int,
         purpose_id:int
-    ) -> discord.TextChannel | None:
+    ) -> discord.TextChannel:
         """Get a channel object"""
 
-        channel_id = db.field(
-            "SELECT channel_id FROM guild_channels " \
-            "WHERE guild_id = ? AND purpose_id = ?",
-            guild_id, purpose_id
-        )
+        channel_id = guild_config.channels.get(guild_id, purpose_id)
         if not channel_id:
             raise EmptyQueryResult("No channel with that purpose found")
 
         channel = await self.bot.get.channel(channel_id)
+        if channel is None:
+            raise EmptyQueryResult("The channel with that purpose is gone")
+
         return channel
 
     @commands.Cog.listener()
@@ -2,13 +2,17 @@
 
 import asyncio
 
-from bot import Bot
 import timer
 
 @timer.timefunc
 async def main():
     """Main function for starting the application"""
 
+    # Imported here rather than at the top because the render worker
+    # processes import this module when they start, and they shouldn't
+    # have to load the whole bot.
+    from bot import Bot  # pylint: disable=import-outside-toplevel
+
     # You will need to create this file if it doesn't exist
     # and paste your bot token in it.
     with open('OneBot/src/TOKEN', 'r', encoding='utf-8') as file:
@@ -0,0 +1,16 @@
+"""Image rendering that doesn't depend on discord or the database.
+
+The ui package turns discord objects into plain specs, the functions
+here draw them. Keeping this package light means it can be imported by
+the worker processes that do the drawing off the event loop.
+"""
+
+from . import worker, encoder
+from .levelcard import (
+    LevelCardSpec,
+    get_colours,
+    prepare_avatar,
+    render_levelcard,
+    render_levelcard_file
+)
+from .scoreboard import composite_scoreboard, render_scoreboard_file
@@ -0,0 +1,143 @@
+"""Encodes drawn cards into image files for uploading"""
+
+import time
+import asyncio
+import logging
+from io import BytesIO
+from dataclasses import dataclass
+
+from PIL import Image
+
+
+log = logging.getLogger(__name__)
+
+# Encoding name: (file extension, PIL format)
+ENCODINGS = {
+    "png": ("png", "PNG"),
+    "png-palette": ("png", "PNG"),
+    "webp": ("webp", "WEBP"),
+}
+
+
+@dataclass
+class EncodeStats:
+    """Encoded size and time for one type of card"""
+
+    cards: int = 0
+    total_bytes: int = 0
+    total_seconds: float = 0
+    last_bytes: int = 0
+    last_seconds: float = 0
+
+    @property
+    def mean_bytes(self) -> float:
+        return self.total_bytes / self.cards if self.cards else 0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.cards if self.cards else 0
+
+
+# Stats by card type
+stats: dict[str, EncodeStats] = {}
+
+def extension(encoding:str) -> str:
+    """Get the file extension for an encoding"""
+
+    return ENCODINGS[encoding][0]
+
+def encode(
+    image:Image.Image,
+    encoding:str="png",
+    compress_level:int=6
+) -> bytes:
+    """Encode an image
+
+    Args:
+        image (Image.Image): The image to encode.
+        encoding (str, optional): "png", "png-palette" for a png reduced
+            to 256 colours, or "webp" for a lossless webp.
+            Defaults to "png".
+        compress_level (int, optional): Effort from 0 to 9, higher is
+            smaller and slower. Used as the zlib level for png and the
+            method for webp. Defaults to 6.
+
+    Returns:
+        bytes: The image file.
+    """
+
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding {encoding!r}")
+
+    buffer = BytesIO()
+
+    match encoding:
+
+        case "png":
+            image.save(buffer, "PNG", compress_level=compress_level)
+
+        case "png-palette":
+            # Fast octree is the only built in method that keeps alpha
+            image.quantize(
+                256, method=Image.FASTOCTREE
+            ).save(buffer, "PNG", compress_level=compress_level)
+
+        case "webp":
+            # exact keeps the colour of transparent pixels, like the
+            # card's rounded corners, which libwebp would otherwise change
+            image.save(
+                buffer, "WEBP", lossless=True, exact=True,
+                method=min(compress_level, 6)
+            )
+
+    return buffer.getvalue()
+
+def timed_encode(
+    image:Image.Image,
+    encoding:str="png",
+    compress_level:int=6
+) -> tuple[bytes, float]:
+    """Encode an image, also returning the seconds it took. This is
+    what the render processes use, their stats are recorded by the
+    caller with record()."""
+
+    start = time.perf_counter()
+    data = encode(image, encoding, compress_level)
+    return data, time.perf_counter() - start
+
+def record(card_type:str, data:bytes, seconds:float) -> None:
+    """Add an encoded card to the stats of its type"""
+
+    card_stats = stats.setdefault(card_type, EncodeStats())
+    card_stats.cards += 1
+    card_stats.total_bytes += len(data)
+    card_stats.total_seconds += seconds
+    card_stats.last_bytes = len(data)
+    card_stats.last_seconds = seconds
+
+    log.debug(
+        "Encoded %s in %.1fms, %s bytes",
+        card_type, seconds * 1000, len(data)
+    )
+
+async def encode_card(
+    image:Image.Image,
+    card_type:str,
+    encoding:str="png",
+    compress_level:int=6
+) -> bytes:
+    """Encode a card in a thread, recording its size and encode time
+
+    Args:
+        image (Image.Image): The card.
+        card_type (str): Name of the card type the stats are kept under.
+
+    Returns:
+        bytes: The image file.
+    """
+
+    data, seconds = await asyncio.to_thread(
+        timed_encode, image, encoding, compress_level
+    )
+    record(card_type, data, seconds)
+    return data
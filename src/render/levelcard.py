@@ -0,0 +1,466 @@
+"""Draws level cards from a LevelCardSpec"""
+
+import logging
+from io import BytesIO
+from typing import Callable
+from functools import lru_cache
+from dataclasses import dataclass
+
+from easy_pil import Editor, Canvas, Text
+from PIL import Image, ImageDraw, ImageFont
+
+from constants import (
+    WHITE,
+    BLACK,
+    LIGHT_GREY,
+    DARK_GREY,
+    POPPINS,
+    POPPINS_SMALL,
+    RENDER_LAYER_CACHE_SIZE
+)
+from .encoder import timed_encode
+
+
+log = logging.getLogger(__name__)
+
+# Progress bar dimensions
+BAR_POSITION = (420, 275)
+BAR_WIDTH = 1320
+BAR_HEIGHT = 60
+BAR_RADIUS = 40
+
+def get_colours(dark_mode:bool) -> tuple[str, str, str, str]:
+    """Get the colours for the levelboard
+    Returns the colours as a tuple in the following order:
+        background1, background2, foreground1, foreground2
+
+    Args:
+        dark_mode (bool): Whether the levelboard is in dark mode
+
+    Returns:
+        tuple[str, str, str, str]: The colours for the levelboard
+    """
+
+    log.debug("Getting colours for levelcard, darkmode=%s", dark_mode)
+
+    if dark_mode:
+        return BLACK, DARK_GREY, WHITE, LIGHT_GREY
+
+    return WHITE, LIGHT_GREY, BLACK, DARK_GREY
+
+def prepare_avatar(data:bytes) -> Image.Image:
+    """Turn downloaded avatar bytes into the circle drawn on cards
+
+    Args:
+        data (bytes): The avatar image file.
+
+    Returns:
+        Image.Image: The avatar as a 300x300 circle.
+    """
+
+    log.debug("Preparing avatar image")
+
+    avatar = Image.open(BytesIO(data))
+    return Editor(avatar).resize((300, 300)).circle_image().image
+
+
+@dataclass(frozen=True)
+class LevelCardSpec:
+    """Everything needed to draw a level card, as plain values so it
+    can be sent to a worker process"""
+
+    name: str
+    discriminator: str
+    status: str
+    is_darkmode: bool
+    accent_colour: tuple[int, int, int]
+    status_colour: tuple[int, int, int]
+    xp: str
+    next_xp: str
+    xp_raw: int
+    next_xp_raw: float
+    level: int
+    rank: int | str
+    avatar: Image.Image
+    direct: bool = False
+
+
+def _halve(image:Image.Image) -> Image.Image:
+    """Resize an image to half its size, antialiasing it"""
+
+    return image.resize(
+        size=tuple(i//2 for i in image.size),
+        resample=Image.ANTIALIAS
+    )
+
+@lru_cache(maxsize=8)
+def _font(font:ImageFont.FreeTypeFont, scale:float) -> ImageFont.FreeTypeFont:
+    """A font at a scale of its size"""
+
+    if scale == 1:
+        return font
+    return font.font_variant(size=round(font.size * scale))
+
+
+@lru_cache(maxsize=RENDER_LAYER_CACHE_SIZE)
+def _background_layer(
+    is_darkmode:bool,
+    accent_colour:tuple[int, int, int]
+) -> Image.Image:
+    """The parts of the card that are the same for every member with
+    this theme and accent colour: the rounded background, the accent
+    polygon and the trough of the progress bar. Nothing else is drawn
+    near the corners, so they can be rounded here once.
+
+    The image is shared, copy it before drawing on it.
+    """
+
+    log.debug("Drawing background layer")
+
+    background_1, background_2, _, _ = get_colours(is_darkmode)
+
+    editor = Editor(Canvas((1800, 400), color=background_1))
+
+    editor.polygon(
+        (
+            (2, 2),  # top left
+            (2, 360),  # bottom left
+            (360, 2),  # bottom right
+            (2, 2)  # top right
+        ),
+        fill=accent_colour
+    )
+
+    # The trough for the progress bar
+    editor.rectangle(
+        position=BAR_POSITION,
+        width=BAR_WIDTH, height=BAR_HEIGHT,
+        color=background_2,
+        radius=BAR_RADIUS
+    )
+
+    return editor.rounded_corners(20).image
+
+@lru_cache(maxsize=2)
+def _avatar_frame(is_darkmode:bool) -> Image.Image:
+    """The circle that gives the avatar a border. Shared, copy it."""
+
+    background_1, _, _, _ = get_colours(is_darkmode)
+    return Editor(Canvas((320, 320), color=background_1)).circle_image().image
+
+@lru_cache(maxsize=RENDER_LAYER_CACHE_SIZE)
+def _status_layer(
+    is_darkmode:bool,
+    status:str,
+    status_colour:tuple[int, int, int]
+) -> Image.Image:
+    """The status icon for a theme and status. Shared, don't modify."""
+
+    log.debug("Drawing status icon layer")
+
+    background_1, _, _, _ = get_colours(is_darkmode)
+
+    status_image = Editor(Canvas(
+        (90, 90),
+        color=background_1
+    )).circle_image().paste(
+        Editor(Canvas(
+            (70, 70),
+            color=status_colour
+        )).circle_image(),
+        (10, 10)
+    )
+
+    log.debug("Drawing status icon symbol")
+
+    match status:
+
+        case "idle":
+            status_image.paste(Editor(Canvas(
+                (50, 50),
+                color=background_1
+            )).circle_image(), (5, 10))
+
+        case "dnd":
+            status_image.rectangle(
+                (20, 39), width=50, height=12,
+                fill=background_1, radius=15
+            )
+
+        case "offline":
+            status_image.paste(Editor(Canvas(
+                (40, 40),
+                color=background_1
+            )).circle_image(), (25, 25))
+
+        case _:
+            pass
+
+    return status_image.image
+
+@lru_cache(maxsize=RENDER_LAYER_CACHE_SIZE)
+def _direct_layer(layer:Callable[..., Image.Image], *args) -> Image.Image:
+    """A static layer at the size direct rendering draws at. It is
+    drawn at double size and halved once, so its curves stay smooth.
+    """
+
+    return _halve(layer(*args))
+
+
+class LevelCardRenderer:
+    """Draws a single level card.
+
+    The layers that only depend on the theme, status and accent colour
+    are drawn once per process and cached, so drawing a card only draws
+    the avatar, progress, name and numbers of the member.
+
+    Positions are given for an 1800x400 card. By default the card is
+    drawn at that size and halved to antialias it. Specs with direct
+    set are drawn straight at 900x200 instead, which is a lot less
+    work; only the curved edge of the progress bar is supersampled.
+    """
+
+    __slots__ = (
+        "spec", "editor", "scale",
+        "_foreground_1",
+        "_foreground_2",
+        "_background_1",
+        "_background_2"
+    )
+
+    def __init__(self, spec:LevelCardSpec):
+        self.spec = spec
+        self.scale = 0.5 if spec.direct else 1
+        (self._background_1,
+         self._background_2,
+         self._foreground_1,
+         self._foreground_2) = get_colours(spec.is_darkmode)
+
+    def _xy(self, position:tuple[int, int]) -> tuple[int, int]:
+        """Scale a position on the 1800x400 card"""
+
+        return tuple(round(i * self.scale) for i in position)
+
+    def _layer(self, layer:Callable[..., Image.Image], *args) -> Image.Image:
+        """Get a cached static layer at the size being drawn"""
+
+        if self.spec.direct:
+            return _direct_layer(layer, *args)
+        return layer(*args)
+
+    def _text(self, text:str, font:ImageFont.FreeTypeFont, colour) -> Text:
+        return Text(text, font=_font(font, self.scale), color=colour)
+
+    def render(self) -> Image.Image:
+        """Draw the level card"""
+
+        log.debug("Drawing levelcard, direct=%s", self.spec.direct)
+
+        # Editor copies the image, so the cached layer isn't modified
+        self.editor = Editor(self._layer(
+            _background_layer,
+            self.spec.is_darkmode,
+            self.spec.accent_colour
+        ))
+
+        # Draw the various elements of the card
+        self._draw_avatar()
+        self._draw_status_icon()
+        self._draw_progress_bar()
+        self._draw_name()
+        self._draw_exp()
+        self._draw_levelrank()
+
+        if self.spec.direct:
+            return self.editor.image
+
+        # The card is resized to half its size to antialias it
+        return _halve(self.editor.image)
+
+    def _draw_avatar(self):
+        """Draw the avatar on the card"""
+
+        log.debug("Drawing avatar image")
+
+        # Give the avatar circle a border
+        avatar_image = _avatar_frame(self.spec.is_darkmode).copy()
+        avatar_image.alpha_composite(self.spec.avatar, (10, 10))
+
+        if self.spec.direct:
+            avatar_image = _halve(avatar_image)
+
+        # Paste the avatar onto the card, only compositing its area
+        self.editor.image.alpha_composite(avatar_image, self._xy((40, 40)))
+
+    def _draw_status_icon(self):
+        """Draw the status icon on the card"""
+
+        log.debug("Drawing status icon")
+
+        self.editor.image.alpha_composite(
+            self._layer(
+                _status_layer,
+                self.spec.is_darkmode,
+                self.spec.status,
+                self.spec.status_colour
+            ),
+            self._xy((260, 260))
+        )
+
+    def _draw_progress_bar(self):
+        """Draw the progress bar"""
+
+        log.debug("Drawing progress bar")
+
+        percentage = (self.spec.xp_raw / self.spec.next_xp_raw) * 100
+        percentage = max(percentage, 5)  # <10 causes visual issues
+
+        if self.spec.direct:
+            self._draw_direct_bar(percentage)
+            return
+
+        # The trough is part of the background layer, this is the bar
+        # itself, which changes based on the member's xp
+        self.editor.bar(
+            position=BAR_POSITION,
+            max_width=BAR_WIDTH, height=BAR_HEIGHT,
+            color=self.spec.accent_colour,
+            percentage=percentage,
+            radius=BAR_RADIUS
+        )
+
+    def _draw_direct_bar(self, percentage:float):
+        """Draw the progress bar at direct size through a mask that is
+        drawn at double size and halved, so its rounded ends are smooth
+        """
+
+        x, y = BAR_POSITION
+        to_width = BAR_WIDTH / 100 * percentage
+
+        # The mask starts on an even row so it halves onto whole pixels
+        offset = y % 2
+        mask = Image.new("L", (BAR_WIDTH + 2, BAR_HEIGHT + 4))
+        ImageDraw.Draw(mask).rounded_rectangle(
+            (0, offset, to_width, offset + BAR_HEIGHT),
+            radius=BAR_RADIUS,
+            fill=255
+        )
+
+        self.editor.image.paste(
+            self.spec.accent_colour,
+            self._xy((x, y - offset)),
+            _halve(mask)
+        )
+
+    def _draw_name(self):
+        """Draw the member's name on the card"""
+
+        log.debug("Drawing name text")
+
+        # Shorthands for the name and discriminator
+        name = self.spec.name
+        discriminator = f"#{self.spec.discriminator}"
+
+        # Prevent the name text from overflowing
+        if len(name) > 15:
+            log.debug("Name is too long, shortening")
+            name = name[:15]
+
+        # Draw it right onto the card
+        self.editor.multi_text(
+            position=self._xy((420, 220)),  # bottom left
+            texts=(
+                self._text(
+                    name,
+                    POPPINS,
+                    self._foreground_1
+                ),
+                self._text(
+                    discriminator,
+                    POPPINS_SMALL,
+                    self._foreground_2
+                )
+            )
+        )
+
+    def _draw_exp(self):
+        """Draw the exp and next exp on the card"""
+
+        log.debug("Drawing exp text")
+
+        # Draw it right onto the card
+        self.editor.multi_text(
+            position=self._xy((1740, 225)),  # bottom right
+            align="right",
+            texts=(
+                self._text(
+                    self.spec.xp,
+                    POPPINS_SMALL,
+                    self._foreground_1
+                ),
+                self._text(
+                    f"/ {self.spec.next_xp} XP",
+                    POPPINS_SMALL,
+                    self._foreground_2
+                )
+            )
+        )
+
+    def _draw_levelrank(self):
+        """Draw the level and rank on the card"""
+
+        log.debug("Drawing level and rank text")
+
+        self.editor.multi_text(
+            position=self._xy((1700, 80)),  # top right
+            align="right",
+            texts=(
+                self._text(
+                    "RANK",
+                    POPPINS_SMALL,
+                    self._foreground_2
+                ),
+                self._text(
+                    f"#{self.spec.rank} ",
+                    POPPINS,
+                    self.spec.accent_colour
+                ),
+                self._text(
+                    "LEVEL",
+                    POPPINS_SMALL,
+                    self._foreground_2
+                ),
+                self._text(
+                    str(self.spec.level),
+                    POPPINS,
+                    self.spec.accent_colour
+                )
+            )
+        )
+
+
+def render_levelcard(spec:LevelCardSpec) -> Image.Image:
+    """Draw a level card, this is what the worker processes run
+
+    Args:
+        spec (LevelCardSpec): The card to draw.
+
+    Returns:
+        Image.Image: The finished 900x200 card.
+    """
+
+    return LevelCardRenderer(spec).render()
+
+def render_levelcard_file(
+    spec:LevelCardSpec,
+    encoding:str="png",
+    compress_level:int=6
+) -> tuple[bytes, float]:
+    """Draw and encode a level card, so only the file has to be sent
+    back from the worker process
+
+    Returns:
+        tuple[bytes, float]: The file and the seconds spent encoding it.
+    """
+
+    return timed_encode(render_levelcard(spec), encoding, compress_level)
@@ -0,0 +1,52 @@
+"""Puts drawn level cards together into a scoreboard"""
+
+import logging
+from math import ceil
+
+from easy_pil import Editor, Canvas
+from PIL import Image
+
+from .encoder import timed_encode
+
+
+log = logging.getLogger(__name__)
+
+
+def composite_scoreboard(cards:list[Image.Image]) -> Image.Image:
+    """Paste the cards into rows of three"""
+
+    width = 920 * len(cards) if len(cards) < 3  else 2760
+    height = 220 * ceil(len(cards) / 3) if len(cards) >= 3 else 220
+    x = y = 0
+
+    editor = Editor(Canvas((width, height)))
+
+    for i, card in enumerate(cards):
+
+        log.debug("%s is at position %sx%s", i, x, y)
+
+        editor.paste(card, (x, y))
+
+        i += 1
+        if i % 3 != 0:
+            x += 920
+        # every fourth card is on a new row
+        else:
+            x = 0
+            y += 220
+
+    return editor.image
+
+def render_scoreboard_file(
+    cards:list[Image.Image],
+    encoding:str="png",
+    compress_level:int=6
+) -> tuple[bytes, float]:
+    """Put the cards together and encode the scoreboard, run in the
+    worker processes
+
+    Returns:
+        tuple[bytes, float]: The file and the seconds spent encoding it.
+    """
+
+    return timed_encode(composite_scoreboard(cards), encoding, compress_level)
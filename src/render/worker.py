@@ -0,0 +1,144 @@
+"""Process pool for cpu heavy image work
+
+Jobs are limited to a few per render process, so a burst of commands
+waits its turn here instead of piling up in the pool, and every job
+has a time limit so a command is never left waiting forever.
+"""
+
+import os
+import asyncio
+import logging
+from functools import partial
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from constants import (
+    RENDER_WORKERS,
+    RENDER_JOBS_PER_WORKER,
+    RENDER_TIMEOUT_SECONDS
+)
+from exceptions import RenderTimeout
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class WorkerStats:
+    """Counters for the render pool"""
+
+    queued: int = 0
+    running: int = 0
+    max_queued: int = 0
+    completed: int = 0
+    timeouts: int = 0
+    failures: int = 0
+
+
+stats = WorkerStats()
+
+_pool: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+
+def get_pool() -> ProcessPoolExecutor:
+    """Get the render process pool, starting it on first use"""
+
+    global _pool, _slots  # pylint: disable=global-statement
+
+    if _pool is None:
+        log.info("Starting render process pool")
+        workers = RENDER_WORKERS or os.cpu_count() or 1
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _slots = asyncio.Semaphore(workers * RENDER_JOBS_PER_WORKER)
+
+    return _pool
+
+def _finished(slots:asyncio.Semaphore, future:asyncio.Future) -> None:
+    """Free the slot of a job once the process is done with it"""
+
+    stats.running -= 1
+    slots.release()
+
+    if future.cancelled():
+        return
+
+    if future.exception() is None:
+        stats.completed += 1
+    else:
+        stats.failures += 1
+
+async def run(func, *args, timeout:float=RENDER_TIMEOUT_SECONDS):
+    """Run a function in the render pool and await the result.
+    The function, arguments and result must all be picklable.
+
+    Args:
+        func (Callable): The function to run.
+        *args: The arguments for the function.
+        timeout (float, optional): Seconds to wait for the result,
+            including the time spent queued. Defaults to
+            RENDER_TIMEOUT_SECONDS.
+
+    Raises:
+        RenderTimeout: The job took longer than the timeout.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pool = get_pool()
+    slots = _slots
+
+    stats.queued += 1
+    stats.max_queued = max(stats.max_queued, stats.queued)
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout)
+    except asyncio.TimeoutError:
+        stats.timeouts += 1
+        raise RenderTimeout(f"{func.__name__} waited {timeout}s to start")
+    finally:
+        stats.queued -= 1
+
+    try:
+        future = loop.run_in_executor(pool, partial(func, *args))
+    except BrokenProcessPool:
+        slots.release()
+        _restart()
+        raise
+
+    stats.running += 1
+    future.add_done_callback(partial(_finished, slots))
+
+    try:
+        # Shielded so a timed out job keeps its slot until it finishes
+        return await asyncio.wait_for(
+            asyncio.shield(future), deadline - loop.time()
+        )
+
+    except asyncio.TimeoutError:
+        stats.timeouts += 1
+        log.warning("Render job %s timed out", func.__name__)
+        raise RenderTimeout(f"{func.__name__} took longer than {timeout}s")
+
+    except BrokenProcessPool:
+        _restart()
+        raise
+
+def _restart() -> None:
+    """Replace a pool that broke because a render process died"""
+
+    global _pool  # pylint: disable=global-statement
+
+    log.error("A render process died, restarting the pool")
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def shutdown() -> None:
+    """Stop the render processes"""
+
+    global _pool  # pylint: disable=global-statement
+
+    if _pool is not None:
+        log.info("Stopping render process pool")
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
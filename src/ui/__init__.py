@@ -3,6 +3,7 @@
 from .modals import BirthdayModal, BanMemberModal, MakeEmbedModal
 from .embeds import (
     NextBirthdayEmbed,
+    UpcomingBirthdaysEmbed,
     BirthdayHelpEmbed,
     CelebrateBirthdayEmbed,
     HelpChannelsEmbed,
@@ -19,3 +20,5 @@ from .embeds import (
 )
 from .views import EmbedPageView, ExpClusterView
 from .levelcards import LevelCard, ScoreBoard, LevelUpCard
+from .avatars import avatars
+from .cardcache import card_cache
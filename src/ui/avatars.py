@@ -0,0 +1,154 @@
+"""Cache of avatars that are ready to be drawn on cards"""
+
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+
+from discord import Asset
+from PIL import Image
+
+from constants import AVATAR_CACHE_SIZE, AVATAR_CACHE_DIR
+from render import worker, prepare_avatar
+
+
+log = logging.getLogger(__name__)
+
+
+class AvatarCache:
+    """LRU cache of prepared avatar images keyed by the avatar hash,
+    with an optional directory to keep them in between restarts.
+
+    Avatars are downloaded with discord's own http client, so every
+    download shares one session.
+    """
+
+    def __init__(self, max_size:int, directory:str=None):
+        """Create a new avatar cache
+
+        Args:
+            max_size (int): Number of avatars to keep in memory.
+            directory (str, optional): Directory for the on-disk cache.
+                Defaults to None, which disables it.
+        """
+
+        self.max_size = max_size
+        self.directory = directory
+
+        self._images: OrderedDict[str, Image.Image] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key:str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def _read_disk(self, key:str) -> Image.Image | None:
+        """Load a prepared avatar from disk, None if it isn't there"""
+
+        try:
+            with Image.open(self._path(key)) as image:
+                image.load()
+                return image.convert("RGBA")
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key:str, image:Image.Image) -> None:
+        image.save(self._path(key), "PNG")
+
+    def _store(self, key:str, image:Image.Image) -> None:
+        """Add an image to memory, evicting the least recently used"""
+
+        self._images[key] = image
+        self._images.move_to_end(key)
+
+        while len(self._images) > self.max_size:
+            self._images.popitem(last=False)
+
+    async def _load(self, asset:Asset) -> Image.Image:
+        """Get an avatar from disk or download and prepare it"""
+
+        if self.directory is not None:
+            image = await asyncio.to_thread(self._read_disk, asset.key)
+            if image is not None:
+                self.disk_hits += 1
+                return image
+
+        self.misses += 1
+        log.debug("Downloading avatar %s", asset.key)
+
+        image = await worker.run(prepare_avatar, await asset.read())
+
+        if self.directory is not None:
+            await asyncio.to_thread(self._write_disk, asset.key, image)
+
+        return image
+
+    async def get(self, asset:Asset) -> Image.Image:
+        """Get an avatar as a 300x300 circle ready to draw
+
+        Args:
+            asset (discord.Asset): The avatar, usually display_avatar.
+
+        Returns:
+            Image.Image: The prepared avatar, don't modify it.
+        """
+
+        key = asset.key
+
+        if key in self._images:
+            self.hits += 1
+            self._images.move_to_end(key)
+            return self._images[key]
+
+        # Share a load that is already happening for this avatar
+        if key in self._in_flight:
+            self.hits += 1
+            return await self._in_flight[key]
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            image = await self._load(asset)
+            self._store(key, image)
+            future.set_result(image)
+            return image
+
+        except Exception as err:
+            future.set_exception(err)
+            # Don't complain about the exception if nobody was waiting
+            future.exception()
+            raise
+
+        finally:
+            del self._in_flight[key]
+
+    def invalidate(self, asset:Asset) -> None:
+        """Forget an avatar, eg. after the member changes it"""
+
+        log.debug("Invalidating avatar %s", asset.key)
+        self._images.pop(asset.key, None)
+
+        if self.directory is not None:
+            try:
+                os.remove(self._path(asset.key))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for how the cache is performing"""
+
+        return {
+            "Size": len(self._images),
+            "Hits": self.hits,
+            "Disk Hits": self.disk_hits,
+            "Misses": self.misses,
+        }
+
+
+avatars = AvatarCache(AVATAR_CACHE_SIZE, AVATAR_CACHE_DIR)
@@ -0,0 +1,85 @@
+"""Cache of encoded level cards keyed by everything that is drawn"""
+
+import logging
+from collections import OrderedDict
+
+from constants import LEVELCARD_CACHE_BYTES
+
+
+log = logging.getLogger(__name__)
+
+
+class CardCache:
+    """LRU cache of encoded card images, bounded by their total size.
+
+    Keys are fingerprints of the card's visual state that start with
+    the guild and member ids, so a member's cards can be evicted as
+    soon as their xp changes instead of waiting to age out.
+    """
+
+    def __init__(self, max_bytes:int):
+        self.max_bytes = max_bytes
+        self.size = 0
+
+        self._cards: OrderedDict[tuple, bytes] = OrderedDict()
+        self._by_member: dict[tuple[int, int], set[tuple]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key:tuple) -> bytes | None:
+        """Get an encoded card, None if it isn't cached"""
+
+        data = self._cards.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._cards.move_to_end(key)
+        return data
+
+    def put(self, key:tuple, data:bytes) -> None:
+        """Cache an encoded card"""
+
+        if len(data) > self.max_bytes:
+            return
+
+        self._discard(key)
+        self._cards[key] = data
+        self._by_member.setdefault(key[:2], set()).add(key)
+        self.size += len(data)
+
+        while self.size > self.max_bytes:
+            self._discard(next(iter(self._cards)))
+
+    def _discard(self, key:tuple) -> None:
+        data = self._cards.pop(key, None)
+        if data is None:
+            return
+
+        self.size -= len(data)
+        member_keys = self._by_member[key[:2]]
+        member_keys.discard(key)
+        if not member_keys:
+            del self._by_member[key[:2]]
+
+    def evict(self, guild_id:int, member_id:int) -> None:
+        """Drop every cached card for a member"""
+
+        for key in tuple(self._by_member.get((guild_id, member_id), ())):
+            self._discard(key)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for how the cache is performing"""
+
+        return {
+            "Cards": len(self._cards),
+            "Bytes": self.size,
+            "Hits": self.hits,
+            "Misses": self.misses,
+        }
+
+
+card_cache = CardCache(LEVELCARD_CACHE_BYTES)
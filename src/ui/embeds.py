@@ -1,7 +1,7 @@
 """Embeds for the project"""
 
 import logging
-from datetime import datetime
+from datetime import date, datetime
 
 import discord
 from discord import Interaction as Inter
@@ -416,36 +416,21 @@ class CelebrateBirthdayEmbed(discord.Embed):
         self.set_footer(text=f_text)
 
 
-class NextBirthdayEmbed(discord.Embed):
-    """Embed for the next persons birthday"""
+def birthday_timestamp(birthday:date) -> int:
+    """Get the unix timestamp for the start of a birthday"""
 
-    def __init__(
-        self,
-        inter:Inter,
-        birthdays:list[tuple[int, datetime]]
-    ):
+    return int(datetime.combine(birthday, datetime.min.time()).timestamp())
 
-        log.debug('Creating new NextBirthdayEmbed')
 
-        now = datetime.now()
-
-        for member_id, birthday in birthdays:
-
-            # If their birthday has not past, break
-            birthday = birthday.replace(year=now.year)
-            if not birthday < now:
-                break
+class NextBirthdayEmbed(discord.Embed):
+    """Embed for the next persons birthday"""
 
-        else:  #nobreak
-            # The next birthday is next year
-            member_id, birthday = birthdays[0]
-            birthday = birthday.replace(now.year + 1)
+    def __init__(self, member:discord.Member, birthday:date):
 
-        # Get the member object
-        member = inter.guild.get_member(member_id)
+        log.debug('Creating new NextBirthdayEmbed')
 
         # Get the unix timestamp for the birthday
-        unix = int(birthday.timestamp())
+        unix = birthday_timestamp(birthday)
 
         log.debug(
             'Found Birthday: %s unix_timestamp: %s',
@@ -468,3 +453,24 @@ class NextBirthdayEmbed(discord.Embed):
 
         self.set_thumbnail(url=member.display_avatar.url)
         self.set_footer(text=BDAY_HELP_MSG)
+
+
+class UpcomingBirthdaysEmbed(discord.Embed):
+    """Embed for the next few birthdays in a guild"""
+
+    def __init__(self, birthdays:list[tuple[discord.Member, date]]):
+
+        log.debug('Creating new UpcomingBirthdaysEmbed')
+
+        lines = []
+        for member, birthday in birthdays:
+            unix = birthday_timestamp(birthday)
+            lines.append(f'{member.mention} on <t:{unix}:D> (<t:{unix}:R>)')
+
+        super().__init__(
+            title='Upcoming Birthdays',
+            description='\n'.join(lines),
+            colour=discord.Colour.gold()
+        )
+
+        self.set_footer(text=BDAY_HELP_MSG)
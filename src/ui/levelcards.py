@@ -1,27 +1,34 @@
 """Levelcards module. Contains the Levelcard class and related functions."""
 
+import asyncio
 import logging
-from time import perf_counter
-from math import ceil
+from io import BytesIO
+from typing import Awaitable, Callable
 
 from discord import Status, Colour, Member, File
-from easy_pil import (
-    Editor,
-    Canvas,
-    Text,
-    load_image_async
-)
+from easy_pil import Editor, Canvas
 from PIL import Image
 
 from db import MemberLevelModel
 from constants import (
-    WHITE,
     BLACK,
-    LIGHT_GREY,
-    DARK_GREY,
-    POPPINS,
-    POPPINS_SMALL
+    LEVELCARD_DIRECT_RENDER,
+    SCOREBOARD_DIRECT_RENDER,
+    LEVELCARD_ENCODING,
+    SCOREBOARD_ENCODING,
+    CARD_COMPRESS_LEVEL
+)
+from render import (
+    worker,
+    encoder,
+    LevelCardSpec,
+    get_colours,
+    render_levelcard,
+    render_levelcard_file,
+    render_scoreboard_file
 )
+from .avatars import avatars
+from .cardcache import card_cache
 
 
 log = logging.getLogger(__name__)
@@ -98,32 +105,16 @@ def get_status_colour(status:Status) -> Colour:
         case _:
             return Colour.blurple()
 
-def get_colours(dark_mode:bool) -> tuple[str, str, str, str]:
-    """Get the colours for the levelboard
-    Returns the colours as a tuple in the following order:
-        background1, background2, foreground1, foreground2
-
-    Args:
-        dark_mode (bool): Whether the levelboard is in dark mode
-
-    Returns:
-        tuple[str, str, str, str]: The colours for the levelboard
-    """
-
-    log.debug("Getting colours for levelcard, darkmode=%s", dark_mode)
-
-    if dark_mode:
-        return BLACK, DARK_GREY, WHITE, LIGHT_GREY
-
-    return WHITE, LIGHT_GREY, BLACK, DARK_GREY
-
-
 class CustomImageBase:
     """Base class for custom images"""
 
     __slots__ = ()
     editor: Editor
 
+    # How the card is encoded, the stats are kept by card type
+    card_type = "image"
+    encoding = "png"
+
     # Colours
     is_darkmode: bool
     _foreground_1: str
@@ -164,9 +155,17 @@ class CustomImageBase:
             resample=Image.ANTIALIAS
         ))
 
-    def get_file(self, filename:str=None) -> File:
+    async def encode(self) -> bytes:
+        """Encode the card in a thread, so the event loop isn't blocked"""
+
+        return await encoder.encode_card(
+            self.editor.image, self.card_type,
+            self.encoding, CARD_COMPRESS_LEVEL
+        )
+
+    async def get_file(self, filename:str=None) -> File:
         """Get the card as a discord.File object. Filename defaults to
-        "<memberid>_levelcard.png"
+        "onebot_image" with the extension of the encoding.
 
         Args:
             filename (str, optional): Overwrite the default filename.
@@ -176,8 +175,10 @@ class CustomImageBase:
         """
 
         return File(
-            self.editor.image_bytes,
-            filename=filename or "onebot_image.png",
+            BytesIO(await self.encode()),
+            filename=filename or (
+                f"onebot_image.{encoder.extension(self.encoding)}"
+            ),
             description=f"An image created by OneBot."
         )
 
@@ -185,6 +186,7 @@ class LevelUpCard(CustomImageBase):
     """A ranking card for members"""
 
     __slots__ = ("is_darkmode",)
+    card_type = "levelup"
     lvl_obj: MemberLevelModel
     member: Member
 
@@ -239,291 +241,199 @@ class LevelUpCard(CustomImageBase):
 class ScoreBoard(CustomImageBase):
     """Scoreboard class. Creates a scoreboard image for each member"""
 
-    slots = ("members",)
+    slots = ("members", "_encoded")
+    card_type = "scoreboard"
+    encoding = SCOREBOARD_ENCODING
 
     def __init__(self, members:tuple[tuple[Member, MemberLevelModel]]):
         self.members = members
+        self._encoded = None
 
-    async def draw(self):
-        """Draw the scoreboard"""
+    async def draw(
+        self,
+        progress:Callable[[int, int], Awaitable]=None
+    ):
+        """Draw the scoreboard. The cards are drawn at the same time in
+        the render processes, then put together and encoded in one.
+
+        Args:
+            progress (Callable, optional): Coroutine function that is
+                awaited with the number of finished cards and the total
+                each time a card is finished.
+
+        Raises:
+            RenderTimeout: Drawing took too long.
+        """
 
         log.info("Drawing scoreboard")
 
-        width = 920 * len(self.members) if len(self.members) < 3  else 2760
-        height = 220 * ceil(len(self.members) / 3) if len(self.members) >= 3 else 220
-        x = y = 0
+        total = len(self.members)
+        done = 0
+
+        async def draw_card(member, lvl_obj):
+            nonlocal done
+
+            image = await LevelCard(
+                member, lvl_obj, direct=SCOREBOARD_DIRECT_RENDER
+            ).draw_image()
 
-        self.editor = Editor(Canvas((width, height)))
+            done += 1
+            if progress is not None:
+                await progress(done, total)
 
-        for i, (member, lvl_obj) in enumerate(self.members):
+            return image
 
-            log.debug("%s is at position %sx%s", i, x, y)
+        images = await asyncio.gather(*(
+            draw_card(member, lvl_obj) for member, lvl_obj in self.members
+        ))
+
+        self._encoded, seconds = await worker.run(
+            render_scoreboard_file, images,
+            self.encoding, CARD_COMPRESS_LEVEL
+        )
+        encoder.record(self.card_type, self._encoded, seconds)
 
-            card = LevelCard(member, lvl_obj)
-            await card.draw()
-            self.editor.paste(card.editor, (x, y))
+    async def encode(self) -> bytes:
+        """Get the encoded scoreboard"""
 
-            i += 1
-            if i % 3 != 0:
-                x += 920
-            # every fourth card is on a new row
-            else:
-                x = 0
-                y += 220
+        return self._encoded
 
 class LevelCard(CustomImageBase):
     """A ranking card for members"""
 
     __slots__ = (
-        "lvl_obj", "member", "is_darkmode",
+        "lvl_obj", "member", "is_darkmode", "direct",
         "_foreground_1",
         "_foreground_2",
         "_background_1",
         "_background_2",
         "_accent_colour",
         "_status_colour",
-        "editor"
+        "_encoded"
     )
+    card_type = "levelcard"
+    encoding = LEVELCARD_ENCODING
 
     def __init__(
         self, member:Member, lvl_obj:MemberLevelModel,
-        is_darkmode:bool=True
+        is_darkmode:bool=True, direct:bool=LEVELCARD_DIRECT_RENDER
     ):
-        """Create a new LevelCard"""
+        """Create a new LevelCard
+
+        Args:
+            direct (bool, optional): Draw the card straight at its final
+                size instead of halving a double sized card.
+        """
 
         log.info("Creating new levelcard")
 
         self.member = member
         self.lvl_obj = lvl_obj
         self.is_darkmode = is_darkmode
+        self.direct = direct
+        self._encoded = None
 
-    async def draw(self):
-        """Draw the level card"""
+    async def fetch_avatar(self) -> Image.Image:
+        """Get the member's avatar prepared for drawing"""
 
-        log.debug("Drawing levelcard")
+        log.debug("Fetching avatar image")
+        return await avatars.get(self.member.display_avatar)
+
+    def get_spec(self, avatar:Image.Image) -> LevelCardSpec:
+        """Get the spec for drawing this card
+
+        Args:
+            avatar (Image.Image): The prepared avatar image.
+        """
 
         # The colours are used in the rest of the drawing process,
         # so it's important to define them first
         self.define_colours()
 
-        # The card is the main image that is drawn on
-        self.editor = Editor(
-            Canvas(
-                (1800, 400),
-                color=self._background_1
-            )
+        return LevelCardSpec(
+            name=self.member.display_name,
+            discriminator=self.member.discriminator,
+            status=str(self.member.status),
+            is_darkmode=self.is_darkmode,
+            accent_colour=self._accent_colour,
+            status_colour=self._status_colour,
+            xp=self.lvl_obj.xp,
+            next_xp=self.lvl_obj.next_xp,
+            xp_raw=self.lvl_obj.xp_raw,
+            next_xp_raw=self.lvl_obj.next_xp_raw,
+            level=self.lvl_obj.level,
+            rank=self.lvl_obj.rank,
+            avatar=avatar,
+            direct=self.direct
         )
 
-        # Draw the various elements of the card
-        self._draw_accent_polygon()
-        await self._draw_avatar()
-        self._draw_status_icon()
-        self._draw_progress_bar()
-        self._draw_name()
-        self._draw_exp()
-        self._draw_levelrank()
-
-        self.editor.rounded_corners(20)
-
-        # The card is resized to half its size to antialias it
-        self.antialias_resize()
-
-        log.debug("Finished drawing levelcard, returning")
-
-        return self
+    def fingerprint(self) -> tuple:
+        """Get a key for everything that is drawn on the card, cards
+        with equal fingerprints look exactly the same.
 
-    def _draw_accent_polygon(self):
-        """Draw the accent colour polygon on the card"""
+        The guild and member ids come first so the card cache can
+        evict every card of a member.
+        """
 
-        log.debug("Drawing accent polygon")
+        self.define_colours()
 
-        self.editor.polygon(
-            (
-                (2, 2),  # top left
-                (2, 360),  # bottom left
-                (360, 2),  # bottom right
-                (2, 2)  # top right
-            ),
-            fill=self._accent_colour
+        return (
+            self.member.guild.id,
+            self.member.id,
+            self.member.display_name,
+            self.member.discriminator,
+            str(self.member.status),
+            self.is_darkmode,
+            self.direct,
+            self._accent_colour,
+            self.member.display_avatar.key,
+            self.lvl_obj.xp_raw,
+            self.lvl_obj.level,
+            self.lvl_obj.rank
         )
 
-    async def _draw_avatar(self):
-        """Draw the avatar on the card"""
-
-        log.debug("Drawing avatar image")
-
-        # Get the member's avatar as an Image object
-        avatar = await load_image_async(self.member.display_avatar.url)
+    async def draw(self):
+        """Draw and encode the level card, or reuse the cached one if
+        nothing on it has changed since it was last drawn
 
-        # Shape the avatar into a circle with a border
-        avatar_image = Editor(Canvas(
-            (320, 320),
-            color=self._background_1
-        )).circle_image().paste(
-            Editor(avatar).resize((300, 300)).circle_image(),
-            (10, 10)
-        )
+        Raises:
+            RenderTimeout: Drawing took too long.
+        """
 
-        # Paste the avatar onto the card
-        self.editor.paste(avatar_image, (40, 40))
+        log.debug("Drawing levelcard")
 
-    def _draw_status_icon(self):
-        """Draw the status icon on the card"""
+        key = self.fingerprint()
+        self._encoded = card_cache.get(key)
+        if self._encoded is not None:
+            log.debug("Using cached levelcard")
+            return self
 
-        log.debug("Drawing status icon")
+        spec = self.get_spec(await self.fetch_avatar())
 
-        status_image = Editor(Canvas(
-            (90, 90),
-            color=self._background_1
-        )).circle_image().paste(
-            Editor(Canvas(
-                (70, 70),
-                color=self._status_colour
-            )).circle_image(),
-            (10, 10)
+        # Drawn and encoded in a render process, only the file comes back
+        self._encoded, seconds = await worker.run(
+            render_levelcard_file, spec,
+            self.encoding, CARD_COMPRESS_LEVEL
         )
+        encoder.record(self.card_type, self._encoded, seconds)
+        card_cache.put(key, self._encoded)
 
-        log.debug("Drawing status icon symbol")
-
-        match self.member.status:
-
-            case Status.idle:
-                status_image.paste(Editor(Canvas(
-                    (50, 50),
-                    color=self._background_1
-                )).circle_image(), (5, 10))
-
-            case Status.dnd:
-                status_image.rectangle(
-                    (20, 39), width=50, height=12,
-                    fill=self._background_1, radius=15
-                )
-
-            case Status.offline:
-                status_image.paste(Editor(Canvas(
-                    (40, 40),
-                    color=self._background_1
-                )).circle_image(), (25, 25))
-
-            case _:
-                pass
-
-        # Paste the status icon onto the card
-        self.editor.paste(status_image, (260, 260))
-
-    def _draw_progress_bar(self):
-        """Draw the progress bar"""
-
-        log.debug("Drawing progress bar")
-
-        percentage = (self.lvl_obj.xp_raw / self.lvl_obj.next_xp_raw) * 100
-        percentage = max(percentage, 5)  # <10 causes visual issues
+        log.debug("Finished drawing levelcard, returning")
 
-        # Bar dimensions
-        position = (420, 275)
-        width = 1320
-        height = 60
-        radius = 40
+        return self
 
-        # The trough for the bar background
-        self.editor.rectangle(
-            position=position,
-            width=width, height=height,
-            color=self._background_2,
-            radius=radius
-        )
+    async def draw_image(self) -> Image.Image:
+        """Draw the level card as an image, for putting it on another
+        image instead of sending it
 
-        # The bar itself, dynamically changes based on the member's xp
-        self.editor.bar(
-            position=position,
-            max_width=width, height=height,
-            color=self._accent_colour,
-            percentage=percentage,
-            radius=radius
-        )
+        Raises:
+            RenderTimeout: Drawing took too long.
+        """
 
-    def _draw_name(self):
-        """Draw the member's name on the card"""
-
-        log.debug("Drawing name text")
-
-        # Shorthands for the name and discriminator
-        name = self.member.display_name
-        discriminator = f"#{self.member.discriminator}"
-
-        # Prevent the name text from overflowing
-        if len(name) > 15:
-            log.debug("Name is too long, shortening")
-            name = name[:15]
-
-        # Draw it right onto the card
-        self.editor.multi_text(
-            position=(420, 220),  # bottom left
-            texts=(
-                Text(
-                    name,
-                    font=POPPINS,
-                    color=self._foreground_1
-                ),
-                Text(
-                    discriminator,
-                    font=POPPINS_SMALL,
-                    color=self._foreground_2
-                )
-            )
-        )
+        spec = self.get_spec(await self.fetch_avatar())
+        return await worker.run(render_levelcard, spec)
 
-    def _draw_exp(self):
-        """Draw the exp and next exp on the card"""
-
-        log.debug("Drawing exp text")
-
-        # Draw it right onto the card
-        self.editor.multi_text(
-            position=(1740, 225),  # bottom right
-            align="right",
-            texts=(
-                Text(
-                    self.lvl_obj.xp,
-                    font=POPPINS_SMALL,
-                    color=self._foreground_1
-                ),
-                Text(
-                    f"/ {self.lvl_obj.next_xp} XP",
-                    font=POPPINS_SMALL,
-                    color=self._foreground_2
-                )
-            )
-        )
+    async def encode(self) -> bytes:
+        """Get the encoded card"""
 
-    def _draw_levelrank(self):
-        """Draw the level and rank on the card"""
-
-        log.debug("Drawing level and rank text")
-
-        self.editor.multi_text(
-            position=(1700, 80),  # top right
-            align="right",
-            texts=(
-                Text(
-                    "RANK",
-                    font=POPPINS_SMALL,
-                    color=self._foreground_2
-                ),
-                Text(
-                    f"#{self.lvl_obj.rank} ",
-                    font=POPPINS,
-                    color=self._accent_colour
-                ),
-                Text(
-                    "LEVEL",
-                    font=POPPINS_SMALL,
-                    color=self._foreground_2
-                ),
-                Text(
-                    str(self.lvl_obj.level),
-                    font=POPPINS,
-                    color=self._accent_colour
-                )
-            )
-        )
+        return self._encoded
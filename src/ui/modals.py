@@ -7,6 +7,8 @@ import discord
 from discord import Interaction as Inter
 from discord import ui as dui
 
+from birthdays import parse_birthday
+
 
 log = logging.getLogger(__name__)
 
@@ -107,7 +109,7 @@ class BirthdayModal(dui.Modal, title='Birthday'):
 
         # Get the entered birthday
         value = self.birthday_input.value
-        bday = datetime.strptime(value, "%d/%m/%Y")
+        bday = parse_birthday(value)
 
         # Get the validation range
         now = datetime.now()
@@ -117,7 +119,7 @@ class BirthdayModal(dui.Modal, title='Birthday'):
         if bday.year not in valid_range:
             raise OverflowError()
 
-        self._save_func(value)
+        await self._save_func(bday)
 
         await inter.response.send_message(
             'I\'ve saved your special date, '
@@ -0,0 +1,27 @@
+import os
+import sys
+import types
+import atexit
+import shutil
+import tempfile
+import importlib
+from pathlib import Path
+
+SRC = Path(__file__).parents[1] / "src"
+sys.path.insert(0, str(SRC))
+
+# db.db connects on import, point it at a throwaway database
+TEMP_DIR = tempfile.mkdtemp(prefix="onebot-tests-")
+atexit.register(shutil.rmtree, TEMP_DIR, ignore_errors=True)
+os.environ["ONEBOT_DB_PATH"] = os.path.join(TEMP_DIR, "db.sqlite3")
+
+
+def import_db_module(name):
+    """Import a module of the db package without running its __init__,
+    which builds the database"""
+
+    if "db" not in sys.modules:
+        package = types.ModuleType("db")
+        package.__path__ = [str(SRC / "db")]
+        sys.modules["db"] = package
+    return importlib.import_module(f"db.{name}")
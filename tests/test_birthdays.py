@@ -0,0 +1,105 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from birthdays import (  # noqa: E402
+    BirthdayIndex,
+    celebrant_days,
+    celebrated_on,
+    is_leap_year,
+    parse_birthday
+)
+
+
+@pytest.mark.parametrize("year, leap", [
+    (2023, False), (2024, True), (1900, False), (2000, True)
+])
+def test_is_leap_year(year, leap):
+    assert is_leap_year(year) is leap
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("29/02/2004", date(2004, 2, 29)),
+    ("1/3/2001", date(2001, 3, 1)),
+])
+def test_parse_birthday(text, expected):
+    assert parse_birthday(text) == expected
+
+
+@pytest.mark.parametrize("text", ["29/02/2003", "2001-03-01", "31/04/2000"])
+def test_parse_birthday_rejects_invalid_dates(text):
+    with pytest.raises(ValueError):
+        parse_birthday(text)
+
+
+def test_leap_day_is_celebrated_on_the_28th_in_common_years():
+    assert celebrated_on(2, 29, 2023) == date(2023, 2, 28)
+    assert celebrated_on(2, 29, 2024) == date(2024, 2, 29)
+    assert celebrant_days(date(2023, 2, 28)) == [(2, 28), (2, 29)]
+    assert celebrant_days(date(2023, 3, 1)) == [(3, 1)]
+
+
+def test_leap_day_is_celebrated_once_in_leap_years():
+    assert celebrant_days(date(2024, 2, 28)) == [(2, 28)]
+    assert celebrant_days(date(2024, 2, 29)) == [(2, 29)]
+
+
+@pytest.fixture
+def index():
+    return BirthdayIndex([
+        (1, date(1990, 1, 15)),
+        (2, date(2004, 2, 29)),
+        (3, date(1995, 2, 28)),
+        (4, date(1988, 7, 4)),
+        (5, date(2001, 12, 31)),
+    ])
+
+
+def test_next_birthday_is_today_or_later(index):
+    assert index.next(date(2023, 7, 4)) == (4, date(2023, 7, 4))
+    assert index.next(date(2023, 7, 5)) == (5, date(2023, 12, 31))
+
+
+def test_upcoming_birthdays_wrap_into_next_year(index):
+    assert index.upcoming(date(2023, 12, 1), 3) == [
+        (5, date(2023, 12, 31)),
+        (1, date(2024, 1, 15)),
+        (3, date(2024, 2, 28)),
+    ]
+
+
+def test_upcoming_birthdays_are_only_listed_once(index):
+    upcoming = index.upcoming(date(2023, 8, 1), 50)
+    assert [user_id for user_id, _ in upcoming] == [5, 1, 3, 2, 4]
+
+
+def test_upcoming_leap_day_in_common_and_leap_years(index):
+    assert index.upcoming(date(2023, 2, 1), 2) == [
+        (3, date(2023, 2, 28)), (2, date(2023, 2, 28))
+    ]
+    assert index.upcoming(date(2024, 2, 1), 2) == [
+        (3, date(2024, 2, 28)), (2, date(2024, 2, 29))
+    ]
+    assert index.next(date(2024, 2, 29)) == (2, date(2024, 2, 29))
+    assert index.next(date(2023, 3, 1)) == (4, date(2023, 7, 4))
+    assert index.upcoming(date(2023, 3, 1), 5)[-1] == (2, date(2024, 2, 29))
+
+
+def test_index_add_moves_and_remove_forgets(index):
+    index.add(4, date(1988, 1, 1))
+    assert index.next(date(2023, 1, 1)) == (4, date(2023, 1, 1))
+    assert len(index) == 5
+
+    index.remove(4)
+    index.remove(4)
+    assert 4 not in index
+    assert index.next(date(2023, 1, 1)) == (1, date(2023, 1, 15))
+
+
+def test_empty_index_has_no_next_birthday():
+    assert BirthdayIndex().next(date(2023, 1, 1)) is None
+    assert BirthdayIndex().upcoming(date(2023, 1, 1), 5) == []
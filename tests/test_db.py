@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+from _db import import_db_module
+
+
+db = import_db_module("db")
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / "test.sqlite3", check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE log (version INTEGER)")
+    conn.commit()
+
+    monkeypatch.setattr(db, "conn", conn)
+    monkeypatch.setattr(db, "cur", conn.cursor())
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("mode", ["PASSIVE", "TRUNCATE"])
+def test_checkpoint_commits_pending_writes_first(temp_db, mode):
+    db.execute("INSERT INTO log VALUES (1)")
+    assert temp_db.in_transaction
+
+    busy, _, _ = db.checkpoint(mode)
+
+    assert busy == 0
+    assert not temp_db.in_transaction
+    assert db.field("SELECT version FROM log") == 1
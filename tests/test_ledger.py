@@ -0,0 +1,60 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from _db import import_db_module
+
+
+db = import_db_module("db")
+adb = import_db_module("adb")
+ledger = import_db_module("ledger")
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / "test.sqlite3", check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE member_levels ("
+        " member_id INTEGER, guild_id INTEGER, experience INTEGER)"
+    )
+    conn.execute("INSERT INTO member_levels VALUES (5, 1, 10)")
+    conn.commit()
+
+    monkeypatch.setattr(db, "conn", conn)
+    monkeypatch.setattr(db, "cur", conn.cursor())
+    yield conn
+    conn.close()
+
+
+def test_cancelled_flush_is_finished_once(temp_db, tmp_path, monkeypatch):
+    journal = str(tmp_path / "xp-journal")
+    xp = ledger.XPLedger(journal)
+    xp.replay()
+
+    multiexec = adb.multiexec
+
+    async def slow_multiexec(cmd, valset):
+        await asyncio.sleep(0.05)
+        await multiexec(cmd, valset)
+
+    monkeypatch.setattr(adb, "multiexec", slow_multiexec)
+
+    async def main():
+        await xp.add(1, 5, 7)
+
+        flush = asyncio.create_task(xp.flush())
+        await asyncio.sleep(0.01)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+
+        await xp.close()
+
+    asyncio.run(main())
+
+    assert temp_db.execute("SELECT experience FROM member_levels").fetchall() \
+        == [(17,)]
+
+    # Nothing is left to replay on the next start
+    assert ledger.XPLedger(journal).replay() == 0
@@ -0,0 +1,37 @@
+import sys
+import logging
+import importlib.util
+from pathlib import Path
+
+SRC = Path(__file__).parents[1] / "src"
+sys.path.insert(0, str(SRC))
+
+# Loaded from its file, the bot package would start the whole bot
+spec = importlib.util.spec_from_file_location("_logs", SRC / "bot" / "_logs.py")
+_logs = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(_logs)
+
+
+def record(name, level, lineno=1):
+    return logging.LogRecord(name, level, "ext/levels.py", lineno, "msg", (), None)
+
+
+def test_sampling_only_drops_debug_records():
+    sampler = _logs.SamplingFilter({"ext": 10})
+
+    debug = [sampler.filter(record("ext.levels", logging.DEBUG)) for _ in range(20)]
+    info = [sampler.filter(record("ext.levels", logging.INFO, 2)) for _ in range(20)]
+
+    assert debug.count(True) == 2
+    assert all(info)
+
+
+def test_sampling_counts_call_sites_and_loggers_separately():
+    sampler = _logs.SamplingFilter({"ext.levels": 10})
+
+    assert sampler.filter(record("ext.levels", logging.DEBUG, 1))
+    assert not sampler.filter(record("ext.levels", logging.DEBUG, 1))
+    assert sampler.filter(record("ext.levels", logging.DEBUG, 2))
+    assert all(
+        sampler.filter(record("ext.birthday", logging.DEBUG)) for _ in range(5)
+    )
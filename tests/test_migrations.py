@@ -0,0 +1,185 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from _db import import_db_module
+
+
+db = import_db_module("db")
+
+DB_DIR = Path(__file__).parents[1] / "data" / "db"
+
+# The queries that run for every member level lookup, rank or scoreboard
+HOT_QUERIES = {
+    "from_database":
+        "SELECT experience FROM member_levels "
+        "WHERE member_id = ? AND guild_id = ?",
+    "update":
+        "UPDATE member_levels SET experience = ? "
+        "WHERE member_id=? AND guild_id=?",
+    "ledger_flush":
+        "UPDATE member_levels SET experience = experience + ? "
+        "WHERE member_id = ? AND guild_id = ?",
+    "delete":
+        "DELETE FROM member_levels WHERE member_id=? AND guild_id=?",
+    "rank":
+        "SELECT rank FROM ("
+        " SELECT member_id, RANK() OVER ( ORDER BY experience DESC )"
+        " AS rank FROM member_levels WHERE guild_id = ?"
+        ") WHERE member_id = ?",
+    "scoreboard":
+        "SELECT member_id, experience FROM member_levels "
+        "WHERE guild_id=? ORDER BY experience DESC LIMIT ?",
+}
+
+
+def migrations():
+    """The migration scripts in the order db.migrate applies them"""
+    return sorted(
+        (DB_DIR / "migrations").glob("*.sql"),
+        key=db.migration_version
+    )
+
+
+def apply_migrations(conn):
+    return db.apply_migrations(conn, str(DB_DIR / "migrations"))
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript((DB_DIR / "build.sql").read_text())
+    apply_migrations(conn)
+    yield conn
+    conn.close()
+
+
+def test_migration_numbers_are_unique():
+    numbers = [db.migration_version(path) for path in migrations()]
+    assert len(numbers) == len(set(numbers))
+
+
+def test_user_version_is_latest_migration(conn):
+    latest = db.migration_version(migrations()[-1])
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == latest
+
+
+def test_applied_migrations_are_skipped(conn):
+    assert apply_migrations(conn) == []
+
+
+def write_migrations(directory, scripts):
+    for name, script in scripts.items():
+        (directory / name).write_text(script)
+    return str(directory)
+
+
+def test_migrations_run_in_order_of_their_number(tmp_path):
+    directory = write_migrations(tmp_path, {
+        "0002_insert.sql": "INSERT INTO log VALUES (2);",
+        "0010_insert.sql": "INSERT INTO log VALUES (10);",
+        "0001_create.sql": "CREATE TABLE log (version INTEGER);",
+    })
+    conn = sqlite3.connect(":memory:")
+
+    assert db.apply_migrations(conn, directory) == [1, 2, 10]
+    assert conn.execute("SELECT version FROM log").fetchall() == [(2,), (10,)]
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 10
+
+
+def test_failed_migration_is_rolled_back(tmp_path):
+    directory = write_migrations(tmp_path, {
+        "0001_create.sql": "CREATE TABLE log (version INTEGER);",
+        "0002_broken.sql": "INSERT INTO log VALUES (2);\nNOT SQL;",
+    })
+    conn = sqlite3.connect(":memory:")
+
+    with pytest.raises(sqlite3.OperationalError):
+        db.apply_migrations(conn, directory)
+
+    assert conn.execute("SELECT * FROM log").fetchall() == []
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+
+    # Once fixed the migration is applied from where it stopped
+    write_migrations(tmp_path, {"0002_broken.sql": "INSERT INTO log VALUES (2);"})
+    assert db.apply_migrations(conn, directory) == [2]
+    assert conn.execute("SELECT * FROM log").fetchall() == [(2,)]
+
+
+def test_migrations_remove_duplicate_members():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript((DB_DIR / "build.sql").read_text())
+    conn.executescript(
+        "INSERT INTO guilds (guild_id) VALUES (1);"
+        "INSERT INTO member_levels (member_id, guild_id, experience)"
+        " VALUES (5, 1, 10), (5, 1, 30), (6, 1, 3);"
+    )
+    apply_migrations(conn)
+
+    rows = conn.execute(
+        "SELECT member_id, experience FROM member_levels ORDER BY member_id"
+    ).fetchall()
+    assert rows == [(5, 30), (6, 3)]
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_do_not_scan(conn, name):
+    query = HOT_QUERIES[name]
+    plan = [
+        row[3] for row in conn.execute(
+            f"EXPLAIN QUERY PLAN {query}", (1,) * query.count("?")
+        )
+    ]
+
+    for detail in plan:
+        assert not detail.startswith(("SCAN member_levels", "SCAN TABLE member_levels")), plan
+        assert "TEMP B-TREE" not in detail, plan
+
+
+def test_xp_policies_are_validated_and_deleted_with_the_guild(conn):
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("INSERT INTO guilds (guild_id) VALUES (1)")
+    conn.execute(
+        "INSERT INTO guild_xp_policies VALUES (1, 'message', 10, 2, 30)"
+    )
+
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO guild_xp_policies VALUES (1, 'reaction', 10, 2, 30)"
+        )
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO guild_xp_policies VALUES (1, 'member_update', 10, 0, 30)"
+        )
+
+    conn.execute("DELETE FROM guilds WHERE guild_id = 1")
+    assert conn.execute("SELECT * FROM guild_xp_policies").fetchall() == []
+
+
+def test_migrations_convert_birthdays_to_numbers():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript((DB_DIR / "build.sql").read_text())
+    conn.executemany(
+        "INSERT INTO user_birthdays (user_id, birthday) VALUES (?, ?)",
+        [(1, "29/02/2004"), (2, "1/3/2001"), (3, "05/11/1999")]
+    )
+    apply_migrations(conn)
+
+    rows = conn.execute(
+        "SELECT user_id, birth_year, birth_month, birth_day "
+        "FROM user_birthdays ORDER BY user_id"
+    ).fetchall()
+    assert rows == [(1, 2004, 2, 29), (2, 2001, 3, 1), (3, 1999, 11, 5)]
+
+
+def test_birthdays_are_validated_and_indexed(conn):
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO user_birthdays VALUES (1, 2000, 13, 1)")
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT user_id, birth_year FROM user_birthdays "
+        "WHERE birth_month = ? AND birth_day = ?",
+        (2, 29)
+    ).fetchall()
+    assert "USING INDEX user_birthdays_month_day" in plan[0][3], plan
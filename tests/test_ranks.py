@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from _db import import_db_module
+
+
+ranks = import_db_module("ranks")
+GuildRanks = ranks.GuildRanks
+
+
+@pytest.fixture(autouse=True)
+def small_buckets(monkeypatch):
+    # Small buckets so the tests split and drop plenty of them
+    monkeypatch.setattr(ranks, "BUCKET_SIZE", 4)
+
+
+def expected_order(xp):
+    return sorted(xp.items(), key=lambda item: (-item[1], item[0]))
+
+
+def expected_rank(xp, member_id):
+    return 1 + sum(1 for other in xp.values() if other > xp[member_id])
+
+
+def test_ties_share_a_rank():
+    guild = GuildRanks([(1, 50), (2, 80), (3, 50), (4, 10)])
+
+    assert [guild.rank(i) for i in (2, 1, 3, 4)] == [1, 2, 2, 4]
+    assert guild.rank(5) is None
+    assert guild.top(3) == [(2, 80), (1, 50), (3, 50)]
+
+
+def test_around_is_clipped_at_the_ends():
+    guild = GuildRanks([(i, i * 10) for i in range(1, 6)])
+
+    assert guild.around(5, 2) == ([], [(4, 40), (3, 30)])
+    assert guild.around(3, 1) == ([(4, 40)], [(2, 20)])
+    assert guild.around(1, 3) == ([(4, 40), (3, 30), (2, 20)], [])
+    assert guild.around(6, 1) == ([], [])
+
+
+def test_matches_a_full_sort_after_random_changes():
+    rng = random.Random(5)
+    xp = {i: rng.randrange(100) for i in range(60)}
+    guild = GuildRanks(xp.items())
+
+    for _ in range(2000):
+        member_id = rng.randrange(80)
+        if rng.random() < 0.2:
+            guild.remove(member_id)
+            xp.pop(member_id, None)
+        else:
+            guild.set(member_id, rng.randrange(100))
+            xp[member_id] = guild._xp[member_id]
+
+        if rng.random() < 0.05:
+            order = expected_order(xp)
+            assert len(guild) == len(xp)
+            assert guild.top(len(xp) + 5) == order
+            for member_id in xp:
+                assert guild.rank(member_id) == expected_rank(xp, member_id)
+
+            if member_id in xp:
+                index = order.index((member_id, xp[member_id]))
+                assert guild.around(member_id, 3) == (
+                    order[max(index - 3, 0):index],
+                    order[index + 1:index + 4]
+                )
+
+
+def test_emptied_rankings_can_be_refilled():
+    guild = GuildRanks([(i, i) for i in range(10)])
+    for i in range(10):
+        guild.remove(i)
+
+    assert len(guild) == 0
+    assert guild.top(5) == []
+
+    guild.set(3, 7)
+    assert guild.rank(3) == 1
+    assert guild.top(5) == [(3, 7)]
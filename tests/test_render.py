@@ -0,0 +1,102 @@
+import sys
+from io import BytesIO
+from pathlib import Path
+from dataclasses import replace
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from render import LevelCardSpec, prepare_avatar, render_levelcard  # noqa: E402
+from render.encoder import encode  # noqa: E402
+
+
+STATUSES = ("online", "idle", "dnd", "offline")
+
+# Areas of the 900x200 card that have no text on them
+AVATAR_BOX = (20, 20, 180, 180)
+BAR_BOX = (205, 130, 875, 172)
+
+
+@pytest.fixture(scope="module")
+def prepared_avatar():
+    """A gradient avatar, so the cards are the same every run"""
+
+    image = Image.linear_gradient("L").resize((512, 512)).convert("RGB")
+    with BytesIO() as file:
+        image.save(file, "PNG")
+        return prepare_avatar(file.getvalue())
+
+
+def spec(avatar, status, is_darkmode):
+    return LevelCardSpec(
+        name="Somebody",
+        discriminator="0420",
+        status=status,
+        is_darkmode=is_darkmode,
+        accent_colour=(52, 152, 219),
+        status_colour=(46, 204, 113),
+        xp="1234",
+        next_xp="2000",
+        xp_raw=1234,
+        next_xp_raw=2000,
+        level=7,
+        rank=3,
+        avatar=avatar
+    )
+
+
+def difference(a, b, box=None):
+    """Mean difference per channel, from 0 to 255"""
+
+    diff = ImageChops.difference(a, b)
+    if box is not None:
+        diff = diff.crop(box)
+    return max(ImageStat.Stat(diff).mean)
+
+
+@pytest.mark.parametrize("is_darkmode", (True, False))
+@pytest.mark.parametrize("status", STATUSES)
+def test_direct_render_matches_supersampled(prepared_avatar, status, is_darkmode):
+    supersampled = render_levelcard(spec(prepared_avatar, status, is_darkmode))
+    direct = render_levelcard(
+        replace(spec(prepared_avatar, status, is_darkmode), direct=True)
+    )
+
+    assert direct.size == supersampled.size == (900, 200)
+    assert direct.mode == supersampled.mode
+
+    # Shapes are supersampled either way, so they barely differ
+    assert difference(direct, supersampled, AVATAR_BOX) < 1
+    assert difference(direct, supersampled, BAR_BOX) < 1
+
+    # Text is drawn at a different size and moves by subpixels
+    assert difference(direct, supersampled) < 8
+
+
+def test_rounded_corners_are_transparent(prepared_avatar):
+    for direct in (False, True):
+        card = render_levelcard(
+            replace(spec(prepared_avatar, "online", True), direct=direct)
+        )
+        assert card.getpixel((0, 0))[3] == 0
+        assert card.getpixel((899, 199))[3] == 0
+        assert card.getpixel((450, 100))[3] == 255
+
+
+@pytest.mark.parametrize("encoding", ("png", "webp"))
+def test_lossless_encodings_round_trip(prepared_avatar, encoding):
+    card = render_levelcard(spec(prepared_avatar, "idle", True))
+
+    with Image.open(BytesIO(encode(card, encoding, 1))) as decoded:
+        assert decoded.format == encoding.upper()
+        assert difference(decoded.convert("RGBA"), card) == 0
+
+
+def test_palette_encoding_is_close(prepared_avatar):
+    card = render_levelcard(spec(prepared_avatar, "idle", True))
+
+    with Image.open(BytesIO(encode(card, "png-palette"))) as decoded:
+        assert decoded.mode == "P"
+        assert difference(decoded.convert("RGBA"), card) < 8
@@ -0,0 +1,81 @@
+import pytest
+
+from _db import import_db_module
+
+
+xp_policy = import_db_module("xp_policy")
+XPPolicy, XPRule = xp_policy.XPPolicy, xp_policy.XPRule
+
+GUILD, OTHER_GUILD, MEMBER = 1, 2, 10
+
+
+@pytest.fixture
+def policy():
+    return XPPolicy({
+        "message": XPRule(amount=5, burst=3, refill_seconds=10),
+        "member_update": XPRule(amount=1, burst=1, refill_seconds=0),
+    })
+
+
+def test_burst_runs_out(policy):
+    awards = [policy.award(GUILD, MEMBER, "message", now=0) for _ in range(4)]
+    assert awards == [5, 5, 5, 0]
+    assert (policy.awarded, policy.limited) == (3, 1)
+
+
+def test_buckets_are_per_member_and_source(policy):
+    for _ in range(3):
+        policy.award(GUILD, MEMBER, "message", now=0)
+
+    assert policy.award(GUILD, MEMBER + 1, "message", now=0) == 5
+    assert policy.award(OTHER_GUILD, MEMBER, "message", now=0) == 5
+
+
+def test_tokens_refill_over_time(policy):
+    for _ in range(3):
+        policy.award(GUILD, MEMBER, "message", now=0)
+
+    assert policy.award(GUILD, MEMBER, "message", now=5) == 0
+    assert policy.award(GUILD, MEMBER, "message", now=10) == 5
+    assert policy.award(GUILD, MEMBER, "message", now=10) == 0
+
+    # Refilling stops at the burst
+    awards = [
+        policy.award(GUILD, MEMBER, "message", now=1000) for _ in range(4)
+    ]
+    assert awards == [5, 5, 5, 0]
+
+
+def test_no_refill_time_never_limits(policy):
+    awards = [
+        policy.award(GUILD, MEMBER, "member_update", now=0) for _ in range(5)
+    ]
+    assert awards == [1] * 5
+
+
+def test_guild_rule_overrides_the_default(policy):
+    policy._rules[GUILD] = {"message": XPRule(20, 1, 60)}
+
+    assert policy.rule(GUILD, "message") == XPRule(20, 1, 60)
+    assert policy.rule(GUILD, "member_update") == policy.defaults["member_update"]
+    assert policy.rule(OTHER_GUILD, "message") == policy.defaults["message"]
+
+    assert [policy.award(GUILD, MEMBER, "message", now=0) for _ in range(2)] \
+        == [20, 0]
+    assert [
+        policy.award(OTHER_GUILD, MEMBER, "message", now=0) for _ in range(2)
+    ] == [5, 5]
+
+
+def test_prune_only_drops_full_buckets(policy):
+    policy.award(GUILD, MEMBER, "message", now=0)
+    for _ in range(3):
+        policy.award(GUILD, MEMBER + 1, "message", now=0)
+    policy.award(GUILD, MEMBER, "member_update", now=0)
+
+    # One token back by now, only the first member's bucket is full
+    assert policy.prune(now=10) == 2
+    assert set(policy._buckets) == {(GUILD, MEMBER + 1, "message")}
+
+    assert policy.prune(now=30) == 1
+    assert not policy._buckets